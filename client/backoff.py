@@ -0,0 +1,35 @@
+"""
+TallyHo Client reconnect backoff
+
+Waits longer after each failed connection, with some randomness, so when the server restarts
+the whole fleet doesn't try to reconnect in the same second.
+"""
+import random
+
+BASE_MS = 500
+MAX_MS = 1000 * 30  # 30 secs
+
+
+class Backoff:
+    def __init__(self, base_ms=BASE_MS, max_ms=MAX_MS, jitter=True):
+        self.base_ms = base_ms
+        self.max_ms = max_ms
+        self.jitter = jitter
+        self.failures = 0
+
+    def reset(self):
+        """
+        Call once we're talking to the server again.
+        """
+        self.failures = 0
+
+    def next_delay_ms(self):
+        """
+        @returns int: ms to wait before the next connection attempt.
+        """
+        delay = min(self.max_ms, self.base_ms << min(self.failures, 16))
+        self.failures += 1
+        if self.jitter:
+            # Between half and the full delay, so we always back off but spread out.
+            delay = delay // 2 + random.randint(0, delay // 2)
+        return delay
@@ -0,0 +1,114 @@
+"""
+TallyHo Client board definitions
+
+Each supported board is a dict of the settings that differ from DEFAULTS.
+The display driver for a board is only imported once the board is selected.
+"""
+from micropython import const
+import lvgl as lv
+
+_LCD_BYTE_ORDER_RGB = const(0x00)
+_LCD_BYTE_ORDER_BGR = const(0x08)
+
+INDICATOR_STYLE_TOP = "TOP"
+INDICATOR_STYLE_BOTTOM = "BOTTOM"
+INDICATOR_STYLE_LEFT = "LEFT"
+INDICATOR_STYLE_RIGHT = "RIGHT"
+INDICATOR_STYLE_ARC = "ARC"
+
+# Driver type: (module, class)
+DISPLAY_DRIVERS = {
+    "GC9A01": ("gc9a01", "GC9A01"),
+    "ST7789": ("st7789", "ST7789"),
+    "SIM": ("sim_display", "SimDisplay"),  # Headless simulator, see sim/
+}
+
+# Board config defaults
+DEFAULTS = {
+    "_CPU_FREQ_HZ": 160000000,  # 160Mhz. Valid options 80, 160 for C series ESP32
+    "_MISO": -1,  # Uses bidirection MOSI line instead
+    "_HOST": 1,  # SPI2, SPI1 is dedicated on ESP32 to flash
+    "_TOUCH_CS": -1,  # No touch
+    "_TOUCH_FREQ": 10000000,
+    "_LCD_FREQ": 80000000,
+    "_LCD_ROTATION": lv.DISPLAY_ROTATION._0,
+    "_LCD_BYTE_ORDER": _LCD_BYTE_ORDER_BGR,
+    "_LCD_BYTE_COLOR_SWAP": True,
+    "_LCD_OFFSET_X": 0,
+    "_LCD_OFFSET_Y": 0,
+    "_NEOPIXEL": -1,
+    "_NEOPIXEL_COUNT": 1,
+    # R, B, G as array indexes, e.g. R is position 0 in the color array, G is position 1 etc
+    "_NEOPIXEL_BYTE_ORDER": (0, 1, 2),
+}
+
+MODEL_ESP32_2424S012 = "ESP32-2424S012"
+MODEL_ESP32_C6_LCD_1_47 = "ESP32-C6-LCD-1.47"
+MODEL_SIMULATOR = "SIMULATOR"
+
+# Boards offered when selecting a model on the REPL.
+MODELS = [MODEL_ESP32_2424S012, MODEL_ESP32_C6_LCD_1_47]
+
+BOARDS = {
+    MODEL_ESP32_2424S012: {
+        "_WIDTH": 240,
+        "_HEIGHT": 240,
+        "_BL": 3,
+        "_DC": 2,
+        "_MOSI": 7,
+        "_SCK": 6,
+        "_LCD_CS": 10,
+        "_LCD_DRIVER_TYPE": "GC9A01",
+        "_TOUCH_CS": 18,
+        "INDICATOR_STYLE": INDICATOR_STYLE_ARC,
+    },
+    MODEL_ESP32_C6_LCD_1_47: {
+        "_WIDTH": 172,
+        "_HEIGHT": 320,
+        "_BL": 22,
+        "_DC": 15,
+        "_MOSI": 6,
+        "_SCK": 7,
+        "_LCD_CS": 14,
+        "_LCD_DRIVER_TYPE": "ST7789",
+        "_LCD_ROTATION": lv.DISPLAY_ROTATION._270,  # USB C port on left
+        # The display driver operates like a 240px width. The real display is 172px in the center.
+        "_LCD_OFFSET_Y": int((240 - 172) / 2),
+        "_NEOPIXEL": 8,
+        "_NEOPIXEL_BYTE_ORDER": (1, 0, 2),  # Swap R and G
+        "INDICATOR_STYLE": INDICATOR_STYLE_LEFT,
+    },
+    # Headless board for running the client on a development machine, pins are ignored.
+    MODEL_SIMULATOR: {
+        "_WIDTH": 320,
+        "_HEIGHT": 172,
+        "_BL": -1,
+        "_DC": -1,
+        "_MOSI": -1,
+        "_SCK": -1,
+        "_LCD_CS": -1,
+        "_LCD_DRIVER_TYPE": "SIM",
+        "_NEOPIXEL": 0,
+        "INDICATOR_STYLE": INDICATOR_STYLE_LEFT,
+    },
+}
+
+
+def get_board(model):
+    """
+    @param model: Model name from BOARDS
+    @returns dict: All board settings for the model, with defaults filled in.
+    """
+    if model not in BOARDS:
+        raise Exception(f"Unknown board model defined: {model}")
+    board = DEFAULTS.copy()
+    board.update(BOARDS[model])
+    return board
+
+
+def get_display_class(driver_type):
+    """
+    Import the display driver module for a board and return its driver class.
+    """
+    module, name = DISPLAY_DRIVERS[driver_type]
+    return getattr(__import__(module), name)
@@ -10,22 +10,64 @@ Allows regaining control for REPL-based file flashing during a boot loop.
 
 LAUNCH_REPL = False
 CONFIG_BOOT_SUCCESS = "config/unsuccessful_boots"
+CONFIG_OTA_PENDING = "config/ota_pending"  # Written by ota.py when it switches to new files
+OTA_ROLLBACK_AFTER = 2  # Unsuccessful boots of new OTA files before going back to the old ones
 print("\n\n**** Welcome to the TallyHo bootloader! ****\n\n")
 
-main_path = "tally.py"
-print(f"Trying to read {main_path}")
-try:
-    open(main_path, "r")
-    # continue with the file.
-except OSError:  # open failed
-    print(
-        f"""
-  File not found.
-  Use Ctrl-E / Ctrl-D to paste in the {main_path} file so it can bootload itself.
-  Exiting to REPL.
+# Either precompiled bytecode (see build.py) or the source.
+# If both exist, MicroPython imports the source, so remove tally.py when deploying tally.mpy.
+main_paths = ["tally.mpy", "tally.py"]
+main_path = None
+for path in main_paths:
+    print(f"Trying to read {path}")
+    try:
+        open(path, "r").close()
+        main_path = path
+        break
+    except OSError:  # open failed
+        pass
+
+if not main_path:
+    # It may still be frozen into the firmware (see manifest.py), the import will tell us.
+    print("No tally file found, trying frozen module.")
+
+
+def ota_pending():
+    """
+    @returns bool: Whether there are over the air update files that haven't booted successfully yet.
+    """
+    try:
+        open(CONFIG_OTA_PENDING, "r").close()
+        return True
+    except OSError:
+        return False
+
+
+def rollback_ota():
+    """
+    If an over the air update hasn't booted successfully yet, put back the files it replaced.
+    @returns bool: Whether there was an update to roll back.
     """
-    )
-    LAUNCH_REPL = True
+    import os
+
+    try:
+        file = open(CONFIG_OTA_PENDING, "r")
+        version, names = file.read().split("\n", 1)
+        file.close()
+    except (OSError, ValueError):  # No update pending
+        return False
+    print(f"Rolling back update {version}")
+    for name in names.split(","):
+        try:
+            os.remove(name)
+        except OSError:
+            pass
+        try:
+            os.rename(name + ".bak", name)
+        except OSError:  # The update added this file
+            pass
+    os.remove(CONFIG_OTA_PENDING)
+    return True
 
 
 def try_boot():
@@ -50,15 +92,20 @@ def try_boot():
         # Start a counter
         print("First boot!")
         tries = 0
-    elif tries == -1:
+    elif tries == -1 and not ota_pending():
         print("Last boot seemed successful!")
         # Looks like we started nicely enough to be able to update firmware remotely, allow normal start!
     else:
+        # An update that hasn't booted successfully yet counts every boot, whatever came before it.
+        tries = max(tries, 0)
         # We didn't get to the bit in the main script where we've completed a successful loop
         print("Failed start detected!")
         tries += 1  # We just restarted, count this as a try
         print(f"Unsuccessful attempts: {tries}")
-        if tries > 3:
+        if tries > OTA_ROLLBACK_AFTER and rollback_ota():
+            # Give the previous files a fresh set of tries.
+            tries = 0
+        elif tries > 3:
 
             # We didn't get to the bit in the main script where we've completed a successful loop after many attempts.
             # Likely means we crashed.
@@ -76,7 +123,18 @@ def try_boot():
     file.write(str(tries))
     file.close()
     print("\n\n**** Tally Ho! ****\n\n")
-    import tally
+    try:
+        import tally
+    except ImportError as e:
+        if main_path:
+            raise e
+        print(
+            f"""
+  {e}
+  Use Ctrl-E / Ctrl-D to paste in the {main_paths[-1]} file so it can bootload itself.
+  Exiting to REPL.
+    """
+        )
 
 
 if not LAUNCH_REPL:
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+TallyHo Client build script
+
+Cross-compiles the client modules to MicroPython bytecode (.mpy) so the board doesn't have to
+compile the source every time it boots. Run this on your development machine, then copy the
+contents of the build directory (plus boot.py, which must stay as source) to the board.
+
+    python build.py
+    rshell -p /dev/tty.usbmodem5101 cp build/*.mpy boot.py /pyboard/
+
+mpy-cross must match the MicroPython version in the firmware. By default we look for the one
+built by lvgl_micropython, then on the PATH. Override with the MPY_CROSS environment variable.
+"""
+import os
+import shutil
+import subprocess
+import sys
+
+CLIENT_DIR = os.path.dirname(os.path.abspath(__file__))
+BUILD_DIR = os.path.join(CLIENT_DIR, "build")
+
+# boot.py is the entry point MicroPython runs itself, so it can't be precompiled.
+# This script and the manifest only run on the development machine.
+EXCLUDE = ["boot.py", "build.py", "manifest.py"]
+
+MPY_CROSS_PATHS = [
+    os.path.join(
+        CLIENT_DIR,
+        "..",
+        "lvgl_micropython",
+        "lib",
+        "micropython",
+        "mpy-cross",
+        "build",
+        "mpy-cross",
+    ),
+]
+
+
+def find_mpy_cross():
+    if os.environ.get("MPY_CROSS"):
+        return os.environ["MPY_CROSS"]
+    for path in MPY_CROSS_PATHS:
+        if os.path.isfile(path):
+            return path
+    path = shutil.which("mpy-cross")
+    if path:
+        return path
+    raise FileNotFoundError(
+        "mpy-cross not found. Build it in lvgl_micropython/lib/micropython/mpy-cross or set MPY_CROSS."
+    )
+
+
+def get_modules():
+    return sorted(
+        name
+        for name in os.listdir(CLIENT_DIR)
+        if name.endswith(".py") and name not in EXCLUDE
+    )
+
+
+def build():
+    mpy_cross = find_mpy_cross()
+    print(f"Using {mpy_cross}")
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    for name in get_modules():
+        source = os.path.join(CLIENT_DIR, name)
+        output = os.path.join(BUILD_DIR, name[:-3] + ".mpy")
+        print(f"Compiling {name}")
+        # Source file name is given relative so tracebacks on the board stay short.
+        subprocess.run(
+            [mpy_cross, "-o", output, "-s", name, source],
+            check=True,
+        )
+        print(f"  {os.path.getsize(source)} -> {os.path.getsize(output)} bytes")
+
+
+if __name__ == "__main__":
+    try:
+        build()
+    except (FileNotFoundError, subprocess.CalledProcessError) as e:
+        print(e)
+        sys.exit(1)
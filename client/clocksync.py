@@ -0,0 +1,75 @@
+"""
+TallyHo Client clock sync
+
+NTP style offset estimate between our ticks_ms and the server's clock, so frames carrying an
+APPLY_AT (server time) are shown at the same moment on every tally.
+
+SYNC:       {"MAC": ..., "SYNC": {"T0": <our ticks when sent>, "OFFSET": ..., "JITTER": ..., "RTT": ...}}
+SYNC_REPLY: {"MAC": ..., "SYNC_REPLY": {"T0": <as sent>, "T1": <server received>, "T2": <server sent>}}
+
+We keep the last few samples and use the one with the lowest round trip, as it has the least
+queueing delay in it. Our current estimate is sent along with each request so the server can report it.
+"""
+import time
+
+SYNC_PERIOD_MS = 1000 * 5  # 5 secs
+SYNC_FAST_PERIOD_MS = 200  # Until we have SAMPLES samples
+SAMPLES = 8
+MAX_SCHEDULE_MS = 500  # Don't wait longer than this for an APPLY_AT, our clock must be wrong.
+
+
+class ClockSync:
+    def __init__(self):
+        self.samples = []  # (rtt, offset)
+        self.offset = None  # server ms - our ticks ms
+        self.rtt = 0
+        self.jitter = 0
+        self.next_sync = time.ticks_ms()
+
+    def sync_due(self):
+        return time.ticks_diff(time.ticks_ms(), self.next_sync) >= 0
+
+    def request(self, mac):
+        """
+        @returns bytes: SYNC request frame to send, including the newline
+        """
+        now = time.ticks_ms()
+        period = SYNC_PERIOD_MS if len(self.samples) >= SAMPLES else SYNC_FAST_PERIOD_MS
+        self.next_sync = time.ticks_add(now, period)
+        offset = self.offset if self.offset is not None else "null"
+        return f'{{"MAC":"{mac}","SYNC":{{"T0":{now},"OFFSET":{offset},"JITTER":{self.jitter},"RTT":{self.rtt}}}}}\n'.encode()
+
+    def on_reply(self, reply):
+        t3 = time.ticks_ms()
+        t0 = reply["T0"]
+        t1 = reply["T1"]
+        t2 = reply["T2"]
+        rtt = time.ticks_diff(t3, t0) - (t2 - t1)
+        offset = int(((t1 - t0) + (t2 - t3)) / 2)
+        if self.offset is not None and abs(offset - self.offset) > 1000:
+            # Our ticks wrapped or the server restarted, start again.
+            self.samples = []
+        self.samples.append((rtt, offset))
+        if len(self.samples) > SAMPLES:
+            self.samples.pop(0)
+        self.rtt, self.offset = min(self.samples)
+        offsets = [sample[1] for sample in self.samples]
+        self.jitter = max(offsets) - min(offsets)
+
+    def server_now(self):
+        if self.offset is None:
+            return None
+        return time.ticks_ms() + self.offset
+
+    def wait_until(self, apply_at):
+        """
+        Sleep until the given server time.
+        @returns int: ms late (negative if early) that we are, by our estimate of the server clock.
+        """
+        now = self.server_now()
+        if now is None:
+            return 0
+        delay = apply_at - now
+        if 0 < delay <= MAX_SCHEDULE_MS:
+            time.sleep_ms(delay)
+        return self.server_now() - apply_at
@@ -0,0 +1,48 @@
+"""
+TallyHo Client frame reader
+
+Reads newline separated frames from the server socket. Each read waits (up to the socket
+timeout) for the first data, then drains everything else already received without waiting,
+so a burst of frames is handled in one go and only rendered once.
+"""
+import errno
+import select
+
+_RECV_SIZE = 1024
+_TIMEOUT_ERRORS = (errno.EAGAIN, errno.ETIMEDOUT)
+
+
+class FrameReader:
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = b""
+        self.poller = select.poll()
+        self.poller.register(sock, select.POLLIN)
+        self.frames = 0  # Frames received
+
+    def _recv(self):
+        data = self.sock.recv(_RECV_SIZE)
+        if not data:
+            raise OSError(errno.ENOTCONN, "Server closed the connection")
+        self.buffer += data
+
+    def read(self, timeout_ms=None):
+        """
+        @param timeout_ms: Wait no longer than this for the first data, rather than the socket timeout
+        @returns list: Complete frames (bytes, without newline) received so far. May be empty.
+        """
+        if timeout_ms is not None and not self.poller.poll(timeout_ms):
+            return []
+        try:
+            self._recv()
+        except OSError as e:
+            if e.args[0] in _TIMEOUT_ERRORS:
+                return []
+            raise
+        # Drain anything else that's already arrived.
+        while self.poller.poll(0):
+            self._recv()
+        lines = self.buffer.split(b"\n")
+        self.buffer = lines.pop()  # Incomplete frame, if any
+        self.frames += len(lines)
+        return lines
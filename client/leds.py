@@ -0,0 +1,117 @@
+"""
+TallyHo Client LEDs
+
+Drives the neopixel. Every color is turned into the bytes the strip takes (in the board's
+_NEOPIXEL_BYTE_ORDER, for all of its pixels) once, the first time it's used, and setup_board()
+prepares the tally states and notice colors up front. Showing a color is then handing that
+buffer to the driver and a write, and no write at all if that's what the strip already shows.
+
+Blinking (e.g. IDENTIFY) runs from a machine.Timer, so the main loop carries on handling frames.
+Colors set while blinking are kept and shown when it finishes.
+"""
+import machine
+
+LED_TIMER_ID = 1  # The LVGL task handler has timer 0
+BLINK_PERIOD_MS = 250
+IDENTIFY_MS = 4000
+IDENTIFY_COLOR = (0, 0, 255)
+OFF = (0, 0, 0)
+
+
+def _rgb(color):
+    """
+    @param color: (R, G, B), or a hex int like the LCD colors
+    """
+    if isinstance(color, int):
+        return ((color >> 16) & 0xFF, (color >> 8) & 0xFF, color & 0xFF)
+    return color
+
+
+class Leds:
+    def __init__(self, np, byte_order=(0, 1, 2), timer_id=LED_TIMER_ID):
+        """
+        @param np: neopixel.NeoPixel
+        @param byte_order: Index of R, G and B in the colors the strip takes, see boards.py
+        """
+        self.np = np
+        self.byte_order = byte_order
+        self.buffers = {}  # Color (tuple or hex int): bytearray to hand the driver as np.buf
+        self.steady = None  # Buffer to show when not blinking
+        self.shown = None  # Buffer last written
+        self.writes = 0
+        self.skipped = 0
+        self._timer_id = timer_id
+        self._timer = None  # Made on first blink
+        self._blink = None  # [buffer, other buffer, ticks left]
+        self._tick_callback = self._tick  # Bind once, the timer callback shouldn't allocate
+
+    def prepare(self, *colors):
+        """
+        Work out the buffers for colors now, rather than on first use.
+        """
+        for color in colors:
+            self._buffer(color)
+
+    def _buffer(self, color):
+        buffer = self.buffers.get(color)
+        if buffer is None:
+            rgb = _rgb(color)
+            order = self.byte_order
+            # Let the driver lay it out (it may have its own order, e.g. GRB) in a buffer of its
+            # own, which is then never changed.
+            buffer = self.np.buf = bytearray(len(self.np.buf))
+            self.np.fill((rgb[order[0]], rgb[order[1]], rgb[order[2]]))
+            self.buffers[color] = buffer
+            if self.shown is not None:
+                self.np.buf = self.shown
+        return buffer
+
+    def _write(self, buffer):
+        if buffer == self.shown:
+            self.skipped += 1
+            return
+        self.np.buf = buffer  # Swapped in rather than copied, a slice copy allocates
+        self.np.write()
+        self.shown = buffer
+        self.writes += 1
+
+    def set(self, color=OFF):
+        """
+        @param color: (R, G, B), or a hex int like the LCD colors
+        """
+        self.steady = self._buffer(color)
+        if self._blink is None:
+            self._write(self.steady)
+
+    def blink(self, color, duration_ms=IDENTIFY_MS, period_ms=BLINK_PERIOD_MS, other=OFF):
+        """
+        Alternate between two colors for a while, then go back to the last set() color.
+        """
+        self._blink = [self._buffer(color), self._buffer(other), duration_ms // period_ms]
+        self._write(self._blink[0])
+        if self._timer is None:
+            self._timer = machine.Timer(self._timer_id)
+        self._timer.init(period=period_ms, mode=machine.Timer.PERIODIC, callback=self._tick_callback)
+
+    def identify(self, duration_ms=IDENTIFY_MS):
+        self.blink(IDENTIFY_COLOR, duration_ms)
+
+    @property
+    def blinking(self):
+        return self._blink is not None
+
+    def _tick(self, timer):
+        blink = self._blink
+        if blink is None:
+            return
+        blink[2] -= 1
+        if blink[2] > 0:
+            self._write(blink[blink[2] % 2])
+            return
+        timer.deinit()
+        self._blink = None
+        if self.steady is not None:
+            self._write(self.steady)
+
+    def print_stats(self):
+        print(f"[LEDS] {self.writes} writes, {self.skipped} skipped, {len(self.buffers)} colors")
@@ -0,0 +1,24 @@
+"""
+Freeze manifest for building the TallyHo client into the lvgl_micropython firmware image.
+
+Frozen modules run straight from flash, so they cost no heap to load and no time to compile.
+
+    cd lvgl_micropython
+    python3 make.py esp32 BOARD=ESP32_GENERIC_C3 DISPLAY=GC9A01 FROZEN_MANIFEST=../client/manifest.py
+
+boot.py isn't frozen so the bootloader can still be replaced over the REPL, and it will happily
+import the frozen tally module when no tally.py/tally.mpy is on the filesystem.
+"""
+include("$(PORT_DIR)/boards/manifest.py")
+
+module("backoff.py", base_path="$(MPY_DIR)/../../../client")
+module("boards.py", base_path="$(MPY_DIR)/../../../client")
+module("clocksync.py", base_path="$(MPY_DIR)/../../../client")
+module("frames.py", base_path="$(MPY_DIR)/../../../client")
+module("leds.py", base_path="$(MPY_DIR)/../../../client")
+module("notices.py", base_path="$(MPY_DIR)/../../../client")
+module("ota.py", base_path="$(MPY_DIR)/../../../client")
+module("power.py", base_path="$(MPY_DIR)/../../../client")
+module("telemetry.py", base_path="$(MPY_DIR)/../../../client")
+module("servers.py", base_path="$(MPY_DIR)/../../../client")
+module("tally.py", base_path="$(MPY_DIR)/../../../client")
@@ -0,0 +1,174 @@
+"""
+TallyHo Client notices
+
+Messages like "Waiting for data..." or "Ping time exceeded!", shown either full screen, or as an
+overlay across the middle of the tally screen so the tally state stays visible behind it.
+
+Full screen messages are built once for each icon and color and kept (up to MESSAGE_SCREENS,
+the least recently used is deleted first), so showing one again only changes its text. The
+overlay is a single panel on LVGL's top layer, shown and hidden without loading another screen.
+Every show and clear is rendered and flushed straight away and timed, see print_stats().
+"""
+import gc
+import time
+
+import lvgl as lv
+
+MESSAGE_SCREENS = 3
+COLOR_WARNING = 0xFF6600
+COLOR_BACKGROUND = 0x220000
+
+
+class fullScreenMessage:
+    """
+    Display class for displaying a full screen message with icon, or an overlay notice
+    """
+
+    def __init__(self, on_color=None):
+        """
+        @param on_color: Called with the color of each notice shown, and with no arguments when
+            cleared, e.g. to match the neopixel to it and then put the tally state color back.
+        """
+        self.on_color = on_color
+        self.main_screen = None  # Screen to go back to when a full screen message is cleared
+        self.screens = []  # [key, screen, text_label], least recently used first
+        self.styles = {}  # Color: icon style, shared by the screens
+        self.overlay = None  # Panel, built on first use
+        self.overlay_label = None
+        self.overlay_styles = {}  # Color: overlay text style
+        self.showing = None  # None, or the key of what's shown
+        self._text = None
+        # Flush timing and heap counters
+        self.shows = 0
+        self.clears = 0
+        self.skipped = 0
+        self.show_us_max = 0
+        self.clear_us_max = 0
+        self.heap_min = None  # Least free heap seen after showing a notice
+
+    def _screen(self, icon, color):
+        """
+        The full screen message for an icon and color, built if we don't have it.
+        @returns list: [key, screen, text_label]
+        """
+        key = ("screen", icon, color)
+        for entry in self.screens:
+            if entry[0] == key:
+                # Most recently used goes to the end.
+                self.screens.remove(entry)
+                self.screens.append(entry)
+                return entry
+        if len(self.screens) >= MESSAGE_SCREENS:
+            for entry in self.screens:
+                if entry[0] != self.showing:
+                    self.screens.remove(entry)
+                    entry[1].delete()
+                    break
+        if color not in self.styles:
+            style = lv.style_t()
+            style.init()
+            style.set_text_font(lv.font_montserrat_48)
+            style.set_text_color(lv.color_hex(color))
+            self.styles[color] = style
+        screen = lv.obj()
+        screen.set_style_bg_color(lv.color_hex(COLOR_BACKGROUND), 0)
+        icon_label = lv.label(screen)
+        icon_label.add_style(self.styles[color], lv.PART.MAIN)
+        icon_label.set_text(icon)
+        icon_label.align(lv.ALIGN.CENTER, 0, -40)
+        text_label = lv.label(screen)
+        text_label.align(lv.ALIGN.CENTER, 0, 30)
+        entry = [key, screen, text_label]
+        self.screens.append(entry)
+        return entry
+
+    def _show_overlay(self, msg, icon, color):
+        if not self.overlay:
+            self.overlay = lv.obj(lv.layer_top())
+            self.overlay.set_size(lv.pct(100), lv.SIZE_CONTENT)
+            self.overlay.set_style_bg_color(lv.color_hex(COLOR_BACKGROUND), 0)
+            self.overlay.set_style_bg_opa(lv.OPA._80, 0)
+            self.overlay.set_style_border_width(0, 0)
+            self.overlay.set_style_radius(0, 0)
+            self.overlay.align(lv.ALIGN.CENTER, 0, 0)
+            self.overlay_label = lv.label(self.overlay)
+            self.overlay_label.align(lv.ALIGN.CENTER, 0, 0)
+        if color not in self.overlay_styles:
+            style = lv.style_t()
+            style.init()
+            style.set_text_color(lv.color_hex(color))
+            self.overlay_styles[color] = style
+        if not self.showing or self.showing[1:] != (icon, color) or self.showing[0] != "overlay":
+            for style in self.overlay_styles.values():
+                self.overlay_label.remove_style(style, lv.PART.MAIN)
+            self.overlay_label.add_style(self.overlay_styles[color], lv.PART.MAIN)
+        self.overlay_label.set_text(f"{icon} {msg}")
+        self.overlay.remove_flag(lv.obj.FLAG.HIDDEN)
+
+    # Symbols: https://docs.lvgl.io/master/details/main-components/font.html#special-fonts
+    def display(self, msg=None, icon=lv.SYMBOL.WARNING, color=COLOR_WARNING, clear_screen=None, overlay=False):
+        """
+        @param msg: Message to display below Icon. Set None to revert to the clear_screen screen.
+        @param icon: LVGL Icon or Unicode str to display
+        @param color: Hex color to color icon in.
+        @param clear_screen: Screen to load on clearing a message screen. Defaults to the main scrn
+        @param overlay: Show the message over the current screen, rather than full screen.
+        """
+        if not msg:
+            self.clear(clear_screen)
+            return
+        msg = str(msg)
+        key = ("overlay" if overlay else "screen", icon, color)
+        if key == self.showing and self._text == msg:
+            self.skipped += 1
+            return
+        start = time.ticks_us()
+        if overlay:
+            if self.showing and self.showing[0] == "screen":
+                lv.screen_load(self.main_screen)
+            self._show_overlay(msg, icon, color)
+        else:
+            if self.showing and self.showing[0] == "overlay":
+                self.overlay.add_flag(lv.obj.FLAG.HIDDEN)
+            entry = self._screen(icon, color)
+            entry[2].set_text(msg)
+            if self.showing != key:
+                lv.screen_load(entry[1])
+        self.showing = key
+        self._text = msg
+        lv.refr_now(None)
+        self.show_us_max = max(self.show_us_max, time.ticks_diff(time.ticks_us(), start))
+        self.shows += 1
+        free = gc.mem_free()
+        if self.heap_min is None or free < self.heap_min:
+            self.heap_min = free
+
+        # If we have a neopixel, make it match the icon color.
+        if self.on_color:
+            self.on_color(color)
+
+    def clear(self, clear_screen=None):
+        """
+        Take down whatever notice is showing.
+        @param clear_screen: Screen to load after a full screen message. Defaults to the main screen.
+        """
+        if not self.showing:
+            return
+        start = time.ticks_us()
+        if self.showing[0] == "overlay":
+            self.overlay.add_flag(lv.obj.FLAG.HIDDEN)
+        else:
+            lv.screen_load(clear_screen if clear_screen else self.main_screen)
+        self.showing = None
+        self._text = None
+        lv.refr_now(None)
+        self.clear_us_max = max(self.clear_us_max, time.ticks_diff(time.ticks_us(), start))
+        self.clears += 1
+        if self.on_color:
+            self.on_color()  # Back to the tally state's color
+
+    def print_stats(self):
+        print(
+            f"[NOTICES] {self.shows} shown, {self.clears} cleared, {self.skipped} skipped, max show {self.show_us_max}us, "
+            f"max clear {self.clear_us_max}us, {len(self.screens)} screens cached, min free heap {self.heap_min}"
+        )
@@ -0,0 +1,154 @@
+"""
+TallyHo Client over the air updates
+
+Receives new client files from the server over the tally connection.
+
+OTA_BEGIN: {"ID": ..., "CHUNK_SIZE": 1024, "FILES": [{"NAME": "tally.py", "SIZE": ..., "SHA256": ...}]}
+OTA_CHUNK: {"ID": ..., "NAME": ..., "INDEX": 0, "SHA256": <of this chunk>, "DATA": <base64>}
+OTA_END:   {"ID": ...}
+
+Every chunk is checked and written to a staging file, then ACKed (or NAKed so the server resends).
+Once all files check out on OTA_END, the current files are kept as .bak and the staged files
+renamed into place. config/ota_pending lists them so the bootloader can roll back if the new
+code fails to boot, until tally.py marks a successful boot.
+"""
+import binascii
+import hashlib
+import os
+
+OTA_DIR = "ota/"
+CONFIG_OTA_PENDING = "config/ota_pending"
+CONFIG_OTA_VERSION = "config/ota_version"
+CONFIG_BOOT_SUCCESS = "config/unsuccessful_boots"  # The bootloader's count, see boot.py
+
+
+def _hex(hash):
+    return binascii.hexlify(hash.digest()).decode()
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:  # Doesn't exist
+        pass
+
+
+class OtaReceiver:
+    def __init__(self):
+        self.update = None  # The OTA_BEGIN we're receiving
+        self.ready = False  # Files switched over, reset to run them.
+        self._file = None
+        self._file_name = None
+        self._file_hash = None
+        self._next_index = 0
+        self._hashes = {}
+
+    def handle(self, message):
+        """
+        @param message: Message containing an OTA_* key
+        @returns dict: Reply to send back to the server
+        """
+        try:
+            if "OTA_BEGIN" in message:
+                return self._begin(message["OTA_BEGIN"])
+            if "OTA_CHUNK" in message:
+                return self._chunk(message["OTA_CHUNK"])
+            if "OTA_END" in message:
+                return self._end(message["OTA_END"])
+        except Exception as e:
+            print(f"[OTA] ERROR: {type(e).__name__}: {e}")
+            return {"OTA_NAK": {"ERROR": f"{type(e).__name__}: {e}"}}
+
+    def _close_file(self):
+        if self._file:
+            self._file.close()
+            self._hashes[self._file_name] = _hex(self._file_hash)
+        self._file = None
+        self._file_name = None
+
+    def _begin(self, update):
+        self._close_file()
+        for file in update["FILES"]:
+            name = file["NAME"]
+            if "/" in name or name.startswith("."):
+                raise ValueError(f"Bad file name {name}")
+        try:
+            os.mkdir(OTA_DIR)
+        except OSError:  # Exists
+            pass
+        print(f"[OTA] Starting update {update['ID']}")
+        self.update = update
+        self._hashes = {}
+        return {"OTA_ACK": {"ID": update["ID"]}}
+
+    def _chunk(self, chunk):
+        if not self.update or chunk["ID"] != self.update["ID"]:
+            raise ValueError("Chunk for unknown update")
+        name = chunk["NAME"]
+        index = chunk["INDEX"]
+        reply = {"OTA_ACK": {"ID": chunk["ID"], "NAME": name, "INDEX": index}}
+        if name != self._file_name:
+            # Chunks arrive in order, one file after another.
+            self._close_file()
+            if name in self._hashes:
+                return reply  # Resend of a file we've finished
+            self._file = open(OTA_DIR + name, "wb")
+            self._file_name = name
+            self._file_hash = hashlib.sha256()
+            self._next_index = 0
+        if index < self._next_index:
+            return reply  # Resend after our ACK was lost, already written.
+        if index > self._next_index:
+            raise ValueError(f"Expected chunk {self._next_index}, got {index}")
+        data = binascii.a2b_base64(chunk["DATA"])
+        if _hex(hashlib.sha256(data)) != chunk["SHA256"]:
+            raise ValueError(f"Chunk {index} of {name} hash mismatch")
+        self._file.write(data)
+        self._file_hash.update(data)
+        self._next_index += 1
+        return reply
+
+    def _end(self, end):
+        if not self.update or end["ID"] != self.update["ID"]:
+            raise ValueError("End of unknown update")
+        self._close_file()
+        names = []
+        for file in self.update["FILES"]:
+            name = file["NAME"]
+            if self._hashes.get(name) != file["SHA256"]:
+                raise ValueError(f"{name} hash mismatch")
+            names.append(name)
+
+        # Mark pending first, so an interruption part way through still gets rolled back.
+        with open(CONFIG_OTA_PENDING, "w") as pending:
+            pending.write(f"{self.update['ID']}\n{','.join(names)}")
+        for name in names:
+            _remove(name + ".bak")
+            try:
+                os.rename(name, name + ".bak")
+            except OSError:  # New file
+                pass
+            os.rename(OTA_DIR + name, name)
+        # Start the bootloader counting again, the new files haven't booted successfully yet.
+        with open(CONFIG_BOOT_SUCCESS, "w") as boots:
+            boots.write("0")
+        print(f"[OTA] Update {self.update['ID']} ready, restarting.")
+        self.ready = True
+        return {"OTA_DONE": {"ID": self.update["ID"]}}
+
+
+def mark_success():
+    """
+    Called once the new code has booted successfully, so the bootloader won't roll it back.
+    @returns str: The version now marked as running, or None if no update was pending
+    """
+    try:
+        pending = open(CONFIG_OTA_PENDING).read()
+    except OSError:  # No update pending
+        return None
+    version = pending.split("\n", 1)[0]
+    print(f"[OTA] Update {version} booted successfully.")
+    with open(CONFIG_OTA_VERSION, "w") as file:
+        file.write(version)
+    _remove(CONFIG_OTA_PENDING)
+    return version
@@ -0,0 +1,127 @@
+"""
+TallyHo Client power management
+
+Runs the CPU flat out only while frames are arriving, and dims the backlight once the tally has
+been in standby for a while.
+
+ACTIVE:  A frame arrived recently. Full CPU speed.
+IDLE:    No frames for IDLE_AFTER_MS. Reduced CPU speed.
+STANDBY: IDLE, and the camera has been off air for STANDBY_AFTER_MS. Backlight dimmed too.
+
+WiFi power saving stays off (PM_NONE) in every state. Modem sleep only listens for frames every
+beacon or DTIM interval, which would delay the next tally change by up to a few hundred ms, well
+past clocksync's APPLY_DELAY_MS. Frames always wake us to ACTIVE before they are handled, so
+rendering runs at full speed.
+"""
+import time
+
+POWER_ACTIVE = "ACTIVE"
+POWER_IDLE = "IDLE"
+POWER_STANDBY = "STANDBY"
+POWER_STATES = (POWER_ACTIVE, POWER_IDLE, POWER_STANDBY)
+
+IDLE_AFTER_MS = 1000 * 2  # 2 secs
+STANDBY_AFTER_MS = 1000 * 60 * 5  # 5 mins
+CPU_FREQ_IDLE_HZ = 80000000  # 80Mhz, lowest the WiFi is happy with
+STANDBY_BL_PCT = 10  # Percentage of the configured brightness
+
+
+class PowerManager:
+    def __init__(self, display, sta_if, backlight_pct, cpu_freq_hz):
+        """
+        @param display: Display driver, for the backlight
+        @param sta_if: WLAN station interface
+        @param backlight_pct: Configured (undimmed) backlight brightness
+        @param cpu_freq_hz: Full CPU speed
+        """
+        import machine
+
+        self.machine = machine
+        self.display = display
+        self.sta_if = sta_if
+        self.backlight_pct = backlight_pct
+        self.dimmed = False
+        self.on_air = False
+
+        # CPU frequency for each state
+        self.settings = {
+            POWER_ACTIVE: cpu_freq_hz,
+            POWER_IDLE: CPU_FREQ_IDLE_HZ,
+            POWER_STANDBY: CPU_FREQ_IDLE_HZ,
+        }
+        sta_if.config(pm=sta_if.PM_NONE)  # The firmware defaults to modem sleep
+        self.state_ms = {state: 0 for state in POWER_STATES}
+
+        now = time.ticks_ms()
+        self.last_frame = now
+        self.on_air_changed = now
+        self.state = None
+        self.state_since = now
+        self._enter(POWER_ACTIVE)
+
+    def _enter(self, state):
+        now = time.ticks_ms()
+        if self.state:
+            self.state_ms[self.state] += time.ticks_diff(now, self.state_since)
+        self.state = state
+        self.state_since = now
+        self.machine.freq(self.settings[state])
+
+    def _set_dimmed(self, dimmed):
+        self.dimmed = dimmed
+        pct = self.backlight_pct
+        if dimmed:
+            pct = int(pct * STANDBY_BL_PCT / 100)
+        self.display.set_backlight(pct)
+
+    def wake(self):
+        """
+        Call as soon as a frame arrives, before handling it.
+        """
+        self.last_frame = time.ticks_ms()
+        if self.state != POWER_ACTIVE:
+            self._enter(POWER_ACTIVE)
+
+    def set_on_air(self, on_air):
+        """
+        @param on_air: Whether the camera is live or in preview
+        """
+        if on_air == self.on_air:
+            return
+        self.on_air = on_air
+        self.on_air_changed = time.ticks_ms()
+        if on_air and self.dimmed:
+            self._set_dimmed(False)
+
+    def set_backlight(self, pct):
+        self.backlight_pct = pct
+        self._set_dimmed(self.dimmed)
+
+    def update(self):
+        """
+        Call every loop to step down the power states.
+        """
+        now = time.ticks_ms()
+        if (
+            not self.on_air
+            and not self.dimmed
+            and time.ticks_diff(now, self.on_air_changed) > STANDBY_AFTER_MS
+        ):
+            self._set_dimmed(True)
+
+        if self.state == POWER_ACTIVE:
+            if time.ticks_diff(now, self.last_frame) > IDLE_AFTER_MS:
+                self._enter(POWER_STANDBY if self.dimmed else POWER_IDLE)
+        elif self.state == POWER_IDLE and self.dimmed:
+            self._enter(POWER_STANDBY)
+
+    def print_stats(self):
+        now = time.ticks_ms()
+        state_ms = self.state_ms.copy()
+        state_ms[self.state] += time.ticks_diff(now, self.state_since)
+        print(
+            "[POWER] "
+            + self.state
+            + ", time in states: "
+            + ", ".join(f"{state} {int(state_ms[state] / 1000)}s" for state in POWER_STATES)
+        )
@@ -0,0 +1,135 @@
+"""
+TallyHo Client server list
+
+Servers come from the server config ("host:port", comma separated for more than one), and from
+the discovery beacons servers broadcast on DISCOVERY_PORT (see server/discovery.py):
+
+    {"TALLYHO": {"PORT": 8000, "PRIORITY": 0}}
+
+Servers are ranked by how many times in a row they've failed, then configured servers ahead of
+discovered ones, then by PRIORITY (lowest first). Anyone on the LAN can send a beacon, so a
+beacon never changes a configured server's priority, and a discovered server is only used once
+the configured ones are failing. When the current server fails we go straight on to the next one, and only back off once we've
+tried them all. We stay with a working server rather than switching back mid-show.
+
+The resolved list is cached in config, so we can still find a server without DNS or a beacon.
+It's only written (to flash) when a server is added, not when a beacon changes a priority.
+"""
+import json
+import socket
+
+DISCOVERY_PORT = 8002
+DEFAULT_PRIORITY = 0
+
+
+class ServerList:
+    def __init__(self, configured, cached=None):
+        """
+        @param configured: "host:port[,host:port...]" from the server config
+        @param cached: As returned by cache() before, or None
+        """
+        self.servers = []  # [ip, port, priority, failures, configured]
+        self.current = None
+        self.changed = False  # The cache needs writing
+        self._tried = []  # Servers tried since we were last connected
+        self._discovery = None
+        if cached:
+            try:
+                for entry in cached.split(","):
+                    ip, port, priority = entry.strip().split(":")
+                    self.add(ip, int(port), int(priority))
+            except ValueError:
+                print(f"[SERVERS] Ignoring invalid cache: {cached}")
+        for entry in configured.split(","):
+            try:
+                host, port = entry.strip().rsplit(":", 1)
+                port = int(port)
+            except ValueError:
+                print(f"[SERVERS] Ignoring invalid server config: {entry}")
+                continue
+            try:
+                ip = socket.getaddrinfo(host, port)[0][-1][0]
+            except (OSError, IndexError) as e:
+                print(f"[SERVERS] Can't resolve {host}: {e}")
+                continue
+            self.add(ip, port, DEFAULT_PRIORITY, configured=True)
+        self.changed = False
+
+    def add(self, ip, port, priority, configured=False):
+        """
+        @param configured: From the server config, rather than a beacon or the cache
+        """
+        for server in self.servers:
+            if server[0] == ip and server[1] == port:
+                if configured:
+                    server[2] = priority
+                    server[4] = True
+                elif not server[4]:
+                    server[2] = priority
+                return
+        print(f"[SERVERS] Found {ip}:{port}, priority {priority}{' (configured)' if configured else ''}")
+        self.servers.append([ip, port, priority, 0, configured])
+        self.changed = True
+
+    def next(self):
+        """
+        @returns tuple: The (ip, port) to connect to next, or None if we don't know any servers.
+        """
+        if not self.servers:
+            return None
+        self.current = min(self.servers, key=lambda server: (server[3], not server[4], server[2]))
+        if self.current not in self._tried:
+            self._tried.append(self.current)
+        return (self.current[0], self.current[1])
+
+    def connected(self):
+        """
+        Call once the current server is talking to us.
+        """
+        if self.current:
+            self.current[3] = 0
+        self._tried = []
+
+    def failed(self):
+        """
+        Call when the current server has failed.
+        @returns bool: True if there's another server to try straight away, False to back off first.
+        """
+        if self.current:
+            self.current[3] += 1
+        if len(self._tried) < len(self.servers):
+            return True
+        self._tried = []
+        return False
+
+    def listen(self):
+        """
+        Start listening for discovery beacons. Call poll() to handle them.
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("0.0.0.0", DISCOVERY_PORT))
+        sock.setblocking(False)
+        self._discovery = sock
+
+    def poll(self):
+        """
+        Handle any discovery beacons received, without waiting.
+        """
+        while self._discovery:
+            try:
+                data, addr = self._discovery.recvfrom(256)
+            except OSError:
+                return  # Nothing waiting
+            try:
+                beacon = json.loads(data.decode())["TALLYHO"]
+                self.add(addr[0], int(beacon["PORT"]), int(beacon.get("PRIORITY", DEFAULT_PRIORITY)))
+            except (ValueError, KeyError, TypeError):
+                print(f"[SERVERS] Invalid beacon from {addr[0]}")
+
+    def cache(self):
+        """
+        @returns str: The list to save in config, for next boot.
+        """
+        self.changed = False
+        return ",".join(f"{server[0]}:{server[1]}:{server[2]}" for server in self.servers)
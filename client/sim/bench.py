@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+"""
+TallyHo Client benchmarks, on the simulator's stand-in hardware
+
+    python bench.py notices
+    python bench.py leds
+
+Times here are CPython's, not the board's, so compare runs with each other rather than with
+the [INDICATOR]/[NOTICES] figures a tally prints. Object and allocation counts carry over.
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(SIM_DIR))
+sys.path.insert(0, SIM_DIR)
+
+from run import patch_micropython_builtins  # noqa: E402
+
+patch_micropython_builtins()
+
+import lvgl as lv  # noqa: E402
+
+
+def bench_notices(args):
+    """
+    Cycle through the notices a tally shows while it loses and finds the server, and check the
+    LVGL objects and heap they use stay bounded.
+    """
+    from notices import fullScreenMessage
+
+    colors = []
+    notices = fullScreenMessage(lambda color=None: colors.append(color))
+    notices.main_screen = lv.screen_active()
+    cycle = [
+        ("Waiting for data...", lv.SYMBOL.REFRESH, False),
+        (None, None, False),
+        ("Ping time exceeded!", lv.SYMBOL.WARNING, True),
+        ("Ping time exceeded!", lv.SYMBOL.WARNING, True),  # Repeats are skipped
+        ("[Errno 104] ECONNRESET", lv.SYMBOL.WARNING, True),
+        (None, None, False),
+        ("WIFI Connecting...\nSSID:studio", lv.SYMBOL.WIFI, False),
+        ("Invalid Cam Number", lv.SYMBOL.WARNING, False),
+        ("Setting Cam 1", lv.SYMBOL.PLUS, False),
+        (None, None, False),
+    ]
+    objects = lv.objects
+    blocks = sys.getallocatedblocks()
+    started = time.perf_counter()
+    for i in range(args.cycles):
+        for msg, icon, overlay in cycle:
+            if msg:
+                notices.display(msg, icon, overlay=overlay)
+            else:
+                notices.display(None)
+        if i == 0:
+            first_objects = lv.objects - objects
+            first_blocks = sys.getallocatedblocks() - blocks
+    took = time.perf_counter() - started
+    operations = args.cycles * len(cycle)
+    print(f"{operations} notices shown/cleared: {took / operations * 1e6:.1f}us each (CPython)")
+    print(f"LVGL objects: +{first_objects} after the first cycle, +{lv.objects - objects} after {args.cycles}")
+    print(f"Allocated blocks: +{first_blocks} after the first cycle, +{sys.getallocatedblocks() - blocks} after {args.cycles}")
+    print(f"Neopixel changes: {len(colors)}")
+    notices.print_stats()
+
+
+def _old_set_neopixel_rgb(np, byte_order, rgb=(0, 0, 0), hex=-1):
+    """
+    set_neopixel_rgb() as it was before leds.py, for comparison.
+    """
+    new_rgb = [0, 0, 0]
+    if hex > -1:
+        rgb = [(hex & 0xFF0000) >> 16, (hex & 0x00FF00) >> 8, hex & 0x0000FF]
+    if byte_order != [0, 1, 2]:
+        print(f"Reordering neopixel from: {rgb} using byteorder: {byte_order}")
+        new_rgb[0] = rgb[byte_order[0]]
+        new_rgb[1] = rgb[byte_order[1]]
+        new_rgb[2] = rgb[byte_order[2]]
+    else:
+        new_rgb = rgb
+    print(f"Setting neopixel to: {new_rgb}")
+    np.fill(new_rgb)
+    np.write()
+
+
+def bench_leds(args):
+    """
+    Feed the neopixel the colors a tally sets as frames come in (mostly repeats, other cameras
+    cutting doesn't change ours), the old way and through leds.Leds, counting the writes and
+    the memory allocated per change.
+    """
+    import neopixel
+    from leds import Leds
+
+    red, green, off, warning = (255, 0, 0), (0, 255, 0), (0, 0, 0), 0xFF6600
+    byte_order = (1, 0, 2)
+    rng = random.Random(1)
+    colors = [rng.choice((red, green, off, off, off)) for _ in range(args.changes)]
+    for i in range(0, args.changes, 50):
+        colors[i] = warning  # A notice now and then
+
+    def run(set_color):
+        tracemalloc.start()
+        transient = 0
+        started = time.perf_counter()
+        for color in colors:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            set_color(color)
+            transient += tracemalloc.get_traced_memory()[1] - before
+        took = time.perf_counter() - started
+        tracemalloc.stop()
+        return took, transient
+
+    # Measuring allocates a little itself. The counters are heap ints on CPython, not MicroPython.
+    _, baseline = run(lambda color: None)
+
+    np = neopixel.NeoPixel(None, args.pixels)
+    stdout = sys.stdout
+    sys.stdout = io.StringIO()  # The old way prints twice per change
+    try:
+        took, transient = run(
+            lambda color: _old_set_neopixel_rgb(np, byte_order, hex=color)
+            if isinstance(color, int)
+            else _old_set_neopixel_rgb(np, byte_order, color)
+        )
+    finally:
+        printed = len(sys.stdout.getvalue())
+        sys.stdout = stdout
+    changes = len(colors)
+    print(f"{changes} state changes, {args.pixels} pixel(s)")
+    print(
+        f"  set_neopixel_rgb: {np.writes / changes:.2f} writes, {(transient - baseline) / changes:.0f} bytes allocated, "
+        f"{printed / changes:.0f} chars printed, {took / changes * 1e6:.1f}us per change (CPython)"
+    )
+
+    np = neopixel.NeoPixel(None, args.pixels)
+    leds = Leds(np, byte_order)
+    leds.prepare(red, green, off, warning)
+    took, transient = run(leds.set)
+    print(
+        f"  Leds:             {np.writes / changes:.2f} writes, {(transient - baseline) / changes:.0f} bytes allocated, "
+        f"{took / changes * 1e6:.1f}us per change (CPython)"
+    )
+    leds.print_stats()
+
+    # Blink from the timer while the colors keep changing underneath.
+    leds.blink(green, duration_ms=200, period_ms=20)
+    for color in colors[:100]:
+        leds.set(color)
+    time.sleep(0.3)
+    shown = "the last color set" if np.buf == leds.steady else "NOT the last color set"
+    print(f"  Blink: {leds.writes} writes after, showing {shown}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TallyHo Client benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    notices = subparsers.add_parser("notices", help="Notice screen and overlay show/clear cost and memory")
+    notices.add_argument("--cycles", type=int, default=1000)
+    notices.set_defaults(function=bench_notices)
+
+    leds = subparsers.add_parser("leds", help="Neopixel writes and allocations per tally state change")
+    leds.add_argument("--changes", type=int, default=10000)
+    leds.add_argument("--pixels", type=int, default=1)
+    leds.set_defaults(function=bench_leds)
+
+    args = parser.parse_args()
+    args.function(args)
@@ -0,0 +1,9 @@
+"""
+Simulator stand-in for the lvgl_micropython lcd_bus module.
+"""
+
+
+class SPIBus:
+    def __init__(self, spi_bus=None, freq=0, dc=-1, cs=-1, **kwargs):
+        self.spi_bus = spi_bus
+        self.freq = freq
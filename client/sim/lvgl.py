@@ -0,0 +1,150 @@
+"""
+Headless stand-in for the lvgl module, used by the TallyHo simulator.
+
+Widgets accept any method call and do nothing with it, apart from keeping track of what a
+label shows, which objects are hidden, and which screen is loaded so the simulator can report
+them. objects counts the widgets that haven't been deleted, to spot leaks.
+"""
+
+
+class _Enum:
+    def __init__(self, **values):
+        for name, value in values.items():
+            setattr(self, name, value)
+
+
+ALIGN = _Enum(CENTER=9, TOP_MID=2, BOTTOM_MID=5)
+OPA = _Enum(TRANSP=0, _50=127, _80=204, COVER=255)
+SIZE_CONTENT = 0x7FF | 0x2000
+COLOR_FORMAT = _Enum(RGB565=0x12)
+DISPLAY_ROTATION = _Enum(_0=0, _90=1, _180=2, _270=3)
+EVENT = _Enum(ALL=0, CLICKED=10, VALUE_CHANGED=35)
+PART = _Enum(MAIN=0x000000, INDICATOR=0x020000, KNOB=0x030000)
+SYMBOL = _Enum(
+    GPS="[GPS]",
+    PLUS="[PLUS]",
+    REFRESH="[REFRESH]",
+    WARNING="[WARNING]",
+    WIFI="[WIFI]",
+)
+
+font_montserrat_16 = "montserrat_16"
+font_montserrat_48 = "montserrat_48"
+
+
+def _noop(*args, **kwargs):
+    return None
+
+
+class _Stub:
+    """
+    Accepts any method call, e.g. set_style_bg_color(), align(), add_style()
+    """
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return _noop
+
+
+class style_t(_Stub):
+    pass
+
+
+objects = 0  # Widgets created and not deleted
+
+
+def pct(value):
+    return value | 0x2000
+
+
+class obj(_Stub):
+    FLAG = _Enum(HIDDEN=0x0001, CLICKABLE=0x0002)
+
+    def __init__(self, parent=None):
+        global objects
+        self.parent = parent
+        self.children = []
+        self.flags = 0
+        if parent:
+            parent.children.append(self)
+        objects += 1
+
+    def add_flag(self, flag):
+        self.flags |= flag
+
+    def remove_flag(self, flag):
+        self.flags &= ~flag
+
+    def has_flag(self, flag):
+        return bool(self.flags & flag)
+
+    def delete(self):
+        global objects
+        for child in self.children:
+            child.delete()
+        self.children = []
+        objects -= 1
+
+
+class button(obj):
+    pass
+
+
+class arc(obj):
+    pass
+
+
+class label(obj):
+    text = ""
+
+    def set_text(self, text):
+        self.text = text
+
+    def get_text(self):
+        return self.text
+
+
+def color_hex(value):
+    return value
+
+
+def color_black():
+    return 0x000000
+
+
+_initialized = False
+_screen_active = obj()
+_layer_top = obj()
+
+
+def is_initialized():
+    return _initialized
+
+
+def init():
+    global _initialized
+    _initialized = True
+
+
+def deinit():
+    global _initialized
+    _initialized = False
+
+
+def screen_active():
+    return _screen_active
+
+
+def layer_top():
+    return _layer_top
+
+
+def screen_load(scr):
+    global _screen_active
+    _screen_active = scr
+
+
+def refr_now(disp):
+    pass
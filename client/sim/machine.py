@@ -0,0 +1,87 @@
+"""
+Simulator stand-in for the MicroPython machine module.
+"""
+import sys
+import threading
+import time
+
+_freq = 160000000
+
+
+def freq(hz=None):
+    global _freq
+    if hz is None:
+        return _freq
+    _freq = hz
+
+
+def reset():
+    print("[SIM] machine.reset()")
+    sys.exit(1)
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+
+    def __init__(self, id, mode=-1, *args, **kwargs):
+        self.id = id
+        self._value = 0
+
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        self._value = value
+
+
+class WDT:
+    """
+    Doesn't reset, but reports if the watchdog would have fired.
+    """
+
+    def __init__(self, id=0, timeout=5000):
+        self.timeout = timeout
+        self.last_feed = time.monotonic()
+
+    def feed(self):
+        now = time.monotonic()
+        if (now - self.last_feed) * 1000 > self.timeout:
+            print(f"[SIM] WDT would have reset, not fed for {(now - self.last_feed):.1f}s")
+        self.last_feed = now
+
+
+class Timer:
+    """
+    Calls back from a thread, rather than scheduling the callback on the main thread.
+    """
+
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, **kwargs):
+        self.id = id
+        self._stop = None
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, period=-1, callback=None, **kwargs):
+        self.deinit()
+        stop = self._stop = threading.Event()
+
+        def run():
+            while not stop.wait(period / 1000):
+                callback(self)
+                if mode == Timer.ONE_SHOT:
+                    return
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def deinit(self):
+        if self._stop:
+            self._stop.set()
+
+
+class SPI:
+    class Bus:
+        def __init__(self, host=1, mosi=-1, miso=-1, sck=-1, **kwargs):
+            self.host = host
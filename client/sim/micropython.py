@@ -0,0 +1,7 @@
+"""
+Simulator stand-in for the micropython module.
+"""
+
+
+def const(value):
+    return value
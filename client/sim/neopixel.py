@@ -0,0 +1,29 @@
+"""
+Simulator stand-in for the neopixel module. Counts writes so they can be compared.
+"""
+
+
+class NeoPixel:
+    def __init__(self, pin, n, bpp=3, timing=1):
+        self.pin = pin
+        self.n = n
+        self.buf = bytearray(n * bpp)
+        self.writes = 0
+
+    def __len__(self):
+        return self.n
+
+    def __setitem__(self, index, value):
+        offset = index * 3
+        self.buf[offset : offset + 3] = bytes(value)
+
+    def __getitem__(self, index):
+        offset = index * 3
+        return tuple(self.buf[offset : offset + 3])
+
+    def fill(self, value):
+        for i in range(self.n):
+            self[i] = value
+
+    def write(self):
+        self.writes += 1
@@ -0,0 +1,56 @@
+"""
+Simulator stand-in for the MicroPython network module.
+The simulator uses the host's real network, so the WLAN always connects straight away.
+The MAC address is taken from the TALLY_SIM_MAC environment variable.
+"""
+import os
+
+_MAC = os.environ.get("TALLY_SIM_MAC", "02:00:00:00:00:01")
+
+
+class WLAN:
+    IF_STA = 0
+    IF_AP = 1
+    PM_NONE = 0
+    PM_PERFORMANCE = 1
+    PM_POWERSAVE = 2
+
+    def __init__(self, interface=IF_STA):
+        self.interface = interface
+        self._active = False
+        self._connected = False
+        self._config = {"pm": self.PM_PERFORMANCE}
+
+    def active(self, value=None):
+        if value is None:
+            return self._active
+        self._active = value
+
+    def connect(self, ssid=None, key=None):
+        self._connected = True
+
+    def disconnect(self):
+        self._connected = False
+
+    def isconnected(self):
+        return self._connected
+
+    def config(self, param=None, **kwargs):
+        if kwargs:
+            self._config.update(kwargs)
+            return
+        if param == "mac":
+            return bytes(int(b, 16) for b in _MAC.split(":"))
+        if param in self._config:
+            return self._config[param]
+        raise ValueError(f"Unknown param: {param}")
+
+    def ipconfig(self, param):
+        if param == "addr4":
+            return ("127.0.0.1", "255.0.0.0")
+        raise ValueError(f"Unknown param: {param}")
+
+    def status(self, param=None):
+        if param == "rssi":
+            return -50
+        return 1010 if self._connected else 1000
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+"""
+TallyHo Client Simulator
+
+Runs the unmodified tally.py client on a development machine (CPython) using the SIMULATOR
+board: the display, neopixel, watchdog and WiFi are headless stand-ins from this directory,
+while the connection to the server uses real sockets.
+
+    python run.py --server 127.0.0.1:8000 --camera 2
+    python run.py --server 127.0.0.1:8000 --count 200 --quiet
+
+Each simulated tally gets its own config directory under --workdir and its own MAC address.
+Multiple tallies each run in their own process, as tally.py keeps its state in module globals.
+"""
+import argparse
+import errno
+import gc
+import os
+import socket
+import subprocess
+import sys
+import time
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+CLIENT_DIR = os.path.dirname(SIM_DIR)
+
+
+def sim_mac(instance):
+    return f"02:00:00:00:{(instance >> 8) & 0xFF:02X}:{instance & 0xFF:02X}"
+
+
+def patch_micropython_builtins():
+    """
+    Add the MicroPython specific parts of builtin modules that tally.py uses.
+    """
+    start = time.monotonic()
+    time.ticks_ms = lambda: int((time.monotonic() - start) * 1000)
+    time.ticks_us = lambda: int((time.monotonic() - start) * 1000000)
+    time.ticks_add = lambda ticks, delta: ticks + delta
+    time.ticks_diff = lambda ticks1, ticks2: ticks1 - ticks2
+    time.sleep_ms = lambda ms: time.sleep(ms / 1000)
+    time.sleep_us = lambda us: time.sleep(us / 1000000)
+
+    # No fixed size heap here, report what the interpreter has allocated instead.
+    gc.mem_free = lambda: 0
+    gc.mem_alloc = lambda: sys.getallocatedblocks()
+
+    socket.socket = SimSocket
+
+
+class SimSocket(socket.socket):
+    """
+    MicroPython socket timeouts are OSError(EAGAIN/ETIMEDOUT), CPython's are socket.timeout.
+    """
+
+    def recv(self, size):
+        try:
+            return super().recv(size)
+        except (socket.timeout, BlockingIOError):
+            raise OSError(errno.EAGAIN, "EAGAIN")
+
+
+def write_config(workdir, args):
+    config_dir = os.path.join(workdir, "config")
+    os.makedirs(config_dir, exist_ok=True)
+    config = {
+        "model": "SIMULATOR",
+        "wifi": "simulator,simulator",
+        "server": args.server,
+        "camera": str(args.camera),
+    }
+    for name, value in config.items():
+        with open(os.path.join(config_dir, name), "w") as file:
+            file.write(value)
+
+
+def run_client(args):
+    workdir = os.path.join(args.workdir, str(args.instance))
+    write_config(workdir, args)
+    os.environ.setdefault("TALLY_SIM_MAC", sim_mac(args.instance))
+    os.chdir(workdir)
+
+    # Stand-in hardware modules take priority over anything installed.
+    sys.path.insert(0, CLIENT_DIR)
+    sys.path.insert(0, SIM_DIR)
+    patch_micropython_builtins()
+
+    import tally  # Runs the client
+
+
+def run_fleet(args):
+    """
+    Start a process per simulated tally and wait for them all to exit.
+    """
+    output = subprocess.DEVNULL if args.quiet else None
+    processes = []
+    for instance in range(args.count):
+        env = os.environ.copy()
+        env["TALLY_SIM_MAC"] = sim_mac(instance)
+        command = [
+            sys.executable,
+            os.path.abspath(__file__),
+            "--server",
+            args.server,
+            "--camera",
+            str(instance % args.cameras + 1),
+            "--workdir",
+            args.workdir,
+            "--instance",
+            str(instance),
+        ]
+        processes.append(
+            subprocess.Popen(command, env=env, stdout=output, stderr=output)
+        )
+    print(f"Started {len(processes)} simulated tallies")
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--server", default="127.0.0.1:8000", help="host:port")
+    parser.add_argument("--camera", type=int, default=1)
+    parser.add_argument(
+        "--count", type=int, default=1, help="Number of tallies to simulate"
+    )
+    parser.add_argument(
+        "--cameras",
+        type=int,
+        default=8,
+        help="Number of cameras to spread the tallies over when simulating several",
+    )
+    parser.add_argument("--workdir", default="/tmp/tallyho-sim")
+    parser.add_argument("--instance", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument(
+        "--quiet", action="store_true", help="Hide output from simulated tallies"
+    )
+    args = parser.parse_args()
+
+    if args.count > 1:
+        run_fleet(args)
+    else:
+        run_client(args)
@@ -0,0 +1,37 @@
+"""
+Headless display driver for the TallyHo simulator board (see boards.py).
+Takes the same arguments as the lvgl_micropython display drivers.
+"""
+
+
+class SimDisplay:
+    def __init__(
+        self, data_bus=None, display_width=0, display_height=0, backlight_pin=-1, **kwargs
+    ):
+        self.data_bus = data_bus
+        self.width = display_width
+        self.height = display_height
+        self.backlight = 0
+        self.power = False
+        self.rotation = 0
+
+    def init(self):
+        pass
+
+    def set_power(self, value):
+        self.power = value
+
+    def set_backlight(self, value):
+        self.backlight = value
+
+    def get_backlight(self):
+        return self.backlight
+
+    def set_rotation(self, value):
+        self.rotation = value
+
+    def get_physical_horizontal_resolution(self):
+        return self.width
+
+    def get_physical_vertical_resolution(self):
+        return self.height
@@ -0,0 +1,9 @@
+"""
+Simulator stand-in for the lvgl_micropython task_handler module.
+Nothing is rendered, so there is nothing to run periodically.
+"""
+
+
+class TaskHandler:
+    def __init__(self, duration=33, *args, **kwargs):
+        self.duration = duration
@@ -1,20 +1,25 @@
 #!/usr/bin/env python
 """
 TallyHo Client for ESP32 MicroPython with LVGL
+
+Hardware driver modules (display bus, LCD driver, neopixel, task handler, networking)
+are only imported once they are needed by the setup routines, so that only the drivers
+for the selected MODEL are loaded into the heap.
 """
-import lcd_bus
+import time
+
+# Ticks since reset, taken before anything else so we can report boot timings.
+_BOOT_TICKS_MS = time.ticks_ms()
+
+import gc
 
 # from lvgl_micropython import display_driver_framework
 from micropython import const
 import machine
-import time
 import errno
 from machine import WDT
 from os import mkdir
 
-_LCD_BYTE_ORDER_RGB = const(0x00)
-_LCD_BYTE_ORDER_BGR = const(0x08)
-
 COLOR_WARNING = 0xFF6600
 COLOR_OK = 0x007700
 
@@ -30,14 +35,14 @@ CAM_PREV: int = 0
 WIDTH: int = 0
 HEIGHT: int = 0
 
-LED_COLOR_RED = [255, 0, 0]
-LED_COLOR_GREEN = [0, 255, 0]
-LED_COLOR_BLUE = [0, 0, 255]
-LED_COLOR_YELLOW = [255, 255, 0]
-LED_COLOR_PURPLE = [255, 0, 255]
-LED_COLOR_CYAN = [0, 255, 255]
-LED_COLOR_WHITE = [255, 255, 255]
-LED_COLOR_OFF = [0, 0, 0]
+LED_COLOR_RED = (255, 0, 0)
+LED_COLOR_GREEN = (0, 255, 0)
+LED_COLOR_BLUE = (0, 0, 255)
+LED_COLOR_YELLOW = (255, 255, 0)
+LED_COLOR_PURPLE = (255, 0, 255)
+LED_COLOR_CYAN = (0, 255, 255)
+LED_COLOR_WHITE = (255, 255, 255)
+LED_COLOR_OFF = (0, 0, 0)
 LED_COLORS = [
     LED_COLOR_RED,
     LED_COLOR_YELLOW,
@@ -51,43 +56,31 @@ LED_COLORS = [
 MAX_CAMERAS = 99
 
 PING_PERIOD_MS = 1000 * 10  # 10 secs
+CONNECT_TIMEOUT_S = 2
+RENDER_PERIOD_MS = 33  # LVGL's default display refresh period
+WDT_TIMEOUT_MS = 1000 * 10  # 10 secs
 wdt: WDT
 
 # LVGL display engine
 import lvgl as lv
+import boards
+from boards import (
+    INDICATOR_STYLE_TOP,
+    INDICATOR_STYLE_BOTTOM,
+    INDICATOR_STYLE_LEFT,
+    INDICATOR_STYLE_RIGHT,
+    INDICATOR_STYLE_ARC,
+)
+from leds import IDENTIFY_MS, Leds
+from notices import fullScreenMessage
+
+print(
+    f"[BOOT] Core modules imported after {time.ticks_diff(time.ticks_ms(), _BOOT_TICKS_MS)}ms, free heap: {gc.mem_free()} bytes"
+)
 
 # The main lvgl Tally Screen
 scrn: lv.obj = None
 
-# MODEL = "ESP32-2424S012"
-MODEL = "ESP32-C6-LCD-1.47"
-
-INDICATOR_STYLE_TOP = "TOP"
-INDICATOR_STYLE_BOTTOM = "BOTTOM"
-INDICATOR_STYLE_LEFT = "LEFT"
-INDICATOR_STYLE_RIGHT = "RIGHT"
-INDICATOR_STYLE_ARC = "ARC"
-
-# Board config defaults
-
-_CPU_FREQ_HZ = 160000000  # 160Mhz. Valid options 80, 160 for C series ESP32
-_MISO = -1  # Uses bidirection MOSI line instead
-_HOST = 1  # SPI2, SPI1 is dedicated on ESP32 to flash
-_TOUCH_CS = -1  # No touch
-_TOUCH_FREQ = 10000000
-_LCD_FREQ = 80000000
-_LCD_ROTATION = lv.DISPLAY_ROTATION._0
-_LCD_BYTE_ORDER = _LCD_BYTE_ORDER_BGR
-_LCD_BYTE_COLOR_SWAP = True
-_LCD_OFFSET_X = 0
-_LCD_OFFSET_Y = 0
-_NEOPIXEL = -1
-_NEOPIXEL_COUNT = 1
-_NEOPIXEL_BYTE_ORDER = (
-    0,
-    1,
-    2,
-)  # R, B, G as array indexes, e.g. R is position 0 in the color array, G is position 1 etc
 _DEFAULT_BL_BRIGHTNESS_PCT = 80  # Don't fully cook the backlight.
 
 CONFIG_PATH = "config/"
@@ -96,6 +89,11 @@ CONFIG_MODEL = "model"
 CONFIG_BACKLIGHT = "backlight"
 CONFIG_WIFI = "wifi"
 CONFIG_CAMERA = "camera"
+CONFIG_SERVER = "server"
+CONFIG_SERVERS = "servers"  # Known servers, see servers.py
+CONFIG_OTA_VERSION = "ota_version"
+
+_DEFAULT_SERVER = "192.168.2.6:8000"
 
 
 def get_config_value(file, new_type: type = str, default: str = None):
@@ -129,6 +127,7 @@ def set_config_value(file, contents):
 
 
 _BOOT_SUCCESS = False
+BOOT_ATTEMPTS = 0  # Unsuccessful boots before this one, as counted by the bootloader
 
 
 def set_boot_success():
@@ -136,17 +135,18 @@ def set_boot_success():
     Mark to the bootloader that we started successfully
     Every boot it will reset this so it can detect if we're crashing
         and launch into the REPL for debug.
+    @returns bool: True if this marked an OTA update as running, so our HELLO is out of date
     """
     global _BOOT_SUCCESS
     if not _BOOT_SUCCESS:
         print("[BOOT] Marking successful boot.")
         set_config_value(CONFIG_BOOT_SUCCESS, "-1")
         _BOOT_SUCCESS = True
+        import ota
 
+        return ota.mark_success() is not None
+    return False
 
-MODEL_ESP32_2424S012 = "ESP32-2424S012"
-MODEL_ESP32_C6_LCD_1_47 = "ESP32-C6-LCD-1.47"
-MODELS = [MODEL_ESP32_2424S012, MODEL_ESP32_C6_LCD_1_47]
 
 MODEL: str = ""
 
@@ -155,7 +155,7 @@ def setup_model():
     global MODEL
     try:
         model = get_config_value(CONFIG_MODEL)
-        if model in MODELS:
+        if model in boards.BOARDS:
             MODEL = model
             return
     except:
@@ -163,7 +163,7 @@ def setup_model():
 
     print("No model set! Select one:")
     i = 0
-    for model in MODELS:
+    for model in boards.MODELS:
         print(f"[{i}]: {model}")
         i += 1
 
@@ -171,7 +171,7 @@ def setup_model():
         try:
             model_no = int(input("Input number: ").strip())
             if i > model_no > -1:
-                MODEL = MODELS[model_no]
+                MODEL = boards.MODELS[model_no]
                 set_config_value(CONFIG_MODEL, MODEL)
                 return
         except KeyboardInterrupt as e:
@@ -183,42 +183,8 @@ def setup_model():
 
 setup_model()
 
-# Sadly we don't have match case in this version of MicroPython.
-if MODEL == "ESP32-2424S012":
-    _WIDTH = 240
-    _HEIGHT = 240
-    _BL = 3
-    _DC = 2
-    _MOSI = 7
-    _MISO = -1
-    _SCK = 6
-    _LCD_CS = 10
-    _LCD_DRIVER_TYPE = "GC9A01"
-
-    _TOUCH_CS = 18
-    INDICATOR_STYLE = INDICATOR_STYLE_ARC
-
-
-elif MODEL == "ESP32-C6-LCD-1.47":
-    _WIDTH = 172
-    _HEIGHT = 320
-    _BL = 22
-    _DC = 15
-    _MOSI = 6
-    _SCK = 7
-
-    _LCD_CS = 14
-    _LCD_DRIVER_TYPE = "ST7789"
-    _LCD_ROTATION = lv.DISPLAY_ROTATION._270  # USB C port on left
-    _LCD_OFFSET_Y = int(
-        (240 - 172) / 2
-    )  # The display driver operates like a 240px width. The real display is 172px in the center.
-    _NEOPIXEL = 8
-    _NEOPIXEL_BYTE_ORDER = (1, 0, 2)  # Swap R and G
-
-    INDICATOR_STYLE = INDICATOR_STYLE_LEFT
-else:
-    raise Exception(f"Unknown board model defined: {MODEL}")
+# Pull the selected board's settings (_WIDTH, _LCD_DRIVER_TYPE, _NEOPIXEL etc) in as module globals.
+globals().update(boards.get_board(MODEL))
 
 
 def mac_2_str(mac, end_bytes=0):
@@ -235,74 +201,48 @@ def get_ip():
     return sta_if.ipconfig("addr4")[0]
 
 
-def get_subnet_mask():
-    return sta_if.ipconfig("addr4")[1]
-
-
-class fullScreenMessage:
-    """
-    Display class for displaying a full screen message with icon
-    """
-
-    icon_label: lv.label = None
-    text_label: lv.label = None
-    scrn_full: lv.obj = None
-    style: lv.style_t = lv.style_t()
-
-    def __init__(self):
-        self.style.init()
-
-    # Symbols: https://docs.lvgl.io/master/details/main-components/font.html#special-fonts
-    def display(
-        self, msg=None, icon=lv.SYMBOL.WARNING, color=COLOR_WARNING, clear_screen=None
-    ):
-        """
-        @param msg: Message to display below Icon. Set None to revert to the clear_screen screen.
-        @param icon: LVGL Icon or Unicode str to display
-        @param color: Hex color to color icon in.
-        @param clear_screen: Screen to load on clearing a message screen. Defaults to the main scrn
-        """
-        if not msg:
-            lv.screen_load(clear_screen if clear_screen else scrn)
-            if self.scrn_full:
-                del self.scrn_full
-                self.scrn_err = None
-                set_neopixel_rgb()  # Turn the neopixel off
-            return
-
-        elif not self.scrn_full:
-            self.scrn_full = lv.obj()
-            self.scrn_full.set_style_bg_color(lv.color_hex(0x220000), 0)
-
-            self.icon_label = lv.label(self.scrn_full)
+def get_rssi():
+    return sta_if.status("rssi")
 
-            self.style.set_text_font(lv.font_montserrat_48)
 
-            self.icon_label.align(lv.ALIGN.CENTER, 0, -40)
+def get_subnet_mask():
+    return sta_if.ipconfig("addr4")[1]
 
-            self.text_label = lv.label(self.scrn_full)
-            self.text_label.align(lv.ALIGN.CENTER, 0, 30)
 
-        self.style.set_text_color(lv.color_hex(color))
-        self.icon_label.remove_style(self.style, lv.PART.MAIN)
-        self.icon_label.add_style(self.style, lv.PART.MAIN)
-        self.icon_label.set_text(icon)
-        self.text_label.set_text(str(msg))
+tally_led = LED_COLOR_OFF  # Neopixel color of the tally state, shown again when a notice clears
 
-        lv.screen_load(self.scrn_full)
 
-        # If we have a neopixel, make it match the icon color.
+def _notice_color(color=None):
+    if color is None:
+        set_neopixel_rgb(tally_led)
+    else:
         set_neopixel_rgb(hex=color)
 
 
-fullScreen = fullScreenMessage()
+fullScreen = fullScreenMessage(_notice_color)
 
 
 # The indicator on screen for camera status (live, preview, standby)
 class Indicator:
+    """
+    Styles for each state are built once at init, changing state just swaps which one is applied.
+    Each change is rendered and flushed straight away and timed, see print_stats().
+    """
+
+    STATES = [COLOR_LIVE, COLOR_PREV, COLOR_STDBY]
+
     def __init__(self, screen, style):
         self.screen = screen
         self.style = style
+        self.state = None
+        self.state_styles = {}
+
+        # Render + flush timing counters
+        self.updates = 0
+        self.skipped = 0
+        self.render_us_total = 0
+        self.render_us_max = 0
+
         function = {
             INDICATOR_STYLE_ARC: self.init_arc,
             INDICATOR_STYLE_LEFT: self.init_bar,
@@ -313,26 +253,52 @@ class Indicator:
         function[style]()
 
     def set_state(self, state=COLOR_STDBY):
-        function = {
-            INDICATOR_STYLE_ARC: self._set_state_arc,
-            INDICATOR_STYLE_LEFT: self._set_state_bar,
-            INDICATOR_STYLE_RIGHT: self._set_state_bar,
-            INDICATOR_STYLE_TOP: self._set_state_bar,
-            INDICATOR_STYLE_BOTTOM: self._set_state_bar,
-        }
-        return function[self.style](state)
+        """
+        @param state: Color of the state to show, e.g. COLOR_LIVE
+        @returns bool: Whether the indicator was redrawn
+        """
+        if state == self.state:
+            self.skipped += 1
+            return False
+        start = time.ticks_us()
+        if self.style == INDICATOR_STYLE_ARC:
+            self._set_state_arc(state)
+        else:
+            self._set_state_bar(state)
+        self.state = state
+        # Render and flush just the invalidated indicator area now, rather than on the next task handler tick.
+        lv.refr_now(None)
+        render_us = time.ticks_diff(time.ticks_us(), start)
+        self.updates += 1
+        self.render_us_total += render_us
+        if render_us > self.render_us_max:
+            self.render_us_max = render_us
+        return True
+
+    def print_stats(self):
+        avg_us = int(self.render_us_total / self.updates) if self.updates else 0
+        print(
+            f"[INDICATOR] {self.style}: {self.updates} renders, {self.skipped} skipped, avg {avg_us}us, max {self.render_us_max}us"
+        )
+
+    def _get_state_style(self, state):
+        """
+        Get the prebuilt style for a state, building (and keeping) one for any other color asked for.
+        """
+        if state not in self.state_styles:
+            style = lv.style_t()
+            style.init()
+            if self.style == INDICATOR_STYLE_ARC:
+                style.set_arc_color(lv.color_hex(state))
+            else:
+                style.set_bg_color(lv.color_hex(state))
+            self.state_styles[state] = style
+        return self.state_styles[state]
 
     def init_arc(self):
         # Define an Arc to display the live / preview / standby status around the edge of the display
-        self.style_arc_live = lv.style_t()
-        self.style_arc_live.init()
-        # Default to the preview style
-        # It gets updated for live below.
-        self.style_arc_live.set_arc_color(lv.color_hex(COLOR_PREV))
-
-        self.style_arc_stdby = lv.style_t()
-        self.style_arc_stdby.init()
-        self.style_arc_stdby.set_arc_color(lv.color_hex(COLOR_STDBY))
+        for state in self.STATES:
+            self._get_state_style(state)
 
         arc = lv.arc(self.screen)
         arc.set_bg_angles(0, 360)
@@ -345,23 +311,30 @@ class Indicator:
         arc.set_size(_WIDTH, _HEIGHT)
         # Remove the arc touch knob
         arc.remove_style(None, lv.PART.KNOB)
-        arc.add_style(self.style_arc_live, lv.PART.INDICATOR)
-        arc.add_style(self.style_arc_stdby, lv.PART.MAIN)
+        # Default to the preview style until we get a state.
+        arc.add_style(self.state_styles[COLOR_PREV], lv.PART.INDICATOR)
+        # The rest of the ring is always the standby color.
+        arc.add_style(self.state_styles[COLOR_STDBY], lv.PART.MAIN)
 
+        self.arc_style_applied = self.state_styles[COLOR_PREV]
         self.arc = arc
 
     def init_bar(self):
         # Style will be a edge of the screen to put it.
+        # The position and size never change, only the color style on top of it.
         style = lv.style_t()
         style.init()
 
-        style.set_bg_color(lv.color_hex(COLOR_STDBY))
         style.set_radius(0)
         style.set_border_width(0)
 
+        for state in self.STATES:
+            self._get_state_style(state)
+
         # Create an object with the new style
         obj = lv.obj(self.screen)
         obj.add_style(style, 0)
+        obj.add_style(self.state_styles[COLOR_STDBY], 0)
 
         if self.style in [INDICATOR_STYLE_LEFT, INDICATOR_STYLE_RIGHT]:
             width = int(WIDTH * 0.3)
@@ -382,23 +355,28 @@ class Indicator:
         style.set_height(height)
 
         self.style_bar = style
+        self.bar_style_applied = self.state_styles[COLOR_STDBY]
         self.bar = obj
+        # Already showing standby
+        self.state = COLOR_STDBY
 
     def _set_state_arc(self, state):
         # Set the arc color to whatever color you like, if it's preview, carve out the arc to 80%.
-        self.style_arc_live.set_arc_color(lv.color_hex(state))
+        style = self._get_state_style(state)
+        if style is not self.arc_style_applied:
+            self.arc.remove_style(self.arc_style_applied, lv.PART.INDICATOR)
+            self.arc.add_style(style, lv.PART.INDICATOR)
+            self.arc_style_applied = style
         arc_value = 100
         if state == COLOR_PREV:
             arc_value = 80
-        # Reapply the style with the new color.
-        self.arc.remove_style(self.style_arc_live, lv.PART.INDICATOR)
-        self.arc.add_style(self.style_arc_live, lv.PART.INDICATOR)
         self.arc.set_value(arc_value)
 
     def _set_state_bar(self, state):
-        self.style_bar.set_bg_color(lv.color_hex(state))
-        self.bar.remove_style(self.style_bar, 0)
-        self.bar.add_style(self.style_bar, 0)
+        style = self._get_state_style(state)
+        self.bar.remove_style(self.bar_style_applied, 0)
+        self.bar.add_style(style, 0)
+        self.bar_style_applied = style
 
 
 ###
@@ -406,6 +384,9 @@ class Indicator:
 ###
 
 
+leds = None
+
+
 def setup_board():
     print("Setup_board")
     print(f"Setting CPU Freq to {_CPU_FREQ_HZ/1000000}MHz")
@@ -416,14 +397,15 @@ def setup_board():
             f"Failed to set CPU speed to {_CPU_FREQ_HZ}Hz, currently {machine.freq()}"
         )
     global wdt
-    wdt = WDT(timeout=10000)
+    wdt = WDT(timeout=WDT_TIMEOUT_MS)
     wdt.feed()
 
     if _NEOPIXEL > -1:
         import neopixel
 
-        global np
-        np = neopixel.NeoPixel(machine.Pin(_NEOPIXEL), _NEOPIXEL_COUNT)
+        global leds
+        leds = Leds(neopixel.NeoPixel(machine.Pin(_NEOPIXEL), _NEOPIXEL_COUNT), _NEOPIXEL_BYTE_ORDER)
+        leds.prepare(*LED_COLORS, COLOR_OK, COLOR_WARNING)  # Tally states and notices
 
         # Cycle all the colors and then off.
         for color in LED_COLORS:
@@ -431,7 +413,7 @@ def setup_board():
             time.sleep(0.2)
 
 
-display: display_driver_framework.DisplayDriver
+display = None
 
 
 def setup_display():
@@ -440,6 +422,7 @@ def setup_display():
     Order of operations here is important for the display to initialize properly. Else, you may experience display snow/crash.
     """
     print("Setup_display: SPI")
+    import lcd_bus
 
     spi_bus = machine.SPI.Bus(host=_HOST, mosi=_MOSI, miso=_MISO, sck=_SCK)
     display_bus = lcd_bus.SPIBus(
@@ -458,15 +441,7 @@ def setup_display():
 
     print(f"Setup_display: display type: {_LCD_DRIVER_TYPE}")
     global display
-    if _LCD_DRIVER_TYPE == "GC9A01":
-        import gc9a01
-
-        display_class = gc9a01.GC9A01
-
-    elif _LCD_DRIVER_TYPE == "ST7789":
-        import st7789
-
-        display_class = st7789.ST7789
+    display_class = boards.get_display_class(_LCD_DRIVER_TYPE)
 
     display = display_class(
         data_bus=display_bus,
@@ -494,9 +469,7 @@ def setup_display():
     HEIGHT = display.get_physical_vertical_resolution()
 
 
-import network
-
-sta_if = network.WLAN(network.WLAN.IF_STA)
+sta_if = None
 
 
 def setup_network():
@@ -504,6 +477,11 @@ def setup_network():
     Setup the WiFi connection and display status to the display.
     """
     print("Setup_network")
+    global sta_if
+    if not sta_if:
+        import network
+
+        sta_if = network.WLAN(network.WLAN.IF_STA)
     if not sta_if.isconnected():
         print("connecting to network...")
         sta_if.active(True)
@@ -587,43 +565,29 @@ def set_tally_camera(num: int):
         return
 
 
-def set_neopixel_rgb(rgb: list = LED_COLOR_OFF, hex: int = -1):
+def set_tally_led(rgb: tuple):
+    """
+    Set the neopixel to a tally state color, and remember it for when notices are cleared.
+    """
+    global tally_led
+    tally_led = rgb
+    set_neopixel_rgb(rgb)
+
+
+def set_neopixel_rgb(rgb: tuple = LED_COLOR_OFF, hex: int = -1):
     """
     Set Neopixel (if available) to a certain color
-    @param rgb: 3 part list of RGB colors.
+    @param rgb: (R, G, B) tuple.
     @param hex: hex color value to override rgb. Useful to set values from LCD consts.
     @returns bool: Whether this was actioned (e.g. if Neopixel was present)
     """
-    if _NEOPIXEL > -1:
-        # If we have a BGR neopixel rather than a RGB one
-        new_rgb = [0, 0, 0]
-        if hex > -1:
-            r = (hex & 0xFF0000) >> 16
-            g = (hex & 0x00FF00) >> 8
-            b = hex & 0x0000FF
-            rgb = [r, g, b]
-        if _NEOPIXEL_BYTE_ORDER != [0, 1, 2]:
-            print(
-                f"Reordering neopixel from: {rgb} using byteorder: {_NEOPIXEL_BYTE_ORDER}"
-            )
-            # Reorder bytes based on the byte order defined.
-            new_rgb[0] = rgb[_NEOPIXEL_BYTE_ORDER[0]]
-            new_rgb[1] = rgb[_NEOPIXEL_BYTE_ORDER[1]]
-            new_rgb[2] = rgb[_NEOPIXEL_BYTE_ORDER[2]]
-        else:
-            # Copies by reference, so we can't just set this above and override if different byte order.
-            new_rgb = rgb
-        # np Should be defined already in setup_board
-        print(f"Setting neopixel to: {new_rgb}")
-        np.fill(new_rgb)
-        np.write()
+    if leds:
+        leds.set(hex if hex > -1 else rgb)
         return True
     return False
 
 
-import task_handler
-
-th: task_handler.TaskHandler
+th = None
 
 
 def setup_task_handler():
@@ -632,6 +596,8 @@ def setup_task_handler():
     """
     print("Setup_task_handler")
     try:
+        import task_handler
+
         global th
         th = task_handler.TaskHandler()
     except:
@@ -648,6 +614,7 @@ def setup_scrn_main():
     global scrn
     scrn = lv.screen_active()
     scrn.set_style_bg_color(lv.color_hex(0x000000), 0)
+    fullScreen.main_screen = scrn
 
 
 def setup():
@@ -656,6 +623,8 @@ def setup():
 
     """
     print("Setup")
+    global BOOT_ATTEMPTS
+    BOOT_ATTEMPTS = max(get_config_value(CONFIG_BOOT_SUCCESS, int, 0), 0)
     setup_board()
     setup_display()
     setup_task_handler()
@@ -664,14 +633,63 @@ def setup():
         time.sleep(20)
         machine.reset()
     setup_tally_camera()
+    gc.collect()
+    print(f"[BOOT] Setup complete, free heap: {gc.mem_free()} bytes")
+
+
+_FIRST_FRAME = False
+
+
+def report_first_frame():
+    """
+    Force LVGL to render and flush the current screen, then report how long it took from reset to get here.
+    Only measures once per boot.
+    """
+    global _FIRST_FRAME
+    if _FIRST_FRAME:
+        return
+    _FIRST_FRAME = True
+    lv.refr_now(None)
+    print(
+        f"[BOOT] First frame after {time.ticks_diff(time.ticks_ms(), _BOOT_TICKS_MS)}ms, free heap: {gc.mem_free()} bytes"
+    )
+
+
+def render_wait_ms(last_render):
+    """
+    @param last_render: Ticks of the last render, or None
+    @returns int: ms until the next render is due, 0 if it's due now
+    """
+    if last_render is None:
+        return 0
+    return max(0, RENDER_PERIOD_MS - time.ticks_diff(time.ticks_ms(), last_render))
+
+
+def encode_hello(mac):
+    """
+    @returns bytes: The HELLO frame introducing us to the server, with the version we're running
+    """
+    import json
+
+    hello = {
+        "MAC": mac,
+        "HELLO": {
+            "MODEL": MODEL,
+            "CAMERA": CAMERA_NUMBER,
+            "VERSION": get_config_value(CONFIG_OTA_VERSION),
+        },
+    }
+    return f"{json.dumps(hello)}\n".encode()
 
 
 def main():
     """
     Main function
     """
+    global CAM_LIVE, CAM_PREV
     print("main")
     fullScreen.display("Waiting for data...", lv.SYMBOL.REFRESH)
+    report_first_frame()
 
     def event_handler(evt):
         code = evt.get_code()
@@ -707,121 +725,271 @@ def main():
     import socket
     import json
 
-    addr_info = socket.getaddrinfo("192.168.2.6", 8000)
+    from servers import ServerList
 
-    addr = addr_info[0][-1]
+    # Server addresses are "host:port", e.g. "192.168.2.6:8000", comma separated. Others are
+    # found by their discovery beacons.
+    servers = ServerList(
+        get_config_value(CONFIG_SERVER, str, _DEFAULT_SERVER),
+        get_config_value(CONFIG_SERVERS),
+    )
+    try:
+        servers.listen()
+    except OSError as e:
+        print(f"[SERVERS] Can't listen for discovery beacons: {e}")
 
     s = None
     reconnect = True
 
     next_ping_time: int = time.ticks_ms() + PING_PERIOD_MS
 
+    from telemetry import Telemetry
+
+    telemetry = Telemetry(WDT_TIMEOUT_MS)
+
+    from power import PowerManager
+
+    power = PowerManager(
+        display,
+        sta_if,
+        get_config_value(CONFIG_BACKLIGHT, int, _DEFAULT_BL_BRIGHTNESS_PCT),
+        _CPU_FREQ_HZ,
+    )
+    mac = mac_2_str(get_mac())
+
+    from ota import OtaReceiver
+
+    ota = OtaReceiver()
+
+    from clocksync import ClockSync
+
+    clock = ClockSync()
+
+    parts = []  # PART frames being reassembled
+
+    from frames import FrameReader
+    from backoff import Backoff
+
+    reader = None
+    subscribed = None  # Camera the server knows we're showing
+    backoff = Backoff()
+    reconnect_at = time.ticks_ms()
+    renders = 0
+    last_render = None  # Ticks, None before the first
+    deferred = None  # Camera change held back until RENDER_PERIOD_MS after the last render
+    identify_until = None  # Ticks to take the IDENTIFY notice down at
+
     while True:
         # Feed the watchdog timer
-        wdt.feed()
+        telemetry.feed_wdt(wdt)
+
+        if identify_until is not None and time.ticks_diff(time.ticks_ms(), identify_until) >= 0:
+            identify_until = None
+            if fullScreen.showing and fullScreen.showing[1] == lv.SYMBOL.GPS:
+                fullScreen.display(None)
+
+        if telemetry.sample_due():
+            telemetry.sample(gc.mem_free(), get_rssi())
+        power.update()
+        servers.poll()
+        if servers.changed:
+            set_config_value(CONFIG_SERVERS, servers.cache())
 
         if next_ping_time > 0 and time.ticks_ms() > next_ping_time:
             # Ping time hasn't been updated, we're not talking to the server...
             print("Ping timer exceeded")
             reconnect = True
-            fullScreen.display("Ping time exceeded!")
+            power.wake()
+            fullScreen.display("Ping time exceeded!", overlay=True)
             next_ping_time = -1
-            time.sleep(2)
+            # Straight on to the next server if there is one.
+            delay = 0 if servers.failed() else backoff.next_delay_ms()
+            reconnect_at = time.ticks_add(time.ticks_ms(), delay)
         # setup_network()
         try:
             if reconnect:
+                if time.ticks_diff(reconnect_at, time.ticks_ms()) > 0:
+                    # Backing off, keep feeding the watchdog while we wait.
+                    time.sleep_ms(100)
+                    continue
+                addr = servers.next()
+                if not addr:
+                    # Nothing configured resolves, wait for a discovery beacon.
+                    time.sleep_ms(100)
+                    continue
                 if s:
                     s.close()
                     del s
+                    telemetry.add_reconnect()
+                print(f"Connecting to {addr[0]}:{addr[1]}")
                 s = socket.socket()
-                s.connect(addr)
+                s.settimeout(CONNECT_TIMEOUT_S)
+                s.connect(socket.getaddrinfo(addr[0], addr[1])[0][-1])
                 s.setblocking(True)
                 s.settimeout(0.2)
+                reader = FrameReader(s)
+                subscribed = None
+                # Introduce ourselves, so the server knows who's on this connection.
+                s.sendall(encode_hello(mac))
                 reconnect = False
                 fullScreen.display(None)
                 next_ping_time: int = time.ticks_ms() + PING_PERIOD_MS
-            message_buffer = b""
-            try:
-                data = s.readline()
-                if not data or data == b"":
-                    continue
-                message_buffer = data
-            except KeyboardInterrupt as e:
-                raise e
-            except:
+            elif telemetry.send_due():
+                s.sendall(telemetry.encode(mac, BOOT_ATTEMPTS))
+            if clock.sync_due():
+                s.sendall(clock.request(mac))
+            if CAMERA_NUMBER > 0 and subscribed != CAMERA_NUMBER:
+                # Only hear about changes to our own camera.
+                s.sendall(f'{{"MAC":"{mac}","SUBSCRIBE":[{CAMERA_NUMBER}]}}\n'.encode())
+                subscribed = CAMERA_NUMBER
+            # With a change held back, only wait for frames until it's due.
+            data = reader.read(render_wait_ms(last_render) if deferred else None)
+            if not data and not deferred:
                 continue
+            if data:
+                backoff.reset()
+                servers.connected()
+            loop_start = time.ticks_ms()
+            # Back to full speed before we handle the frames.
+            power.wake()
+
+            # Handle every frame received so far, folding any camera changes into one render.
+            render = None  # The last frame that changed camera state
+            for message_buffer in data:
+                print("*")
+                # Parses the response into a JSON
+                message: dict
+                try:
+                    if b"OTA_CHUNK" not in message_buffer:
+                        print(message_buffer)
+                    message = json.loads(message_buffer.decode())
+                except:
+                    print(f"Invalid JSON recived from server: {message_buffer.decode()}")
+                    continue
 
-            print("*")
-            # Parses the response into a JSON
-            message: dict
-            try:
-                print(message_buffer)
-                message = json.loads(message_buffer.decode())
-            except:
-                print(f"Invalid JSON recived from server: {message_buffer.decode()}")
-
-            if (
-                "MAC" in message
-                and isinstance(message["MAC"], str)
-                and message["MAC"].upper() != mac_2_str(get_mac())
-            ):
-                print("Ignoring command for other MAC addr")
-                continue
-            if CAMERA_NUMBER > 0:
-                changed = False
-                if "CAM_LIVE" in message and isinstance(message["CAM_LIVE"], int):
-                    CAM_LIVE = int(message["CAM_LIVE"])
-                    print(f"LIVE CAM: {CAM_LIVE}")
-                    changed = True
-                if "CAM_PREV" in message and isinstance(message["CAM_PREV"], int):
-                    CAM_PREV = int(message["CAM_PREV"])
-                    print(f"PREV CAM: {CAM_PREV}")
-                    changed = True
-                if changed:
-                    if CAM_LIVE == CAMERA_NUMBER:
-                        indicator.set_state(COLOR_LIVE)
-                        set_neopixel_rgb(LED_COLOR_RED)
-                        print("CAM LIVE")
-                    elif CAM_PREV == CAMERA_NUMBER:
-                        indicator.set_state(COLOR_PREV)
-                        set_neopixel_rgb(LED_COLOR_GREEN)
-                        print("CAM PREVIEW")
-                    else:
-                        indicator.set_state(COLOR_STDBY)
-                        set_neopixel_rgb(LED_COLOR_OFF)
-                        print("CAM STANDBY")
-                    label.set_text(str(CAMERA_NUMBER))
-                if "IDENTIFY" in message:
-                    for i in range(4):
-                        fullScreen.display(
-                            f"IDENTIFY\n{mac_2_str(get_mac())}\n{get_ip()}",
-                            lv.SYMBOL.GPS,
-                            COLOR_OK if i % 2 else COLOR_STDBY,
-                        )
-                        time.sleep(1)
-                    fullScreen.display(None)
-                if "PING" in message:
-                    next_ping_time = time.ticks_ms() + PING_PERIOD_MS
-                if "BACKLIGHT_PCT" in message and isinstance(
-                    message["BACKLIGHT_PCT"], int
-                ):
-                    bl_pct = message["BACKLIGHT_PCT"]
-                    print(f"Setting backlight percent: {bl_pct}")
-                    display.set_backlight(bl_pct)
-                    set_config_value(CONFIG_BACKLIGHT, bl_pct)
+                if isinstance(message, dict) and "PART" in message:
+                    # Big frames are split into parts by the server, so they don't hold up tally updates.
+                    # A bad part loses that frame, not the rest of this batch, which may have changed
+                    # camera state already.
+                    try:
+                        part = message["PART"]
+                        if part["INDEX"] == 0:
+                            parts = []
+                        parts.append(part["DATA"])
+                        if not part["LAST"]:
+                            continue
+                        message = json.loads("".join(parts))
+                    except (KeyError, TypeError, ValueError) as e:
+                        print(f"Invalid PART frame from server: {e}")
+                        parts = []
+                        continue
+                    parts = []
+                if not isinstance(message, dict):
+                    print(f"Ignoring frame that isn't an object: {message}")
+                    continue
 
-            else:
-                setup_tally_camera()
-            if "SET_CAM" in message and isinstance(message["SET_CAM"], int):
-                print("Seen SET_CAM")
-                set_tally_camera(message["SET_CAM"])
+                if (
+                    "MAC" in message
+                    and isinstance(message["MAC"], str)
+                    and message["MAC"].upper() != mac
+                ):
+                    print("Ignoring command for other MAC addr")
+                    continue
+                if "SYNC_REPLY" in message:
+                    clock.on_reply(message["SYNC_REPLY"])
+                    continue
+                if "OTA_BEGIN" in message or "OTA_CHUNK" in message or "OTA_END" in message:
+                    reply = ota.handle(message)
+                    reply["MAC"] = mac
+                    s.sendall(f"{json.dumps(reply)}\n".encode())
+                    if ota.ready:
+                        fullScreen.display("Updated!\nRestarting...", lv.SYMBOL.REFRESH, COLOR_OK)
+                        time.sleep(1)
+                        machine.reset()
+                    continue
+                if CAMERA_NUMBER > 0:
+                    if "CAM_LIVE" in message and isinstance(message["CAM_LIVE"], int):
+                        CAM_LIVE = int(message["CAM_LIVE"])
+                        print(f"LIVE CAM: {CAM_LIVE}")
+                        render = message
+                    if "CAM_PREV" in message and isinstance(message["CAM_PREV"], int):
+                        CAM_PREV = int(message["CAM_PREV"])
+                        print(f"PREV CAM: {CAM_PREV}")
+                        render = message
+                    if "IDENTIFY" in message:
+                        # Blinks from a timer, we carry on and take the notice down when it's done.
+                        fullScreen.display(f"IDENTIFY\n{mac}\n{get_ip()}", lv.SYMBOL.GPS, COLOR_OK)
+                        if leds:
+                            leds.identify(IDENTIFY_MS)
+                        identify_until = time.ticks_add(time.ticks_ms(), IDENTIFY_MS)
+                    if "PING" in message:
+                        indicator.print_stats()
+                        power.print_stats()
+                        fullScreen.print_stats()
+                        if leds:
+                            leds.print_stats()
+                        print(f"[FRAMES] {reader.frames} received, {renders} renders")
+                        next_ping_time = time.ticks_ms() + PING_PERIOD_MS
+                    if "BACKLIGHT_PCT" in message and isinstance(
+                        message["BACKLIGHT_PCT"], int
+                    ):
+                        bl_pct = message["BACKLIGHT_PCT"]
+                        print(f"Setting backlight percent: {bl_pct}")
+                        power.set_backlight(bl_pct)
+                        set_config_value(CONFIG_BACKLIGHT, bl_pct)
+
+                else:
+                    setup_tally_camera()
+                if "SET_CAM" in message and isinstance(message["SET_CAM"], int):
+                    print("Seen SET_CAM")
+                    set_tally_camera(message["SET_CAM"])
+
+            # No more than one render per LVGL refresh period. A change straight after a render
+            # is held back until the end of the period, folding in any others arriving meanwhile,
+            # but the first after a quiet spell goes straight on screen. Scheduled changes too, so
+            # they go on screen at APPLY_AT or the end of the period, whichever is later.
+            if render and render_wait_ms(last_render):
+                deferred = render
+                render = None
+            elif render:
+                deferred = None  # Rendering the latest state anyway
+            elif deferred and not render_wait_ms(last_render):
+                render = deferred
+                deferred = None
+
+            if render:
+                late_ms = None
+                if "APPLY_AT" in render:
+                    # Change in sync with all the other tallies
+                    late_ms = clock.wait_until(render["APPLY_AT"])
+                if CAM_LIVE == CAMERA_NUMBER:
+                    indicator.set_state(COLOR_LIVE)
+                    set_tally_led(LED_COLOR_RED)
+                    print("CAM LIVE")
+                elif CAM_PREV == CAMERA_NUMBER:
+                    indicator.set_state(COLOR_PREV)
+                    set_tally_led(LED_COLOR_GREEN)
+                    print("CAM PREVIEW")
+                else:
+                    indicator.set_state(COLOR_STDBY)
+                    set_tally_led(LED_COLOR_OFF)
+                    print("CAM STANDBY")
+                power.set_on_air(CAM_LIVE == CAMERA_NUMBER or CAM_PREV == CAMERA_NUMBER)
+                label.set_text(str(CAMERA_NUMBER))
+                last_render = time.ticks_ms()
+                renders += 1
+                if late_ms is not None and "SEQ" in render:
+                    s.sendall(
+                        f'{{"MAC":"{mac}","APPLIED":{{"SEQ":{render["SEQ"]},"LATE":{late_ms}}}}}\n'.encode()
+                    )
 
             # We got the to the end of the main loop succesfully.
-            set_boot_success()
-        except ValueError:
-            # TODO: This becomes b'' on socket failure, doesn't otherwise except.
-            print(data)
-            data = None
+            if set_boot_success():
+                # Our HELLO had the old version, tell the server the update took.
+                s.sendall(encode_hello(mac))
+            telemetry.add_loop_time(time.ticks_diff(time.ticks_ms(), loop_start))
+        except ValueError as e:
+            print(f"Invalid frame: {e}")
             continue
         except KeyboardInterrupt:
             raise
@@ -829,11 +997,12 @@ def main():
             if e.args[0] == errno.EAGAIN:
                 time.sleep(0.05)
                 continue
-            time.sleep(1)
+            delay = 0 if servers.failed() else backoff.next_delay_ms()
             print(f"Got OS Error: {e}")
-            print("Reconnecting")
-            fullScreen.display(e)
+            print(f"Reconnecting in {delay}ms")
+            fullScreen.display(e, overlay=True)
             reconnect = True
+            reconnect_at = time.ticks_add(time.ticks_ms(), delay)
         except Exception as e:
             print(e)
             time.sleep(1)
@@ -0,0 +1,112 @@
+"""
+TallyHo Client telemetry
+
+Keeps a fixed size ring of device health samples and encodes them into a compact frame
+to send to the server over the tally connection.
+
+Frame format (one line of JSON, like everything else on the connection):
+{"MAC": "A0:85:E3:47:F5:30", "BOOTS": 0, "TICKS": 123456, "TELEMETRY": [[ticks, heap, rssi, ...], ...]}
+Each sample is [ticks_ms] + FIELDS. TICKS is the time the frame was sent, so the server can
+work out when each sample was taken without the device needing a clock.
+"""
+import time
+from array import array
+
+FIELDS = ("HEAP", "RSSI", "RECONNECTS", "LOOP_MS", "WDT_GAP_MS", "WDT_NEAR_MISSES")
+_FIELD_COUNT = len(FIELDS)
+
+SAMPLE_PERIOD_MS = 1000 * 5  # 5 secs
+SEND_PERIOD_MS = 1000 * 30  # 30 secs
+RING_SIZE = 8  # Samples kept between sends, the oldest are dropped if we can't send.
+
+WDT_NEAR_MISS_PCT = 50  # Count a near miss if the watchdog went this long without a feed.
+
+
+class Telemetry:
+    def __init__(self, wdt_timeout_ms, size=RING_SIZE):
+        self.size = size
+        self.wdt_near_miss_ms = int(wdt_timeout_ms * WDT_NEAR_MISS_PCT / 100)
+
+        # Preallocated ring, so sampling doesn't touch the heap.
+        self.ring_ticks = array("i", [0] * size)
+        self.ring = array("i", [0] * (size * _FIELD_COUNT))
+        self.head = 0  # Next position to write
+        self.count = 0  # Samples waiting to send
+
+        # Running values, the maximums reset after each sample.
+        self.reconnects = 0
+        self.loop_ms_max = 0
+        self.wdt_gap_ms_max = 0
+        self.wdt_near_misses = 0
+
+        now = time.ticks_ms()
+        self.last_feed = now
+        self.next_sample = time.ticks_add(now, SAMPLE_PERIOD_MS)
+        self.next_send = time.ticks_add(now, SEND_PERIOD_MS)
+
+    def feed_wdt(self, wdt):
+        """
+        Feed the watchdog, keeping track of how close we came to it firing.
+        """
+        now = time.ticks_ms()
+        gap = time.ticks_diff(now, self.last_feed)
+        if gap > self.wdt_gap_ms_max:
+            self.wdt_gap_ms_max = gap
+        if gap > self.wdt_near_miss_ms:
+            self.wdt_near_misses += 1
+        self.last_feed = now
+        wdt.feed()
+
+    def add_loop_time(self, ms):
+        if ms > self.loop_ms_max:
+            self.loop_ms_max = ms
+
+    def add_reconnect(self):
+        self.reconnects += 1
+
+    def sample_due(self):
+        return time.ticks_diff(time.ticks_ms(), self.next_sample) >= 0
+
+    def send_due(self):
+        return self.count and time.ticks_diff(time.ticks_ms(), self.next_send) >= 0
+
+    def sample(self, heap, rssi):
+        now = time.ticks_ms()
+        self.next_sample = time.ticks_add(now, SAMPLE_PERIOD_MS)
+        self.ring_ticks[self.head] = now
+        offset = self.head * _FIELD_COUNT
+        ring = self.ring
+        ring[offset] = heap
+        ring[offset + 1] = rssi
+        ring[offset + 2] = self.reconnects
+        ring[offset + 3] = self.loop_ms_max
+        ring[offset + 4] = self.wdt_gap_ms_max
+        ring[offset + 5] = self.wdt_near_misses
+        self.head = (self.head + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+        self.loop_ms_max = 0
+        self.wdt_gap_ms_max = 0
+
+    def encode(self, mac, boots):
+        """
+        Encode all waiting samples (oldest first) into a frame and empty the ring.
+        @param mac: MAC address string of this device
+        @param boots: Unsuccessful boot counter from the bootloader
+        @returns bytes: Frame to send, including the newline.
+        """
+        now = time.ticks_ms()
+        self.next_send = time.ticks_add(now, SEND_PERIOD_MS)
+        samples = []
+        index = (self.head - self.count) % self.size
+        for _ in range(self.count):
+            offset = index * _FIELD_COUNT
+            values = [str(self.ring_ticks[index])]
+            for i in range(_FIELD_COUNT):
+                values.append(str(self.ring[offset + i]))
+            samples.append("[" + ",".join(values) + "]")
+            index = (index + 1) % self.size
+        self.count = 0
+        return (
+            f'{{"MAC":"{mac}","BOOTS":{boots},"TICKS":{now},"TELEMETRY":[{",".join(samples)}]}}\n'
+        ).encode()
@@ -0,0 +1,94 @@
+"""
+Clock sync offset estimates, on a fake ticks_ms.
+"""
+import json
+import os
+import sys
+import time
+
+CLIENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CLIENT_DIR)
+sys.modules.pop("clocksync", None)  # The client and server both have one
+
+import clocksync  # noqa: E402
+
+SERVER_AHEAD = 100000  # ms the server clock is ahead of our ticks
+
+
+def fake_ticks(monkeypatch):
+    now = [5000]
+
+    def sleep_ms(ms):
+        now[0] += ms
+
+    monkeypatch.setattr(time, "ticks_ms", lambda: now[0], raising=False)
+    monkeypatch.setattr(time, "ticks_diff", lambda a, b: a - b, raising=False)
+    monkeypatch.setattr(time, "ticks_add", lambda a, b: a + b, raising=False)
+    monkeypatch.setattr(time, "sleep_ms", sleep_ms, raising=False)
+    return now
+
+
+def exchange(sync, now, up, down, server_ahead=SERVER_AHEAD):
+    """
+    One SYNC request and reply, taking up ms to get to the server and down ms to come back.
+    """
+    t0 = json.loads(sync.request("02:00:00:00:00:01"))["SYNC"]["T0"]
+    now[0] += up
+    t1 = now[0] + server_ahead
+    now[0] += 1
+    reply = {"T0": t0, "T1": t1, "T2": t1 + 1}
+    now[0] += down
+    sync.on_reply(reply)
+
+
+def test_lowest_round_trip_wins(monkeypatch):
+    now = fake_ticks(monkeypatch)
+    sync = clocksync.ClockSync()
+    assert sync.server_now() is None
+
+    exchange(sync, now, 5, 5)
+    assert sync.offset == SERVER_AHEAD
+    assert sync.rtt == 10
+    # Queued on the way there: a worse offset, but a longer round trip too, so it's not used.
+    exchange(sync, now, 45, 5)
+    assert sync.offset == SERVER_AHEAD
+    assert sync.jitter == 20
+    assert sync.server_now() == now[0] + SERVER_AHEAD
+
+
+def test_starts_again_when_the_server_clock_jumps(monkeypatch):
+    now = fake_ticks(monkeypatch)
+    sync = clocksync.ClockSync()
+    exchange(sync, now, 2, 2)
+    exchange(sync, now, 2, 2)
+
+    # The server restarted, its clock is nowhere near the old estimate.
+    exchange(sync, now, 20, 20, server_ahead=0)
+    assert sync.samples == [(40, 0)]
+    assert sync.offset == 0
+
+
+def test_requests_slow_down_once_synced(monkeypatch):
+    now = fake_ticks(monkeypatch)
+    sync = clocksync.ClockSync()
+    assert sync.sync_due()
+    for _ in range(clocksync.SAMPLES):
+        exchange(sync, now, 1, 1)
+    request = json.loads(sync.request("02:00:00:00:00:01"))
+    assert request["SYNC"]["OFFSET"] == SERVER_AHEAD
+    assert sync.next_sync == now[0] + clocksync.SYNC_PERIOD_MS
+    assert not sync.sync_due()
+
+
+def test_wait_until(monkeypatch):
+    now = fake_ticks(monkeypatch)
+    sync = clocksync.ClockSync()
+    assert sync.wait_until(SERVER_AHEAD) == 0  # Not synced, show it now
+
+    exchange(sync, now, 1, 1)
+    server_now = sync.server_now()
+    assert sync.wait_until(server_now + 40) == 0
+    assert sync.server_now() == server_now + 40
+    # Too far ahead to believe, so not waited for.
+    assert sync.wait_until(sync.server_now() + clocksync.MAX_SCHEDULE_MS + 1) == -clocksync.MAX_SCHEDULE_MS - 1
+    assert sync.wait_until(sync.server_now() - 10) == 10
@@ -0,0 +1,97 @@
+"""
+The neopixel output layer, on the simulator's neopixel.
+"""
+import os
+import sys
+import tracemalloc
+
+CLIENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CLIENT_DIR)
+sys.path.insert(0, os.path.join(CLIENT_DIR, "sim"))
+
+import leds  # noqa: E402
+import neopixel  # noqa: E402
+
+RED = (255, 0, 0)
+GREEN = (0, 255, 0)
+
+
+class FakeTimer:
+    """
+    Ticked by the test, rather than from a thread.
+    """
+
+    def __init__(self):
+        self.running = False
+
+    def init(self, period, mode, callback):
+        self.running = True
+
+    def deinit(self):
+        self.running = False
+
+
+def make(pixels=2, byte_order=(0, 1, 2)):
+    np = neopixel.NeoPixel(None, pixels)
+    output = leds.Leds(np, byte_order)
+    output._timer = FakeTimer()
+    return np, output
+
+
+def test_set_writes_each_color_once():
+    np, output = make()
+    output.set(RED)
+    assert np.buf == bytes(RED) * 2
+    output.set(RED)
+    output.set(RED)
+    output.set(GREEN)
+    assert np.buf == bytes(GREEN) * 2
+    assert (np.writes, output.writes, output.skipped) == (2, 2, 2)
+
+
+def test_byte_order_and_hex_colors():
+    np, output = make(pixels=1, byte_order=(1, 0, 2))  # GRB strip
+    output.set(0x102030)
+    assert np.buf == bytes([0x20, 0x10, 0x30])
+    output.set((1, 2, 3))
+    assert np.buf == bytes([2, 1, 3])
+
+
+def test_prepared_colors_dont_allocate():
+    np, output = make(pixels=1)
+    colors = [RED, GREEN, leds.OFF, 0xFFFF00]
+    output.prepare(*colors)
+    output.set(RED)  # Anything made on first use is done with
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        # Few enough writes that the counters stay small ints, which CPython doesn't allocate
+        # either (MicroPython never does).
+        for _ in range(50):
+            for color in colors:
+                output.set(color)
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    only_leds = [tracemalloc.Filter(True, leds.__file__)]
+    grown = [
+        stat for stat in after.filter_traces(only_leds).compare_to(before.filter_traces(only_leds), "lineno") if stat.size_diff > 0
+    ]
+    assert grown == []
+    assert output.writes == 200  # Each set() changes the color, bar the first RED again
+    assert len(output.buffers) == len(colors)
+
+
+def test_blink_goes_back_to_the_last_color_set():
+    np, output = make(pixels=1)
+    output.set(RED)
+    output.blink(leds.IDENTIFY_COLOR, duration_ms=1000, period_ms=250)
+    assert np.buf == bytes(leds.IDENTIFY_COLOR)
+    assert output.blinking and output._timer.running
+    output.set(GREEN)  # Kept for when it finishes
+    seen = []
+    while output.blinking:
+        output._tick(output._timer)
+        seen.append(bytes(np.buf))
+    assert seen == [bytes(leds.OFF), bytes(leds.IDENTIFY_COLOR), bytes(leds.OFF), bytes(GREEN)]
+    assert not output._timer.running
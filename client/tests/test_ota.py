@@ -0,0 +1,154 @@
+"""
+Over the air updates and the bootloader's rollback, on CPython.
+
+    python -m pytest client/tests
+"""
+import base64
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+
+CLIENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CLIENT_DIR)
+
+import ota  # noqa: E402
+
+GOOD_TALLY = """
+# Like tally.set_boot_success() once the main loop gets round
+import ota
+with open("config/unsuccessful_boots", "w") as file:
+    file.write("-1")
+ota.mark_success()
+print("GOOD")
+"""
+CRASHING_TALLY = """
+raise RuntimeError("New image crashes on boot")
+"""
+
+
+def install(files, update_id="v2", chunk_size=64):
+    """
+    Receive an update like the server sends it.
+    """
+    receiver = ota.OtaReceiver()
+    listing = [
+        {"NAME": name, "SIZE": len(data), "SHA256": hashlib.sha256(data).hexdigest()} for name, data in files.items()
+    ]
+    assert "OTA_ACK" in receiver.handle({"OTA_BEGIN": {"ID": update_id, "CHUNK_SIZE": chunk_size, "FILES": listing}})
+    for name, data in files.items():
+        for index, offset in enumerate(range(0, len(data), chunk_size)):
+            chunk = data[offset : offset + chunk_size]
+            reply = receiver.handle(
+                {
+                    "OTA_CHUNK": {
+                        "ID": update_id,
+                        "NAME": name,
+                        "INDEX": index,
+                        "SHA256": hashlib.sha256(chunk).hexdigest(),
+                        "DATA": base64.b64encode(chunk).decode(),
+                    }
+                }
+            )
+            assert "OTA_ACK" in reply, reply
+    assert "OTA_DONE" in receiver.handle({"OTA_END": {"ID": update_id}})
+    assert receiver.ready
+
+
+def boot(path):
+    """
+    Power the tally on: run boot.py, which imports tally.py.
+    @returns str: What it printed
+    """
+    for name in ("boot.py", "ota.py"):  # As they'd be on the tally's filesystem
+        shutil.copy(os.path.join(CLIENT_DIR, name), path)
+    result = subprocess.run(
+        [sys.executable, "-B", "boot.py"],
+        cwd=path,
+        capture_output=True,
+        text=True,
+        timeout=30,
+    )
+    return result.stdout + result.stderr
+
+
+def read(path):
+    with open(path) as file:
+        return file.read()
+
+
+def test_crashing_update_rolls_back(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("config")
+    with open("tally.py", "w") as file:
+        file.write(GOOD_TALLY)
+    assert "GOOD" in boot(tmp_path)
+    assert read("config/unsuccessful_boots") == "-1"
+
+    install({"tally.py": CRASHING_TALLY.encode()})
+    assert read("config/ota_pending").startswith("v2\n")
+
+    outputs = [boot(tmp_path) for _ in range(ota_rollback_boots())]
+    assert "New image crashes on boot" in outputs[0]
+    assert "Rolling back update v2" in outputs[-1]
+    assert "GOOD" in outputs[-1]
+    assert read("tally.py") == GOOD_TALLY
+    assert not os.path.exists("config/ota_pending")
+    assert read("config/unsuccessful_boots") == "-1"
+    assert "GOOD" in boot(tmp_path)
+
+
+def test_counting_while_pending_even_if_counter_says_success(tmp_path, monkeypatch):
+    # E.g. an update switched in by an older ota.py, which left the counter at -1.
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("config")
+    with open("tally.py.bak", "w") as file:
+        file.write(GOOD_TALLY)
+    with open("tally.py", "w") as file:
+        file.write(CRASHING_TALLY)
+    with open("config/ota_pending", "w") as file:
+        file.write("v2\ntally.py")
+    with open("config/unsuccessful_boots", "w") as file:
+        file.write("-1")
+
+    outputs = [boot(tmp_path) for _ in range(ota_rollback_boots())]
+    assert "Rolling back update v2" in outputs[-1]
+    assert read("tally.py") == GOOD_TALLY
+
+
+def test_successful_update_is_kept(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("config")
+    with open("tally.py", "w") as file:
+        file.write(GOOD_TALLY)
+    boot(tmp_path)
+    new = GOOD_TALLY.replace("GOOD", "GOOD NEW")
+    install({"tally.py": new.encode()})
+
+    assert "GOOD NEW" in boot(tmp_path)
+    assert read("config/ota_version") == "v2"
+    assert not os.path.exists("config/ota_pending")
+    assert "GOOD NEW" in boot(tmp_path)
+
+
+def test_mark_success_says_which_update_is_now_running(tmp_path, monkeypatch):
+    # So the tally knows to HELLO the server again, with the new version.
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("config")
+    with open("tally.py", "w") as file:
+        file.write(GOOD_TALLY)
+    install({"tally.py": b"print('v2')"})
+    assert ota.mark_success() == "v2"
+    assert read("config/ota_version") == "v2"
+    assert ota.mark_success() is None
+
+
+def ota_rollback_boots():
+    """
+    Boots of a crashing update before it's rolled back, and the old files run.
+    """
+    for line in read(os.path.join(CLIENT_DIR, "boot.py")).splitlines():
+        if line.startswith("OTA_ROLLBACK_AFTER"):
+            return int(line.split("=")[1].split("#")[0]) + 1
+    raise AssertionError("No OTA_ROLLBACK_AFTER in boot.py")
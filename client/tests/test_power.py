@@ -0,0 +1,52 @@
+"""
+Power states, on the simulator's machine and network stand-ins.
+"""
+import os
+import sys
+import time
+
+CLIENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CLIENT_DIR)
+sys.path.insert(0, os.path.join(CLIENT_DIR, "sim"))
+
+import machine  # noqa: E402
+import network  # noqa: E402
+import power  # noqa: E402
+
+
+class FakeDisplay:
+    def __init__(self):
+        self.backlight = None
+
+    def set_backlight(self, pct):
+        self.backlight = pct
+
+
+def test_radio_never_sleeps_and_cpu_steps_down(monkeypatch):
+    now = [0]
+    monkeypatch.setattr(time, "ticks_ms", lambda: now[0], raising=False)
+    monkeypatch.setattr(time, "ticks_diff", lambda a, b: a - b, raising=False)
+    sta_if = network.WLAN(network.WLAN.IF_STA)
+    display = FakeDisplay()
+    manager = power.PowerManager(display, sta_if, 80, 160000000)
+    seen = []
+
+    def step(ms):
+        now[0] += ms
+        manager.update()
+        seen.append((manager.state, machine.freq(), sta_if.config("pm")))
+
+    step(0)
+    assert seen[-1] == (power.POWER_ACTIVE, 160000000, sta_if.PM_NONE)
+    step(power.IDLE_AFTER_MS + 1)
+    assert seen[-1] == (power.POWER_IDLE, power.CPU_FREQ_IDLE_HZ, sta_if.PM_NONE)
+    step(power.STANDBY_AFTER_MS)
+    assert seen[-1] == (power.POWER_STANDBY, power.CPU_FREQ_IDLE_HZ, sta_if.PM_NONE)
+    assert display.backlight == 8
+
+    manager.wake()
+    manager.set_on_air(True)
+    assert manager.state == power.POWER_ACTIVE
+    assert machine.freq() == 160000000
+    assert display.backlight == 80
+    assert all(pm == sta_if.PM_NONE for _, _, pm in seen)
@@ -0,0 +1,68 @@
+"""
+The server list: configured servers, discovery beacons and the cache.
+"""
+import json
+import os
+import socket
+import sys
+
+CLIENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CLIENT_DIR)
+
+from servers import ServerList  # noqa: E402
+
+
+def beacon(servers, port, priority, source="127.0.0.2"):
+    """
+    Send a discovery beacon from a LAN host, and let the list handle it.
+    """
+    listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.setblocking(False)
+    servers._discovery = listener
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sender:
+        sender.bind((source, 0))
+        sender.sendto(json.dumps({"TALLYHO": {"PORT": port, "PRIORITY": priority}}).encode(), listener.getsockname())
+    for _ in range(100):
+        servers.poll()
+        if any(server[0] == source for server in servers.servers):
+            break
+    servers._discovery = None
+    listener.close()
+
+
+def test_invalid_config_entries_are_skipped():
+    servers = ServerList(",127.0.0.1, 127.0.0.1:http ,127.0.0.1:8000")
+    assert servers.next() == ("127.0.0.1", 8000)
+    assert len(servers.servers) == 1
+    assert ServerList("").next() is None
+
+
+def test_beacons_dont_outrank_or_change_configured_servers():
+    servers = ServerList("127.0.0.1:8000")
+    beacon(servers, 8000, 5, source="127.0.0.1")  # Claims to be the configured server
+    beacon(servers, 8000, -10)  # Another host, claiming top priority
+    assert [server[2] for server in servers.servers] == [0, -10]
+    assert servers.next() == ("127.0.0.1", 8000)
+
+    # Only once the configured server is failing
+    assert servers.failed()
+    assert servers.next() == ("127.0.0.2", 8000)
+
+
+def test_cache_only_changes_when_servers_are_added():
+    servers = ServerList("127.0.0.1:8000")
+    assert not servers.changed
+    servers.add("127.0.0.2", 8000, 1)
+    assert servers.changed
+    cached = servers.cache()
+    assert not servers.changed
+    servers.add("127.0.0.2", 8000, 2)  # Beacons flipping priorities
+    servers.add("127.0.0.2", 8000, 1)
+    assert not servers.changed
+
+    # Next boot, the cached copy of a configured server is still configured.
+    servers = ServerList("127.0.0.1:8000", cached)
+    servers.add("127.0.0.1", 8000, -1)
+    assert servers.next() == ("127.0.0.1", 8000)
+    assert servers.servers[0][2] == 0
@@ -0,0 +1,95 @@
+"""
+TallyHo Server admin interface
+
+A line based command port for querying and controlling a running server, e.g.
+
+    $ nc localhost 8001
+    telemetry
+    telemetry A0:85:E3:47:F5:30
+
+or for a single command:
+
+    $ python admin.py telemetry A0:85:E3:47:F5:30
+
+Each command gets one line of JSON back. Only listens on localhost.
+"""
+import json
+import socket
+import sys
+from threading import Thread
+
+ADMIN_HOST = "127.0.0.1"
+ADMIN_PORT = 8001
+
+commands = {}
+
+
+def register(name, function):
+    """
+    Add an admin command. The function is called with the command's space separated
+    arguments as strings, and should return something that can be JSON encoded.
+    """
+    commands[name] = function
+
+
+def run_command(line):
+    parts = line.split()
+    if not parts:
+        return None
+    name, args = parts[0], parts[1:]
+    if name == "help":
+        return {"COMMANDS": sorted(commands)}
+    if name not in commands:
+        return {"ERROR": f"Unknown command: {name}"}
+    try:
+        return {"RESULT": commands[name](*args)}
+    except Exception as e:
+        return {"ERROR": f"{type(e).__name__}: {e}"}
+
+
+def on_admin_client(conn, addr):
+    with conn:
+        for line in conn.makefile("r"):
+            response = run_command(line)
+            if response is None:
+                continue
+            conn.sendall(f"{json.dumps(response)}\n".encode())
+
+
+def listen(host=ADMIN_HOST, port=ADMIN_PORT):
+    s = socket.socket()
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    s.bind((host, port))
+    s.listen(1)
+    return s
+
+
+def serve(s):
+    host, port = s.getsockname()
+    print(f"Admin interface on {host}:{port}")
+    while True:
+        conn, addr = s.accept()
+        Thread(target=on_admin_client, args=[conn, addr], daemon=True).start()
+
+
+def start(host=ADMIN_HOST, port=ADMIN_PORT, sock=None):
+    """
+    @param sock: Already listening socket to use, e.g. one handed over by the previous server.
+    @returns socket: The listening socket
+    """
+    s = sock or listen(host, port)
+    Thread(target=serve, args=[s], daemon=True).start()
+    return s
+
+
+def send_command(line, host=ADMIN_HOST, port=ADMIN_PORT):
+    """
+    Run a command on a running server and return its response.
+    """
+    with socket.create_connection((host, port)) as s:
+        s.sendall(f"{line}\n".encode())
+        return json.loads(s.makefile("r").readline())
+
+
+if __name__ == "__main__":
+    print(json.dumps(send_command(" ".join(sys.argv[1:]) or "help"), indent=2))
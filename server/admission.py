@@ -0,0 +1,102 @@
+"""
+TallyHo Server admission control
+
+When the server restarts, the whole fleet reconnects at once. Rather than letting them all in
+together (and having the kernel drop whoever doesn't fit in the listen backlog, which costs them
+seconds of SYN retries), connections wait in a deep backlog and are accepted at a steady rate.
+
+Newcomers need the current tally state straight away. They're collected and sent it in
+batches, encoding the state once per batch rather than once per tally.
+"""
+import socket
+from threading import Lock, Thread
+import time
+
+from connection import encode, PRIORITY_TALLY
+from ratelimit import TokenBucket
+
+LISTEN_BACKLOG = 256
+ACCEPT_RATE = 100  # Connections per second
+ACCEPT_BURST = 20
+SNAPSHOT_INTERVAL = 0.05  # Seconds between snapshot batches
+
+
+def listen(host, port, backlog=LISTEN_BACKLOG):
+    """
+    @returns socket: Listening on host:port. The port can be reused straight away after a restart.
+    """
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+class Admission:
+    def __init__(
+        self,
+        snapshot,
+        rate=ACCEPT_RATE,
+        burst=ACCEPT_BURST,
+        snapshot_interval=SNAPSHOT_INTERVAL,
+    ):
+        """
+        @param snapshot: Function returning the current tally state message, or None if there isn't one yet.
+        """
+        self.snapshot = snapshot
+        self.snapshot_interval = snapshot_interval
+        self.bucket = TokenBucket(rate, burst)
+        self.accepted = 0
+        self.batches = 0  # Snapshot batches sent
+        self.snapshots = 0  # Tallies sent a snapshot
+        self._newcomers = []
+        self._lock = Lock()
+        Thread(target=self._send_snapshots, daemon=True).start()
+
+    def accept(self, sock):
+        """
+        Accept the next connection, no faster than the accept rate.
+        @returns (socket, address): As socket.accept()
+        """
+        self.bucket.consume()
+        conn, addr = sock.accept()
+        self.accepted += 1
+        return conn, addr
+
+    def add(self, connection):
+        """
+        Send a new connection the current state with the next batch.
+        """
+        with self._lock:
+            self._newcomers.append(connection)
+
+    def _send_snapshots(self):
+        while True:
+            time.sleep(self.snapshot_interval)
+            with self._lock:
+                newcomers, self._newcomers = self._newcomers, []
+            if not newcomers:
+                continue
+            message = self.snapshot()
+            if message is None:
+                # Nothing to send yet, they'll get the next broadcast.
+                continue
+            data = encode(message)
+            for connection in newcomers:
+                try:
+                    connection.send_encoded(data, PRIORITY_TALLY)
+                except OSError:
+                    continue
+                self.snapshots += 1
+            self.batches += 1
+
+    def query(self):
+        """
+        Admin summary.
+        """
+        return {
+            "ACCEPTED": self.accepted,
+            "RATE": self.bucket.rate,
+            "SNAPSHOT_BATCHES": self.batches,
+            "SNAPSHOTS": self.snapshots,
+        }
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""
+TallyHo Server benchmarks
+
+Runs parts of the server against lightweight in-process fake tallies, e.g.
+
+    python bench.py ota --tallies 10 50 100
+    python bench.py lanes
+    python bench.py recovery --tallies 200
+    python bench.py failover --mode stop
+    python bench.py subscriptions --cameras 10 20 40
+    python bench.py tsl
+    python bench.py ingest
+
+The benchmarks themselves are in benchmarks/, a module for each part of the server.
+For the full client logic, run client/sim/run.py against a real server instead.
+"""
+import argparse
+
+from benchmarks import (
+    bench_admission,
+    bench_connection,
+    bench_discovery,
+    bench_history,
+    bench_ingest,
+    bench_obs,
+    bench_ota,
+    bench_profiling,
+    bench_sse,
+    bench_subscriptions,
+    bench_tsl,
+)
+
+# In the order they're listed in --help
+MODULES = [
+    bench_ota,
+    bench_connection,
+    bench_admission,
+    bench_discovery,
+    bench_subscriptions,
+    bench_tsl,
+    bench_obs,
+    bench_history,
+    bench_profiling,
+    bench_sse,
+    bench_ingest,
+]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TallyHo Server benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    for module in MODULES:
+        module.register(subparsers)
+
+    args = parser.parse_args()
+    args.function(args)
@@ -0,0 +1,5 @@
+"""
+TallyHo Server benchmarks, a module for each part of the server. Run them with bench.py.
+
+Each module has a register(subparsers) adding its commands, which call bench_*(args).
+"""
@@ -0,0 +1,130 @@
+"""
+Fleet reconnection after a restart, see admission.py and client/backoff.py.
+"""
+import os
+import socket
+import sys
+from threading import Event, Thread
+import time
+
+from connection import Connection
+from benchmarks.common import percentiles
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "client"))  # backoff.py
+
+PING_TIMEOUT = 10  # Seconds, like the tally's PING_PERIOD_MS
+
+
+def recovery_tally(port, backoff, restarted, results):
+    """
+    A tally's connection loop (see client/tally.py main()), with just enough protocol to know
+    when it has the tally state again.
+    """
+    while True:
+        sock = socket.socket()
+        sock.settimeout(PING_TIMEOUT)
+        try:
+            sock.connect(("127.0.0.1", port))
+            sock.sendall(b'{"MAC": null, "HELLO": {}}\n')
+            for line in sock.makefile("rb"):
+                if b"CAM_LIVE" in line:
+                    backoff.reset()
+                    if restarted.is_set():
+                        results.append(time.monotonic())
+                        sock.close()
+                        return
+        except OSError:
+            pass
+        sock.close()
+        if restarted.is_set():
+            results.attempts += 1
+        time.sleep(backoff.next_delay_ms() / 1000)
+
+
+class RecoveryResults(list):
+    attempts = 0  # Failed connections after the restart
+
+
+def recovery_server(listener, admission, setup_ms, connections):
+    """
+    multithread.py's accept loop, without the demo traffic.
+    """
+    while True:
+        try:
+            conn, addr = admission.accept(listener)
+        except OSError:
+            return  # Listener closed
+        time.sleep(setup_ms / 1000)  # Thread start, HELLO handling etc.
+        connection = Connection(conn, addr)
+        connections.append(connection)
+        admission.add(connection)
+
+
+def bench_recovery(args):
+    """
+    Connect a fleet, restart the server under it, and time how long until every tally has the
+    tally state again.
+    """
+    from admission import Admission, listen
+    from backoff import Backoff
+
+    snapshot = lambda: {"MAC": None, "CAM_LIVE": 1, "CAM_PREV": 2}
+    runs = (
+        ("Fixed 1s retry, backlog 5", lambda: Backoff(1000, 1000, jitter=False), 5, 1e9),
+        (
+            "Jittered backoff, admission control",
+            Backoff,
+            args.backlog,
+            args.accept_rate,
+        ),
+    )
+    for name, new_backoff, backlog, rate in runs:
+        listener = listen("127.0.0.1", 0, backlog)
+        port = listener.getsockname()[1]
+        connections = []
+        admission = Admission(snapshot, rate=rate, burst=min(rate, 20))
+        Thread(
+            target=recovery_server, args=[listener, admission, args.setup_ms, connections], daemon=True
+        ).start()
+        restarted = Event()
+        results = RecoveryResults()
+        for _ in range(args.tallies):
+            Thread(
+                target=recovery_tally, args=[port, new_backoff(), restarted, results], daemon=True
+            ).start()
+        while admission.snapshots < args.tallies:
+            time.sleep(0.1)
+
+        # Restart: everyone is disconnected and the port is closed for a while.
+        listener.shutdown(socket.SHUT_RDWR)
+        listener.close()
+        for connection in connections:
+            connection.close()
+        time.sleep(args.downtime)
+        listener = listen("127.0.0.1", port, backlog)
+        admission = Admission(snapshot, rate=rate, burst=min(rate, 20))
+        restarted.set()
+        started = time.monotonic()
+        Thread(
+            target=recovery_server, args=[listener, admission, args.setup_ms, []], daemon=True
+        ).start()
+        while len(results) < args.tallies and time.monotonic() - started < args.timeout:
+            time.sleep(0.1)
+        listener.close()
+        print(
+            f"{name}: {len(results)}/{args.tallies} recovered, "
+            f"{percentiles([result - started for result in results])}, "
+            f"{results.attempts} failed attempts, {admission.batches} snapshot batches"
+        )
+
+
+
+def register(subparsers):
+    recovery = subparsers.add_parser("recovery", help="Fleet reconnection time after a server restart")
+    recovery.add_argument("--tallies", type=int, default=200)
+    recovery.add_argument("--downtime", type=float, default=2, help="Seconds the server is down")
+    recovery.add_argument("--setup-ms", type=float, default=2, help="Server work per new connection")
+    recovery.add_argument("--backlog", type=int, default=256)
+    recovery.add_argument("--accept-rate", type=float, default=100, help="Connections/sec")
+    recovery.add_argument("--timeout", type=float, default=60, help="Give up after this many seconds")
+    recovery.set_defaults(function=bench_recovery)
@@ -0,0 +1,163 @@
+"""
+Priority lanes and batched writes, see connection.py.
+"""
+import json
+import socket
+from threading import Thread
+import time
+
+from connection import PRIORITY_BULK, PRIORITY_TALLY
+from benchmarks.common import FakeTally, percentiles
+
+
+def bench_lanes(args):
+    """
+    Flood a tally with bulk frames over a slow link and time how long tally frames take to arrive,
+    with priority lanes and with everything in one lane.
+    """
+    for name, tally_priority in (("Priority lanes", PRIORITY_TALLY), ("Single lane", PRIORITY_BULK)):
+        tally = FakeTally(0)
+        # Small socket buffers, so the queueing happens in our lanes rather than the kernel.
+        tally.connection.conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 8192)
+        tally.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8192)
+        latencies = []
+        running = True
+
+        def read():
+            # A link of args.link_kbps, like a tally on WiFi.
+            buffer = b""
+            while running:
+                data = tally.sock.recv(4096)
+                if not data:
+                    return
+                time.sleep(len(data) / (args.link_kbps * 1024))
+                buffer += data
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    if b'"SENT"' in line:
+                        latencies.append(time.monotonic() - json.loads(line)["SENT"])
+
+        def flood():
+            payload = "x" * args.bulk_size
+            while running:
+                if tally.connection.queued()[PRIORITY_BULK] < 50:
+                    tally.connection.send({"BULK": payload}, PRIORITY_BULK)
+                else:
+                    time.sleep(0.001)
+
+        Thread(target=read, daemon=True).start()
+        Thread(target=flood, daemon=True).start()
+        end = time.monotonic() + args.duration
+        i = 0
+        while time.monotonic() < end:
+            i += 1
+            tally.connection.send({"CAM_LIVE": i % 4, "SENT": time.monotonic()}, tally_priority)
+            time.sleep(args.interval_ms / 1000)
+        running = False
+        tally.connection.close()
+        print(f"{name}: {len(latencies)} tally frames, {percentiles(latencies)}")
+
+
+def tcp_out_segments():
+    """
+    @returns int: TCP segments sent by this machine so far (Linux), or None
+    """
+    try:
+        with open("/proc/net/snmp") as file:
+            lines = [line.split() for line in file if line.startswith("Tcp:")]
+        return int(lines[1][lines[0].index("OutSegs")])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def bench_writes(args):
+    """
+    Send syscalls and TCP packets per broadcast of a tally change plus SET_CAM and IDENTIFY (like
+    the demo loop) to every tally, with a write per frame against batched writes.
+    """
+    import selectors
+    import threading
+    import connection as connection_module
+    from admission import listen
+    from connection import Connection, encode, PRIORITY_TALLY
+
+    listener = listen("127.0.0.1", 0, backlog=args.tallies)
+    port = listener.getsockname()[1]
+    arrived = {}  # Broadcast: times every tally got its tally frame
+
+    def read(selector, done):
+        buffers = {}
+        while not done.is_set():
+            for key, _ in selector.select(timeout=0.1):
+                data = buffers.get(key.fileobj, b"") + key.fileobj.recv(65536)
+                *lines, buffers[key.fileobj] = data.split(b"\n")
+                now = time.perf_counter()
+                for line in lines:
+                    if b"CAM_LIVE" in line:
+                        arrived.setdefault(json.loads(line)["SEQ"], []).append(now)
+
+    for batched in (False, True):
+        connection_module.BATCH_WRITES = batched
+        selector = selectors.DefaultSelector()
+        tallies = []
+        connections = []
+        for _ in range(args.tallies):
+            tally = socket.create_connection(("127.0.0.1", port))
+            tallies.append(tally)
+            selector.register(tally, selectors.EVENT_READ)
+            conn, addr = listener.accept()
+            connections.append(Connection(conn, addr))
+            if not batched:
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 0)  # As before
+        arrived.clear()
+        done = threading.Event()
+        reader = threading.Thread(target=read, args=[selector, done], daemon=True)
+        reader.start()
+        segments = tcp_out_segments()
+        latencies = []
+        for seq in range(1, args.broadcasts + 1):
+            data = encode({"MAC": None, "CAM_LIVE": seq % 8, "CAM_PREV": (seq + 1) % 8, "SEQ": seq})
+            started = time.perf_counter()
+            for connection in connections:
+                with connection.batch():
+                    connection.send_encoded(data, PRIORITY_TALLY)
+                    connection.send({"MAC": "A0:85:E3:47:F5:30", "SET_CAM": 3})
+                    connection.send({"MAC": "A0:85:E3:47:F5:30", "IDENTIFY": True})
+            while len(arrived.get(seq, ())) < args.tallies:
+                time.sleep(0.0005)
+            latencies.append(max(arrived[seq]) - started)
+            time.sleep(args.interval)
+        time.sleep(0.2)  # Let the last frames go
+        writes = sum(connection.writes for connection in connections)
+        segments = tcp_out_segments() - segments if segments is not None else None
+        per_broadcast = f"{writes / args.broadcasts:.0f} syscalls"
+        if segments is not None:
+            # Includes the tallies' ACKs, which are the same either way.
+            per_broadcast += f", {segments / args.broadcasts:.0f} TCP segments (both directions)"
+        print(
+            f"{'Batched' if batched else 'Write per frame'}, {args.tallies} tallies: {per_broadcast} per broadcast, "
+            f"all tallies have it {percentiles(latencies)}"
+        )
+        done.set()
+        reader.join()
+        for connection in connections:
+            connection.close()
+        for tally in tallies:
+            tally.close()
+    connection_module.BATCH_WRITES = True
+
+
+
+def register(subparsers):
+    lanes = subparsers.add_parser("lanes", help="Tally frame latency under a bulk flood")
+    lanes.add_argument("--duration", type=float, default=5, help="Seconds per run")
+    lanes.add_argument("--bulk-size", type=int, default=32 * 1024, help="Bytes per bulk message")
+    lanes.add_argument("--link-kbps", type=float, default=500, help="Simulated link speed, KiB/s")
+    lanes.add_argument("--interval-ms", type=float, default=50, help="Between tally frames")
+    lanes.set_defaults(function=bench_lanes)
+
+    writes = subparsers.add_parser("writes", help="Send syscalls and packets per broadcast")
+    writes.add_argument("--tallies", type=int, default=100)
+    writes.add_argument("--broadcasts", type=int, default=200)
+    writes.add_argument("--interval", type=float, default=0.01, help="Seconds between broadcasts")
+    writes.set_defaults(function=bench_writes)
@@ -0,0 +1,111 @@
+"""
+Failover to a standby server, see discovery.py.
+"""
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import percentiles
+
+
+def connected_macs(admin_port):
+    from admin import send_command
+
+    try:
+        result = send_command("connections", port=admin_port)["RESULT"]
+    except OSError:
+        return set()
+    return {connection["MAC"] for connection in result if connection["MAC"]}
+
+
+def bench_failover(args):
+    """
+    Run a main and a standby server with simulated tallies (client/sim/run.py) connected to the
+    main one, then kill or freeze the main server and time how long each tally takes to turn up
+    on the standby.
+    """
+    here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # server/
+    processes = []
+
+    def start(command):
+        processes.append(
+            subprocess.Popen(
+                [sys.executable] + command,
+                cwd=here,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,  # So we can kill the simulator's tallies too
+            )
+        )
+        return processes[-1]
+
+    servers = []
+    for priority, port in enumerate((args.port, args.port + 10)):
+        server = start(
+            [
+                "multithread.py",
+                "--port",
+                str(port),
+                "--admin-port",
+                str(port + 1),
+                "--priority",
+                str(priority),
+                "--beacon-addr",
+                "127.255.255.255",
+            ]
+        )
+        servers.append((server, port + 1))
+    (main, main_admin), (standby, standby_admin) = servers
+    try:
+        time.sleep(1)
+        with tempfile.TemporaryDirectory() as workdir:
+            start(
+                [
+                    os.path.join(here, "..", "client", "sim", "run.py"),
+                    "--server",
+                    f"127.0.0.1:{args.port}",
+                    "--count",
+                    str(args.tallies),
+                    "--workdir",
+                    workdir,
+                    "--quiet",
+                ]
+            )
+            while len(connected_macs(main_admin)) < args.tallies:
+                time.sleep(0.1)
+            time.sleep(2)  # Let every tally hear the standby's beacon
+
+            main.send_signal(signal.SIGKILL if args.mode == "kill" else signal.SIGSTOP)
+            started = time.monotonic()
+            failed_over = {}
+            while len(failed_over) < args.tallies and time.monotonic() - started < args.timeout:
+                for mac in connected_macs(standby_admin):
+                    failed_over.setdefault(mac, time.monotonic() - started)
+                time.sleep(0.05)
+            print(
+                f"Main server {'killed' if args.mode == 'kill' else 'frozen'}: "
+                f"{len(failed_over)}/{args.tallies} tallies failed over, "
+                f"{percentiles(list(failed_over.values()))}"
+            )
+    finally:
+        for process in processes:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+
+
+
+def register(subparsers):
+    failover = subparsers.add_parser("failover", help="Time for tallies to move to a standby server")
+    failover.add_argument("--tallies", type=int, default=5)
+    failover.add_argument(
+        "--mode",
+        choices=["kill", "stop"],
+        default="kill",
+        help="Kill the main server (connections reset), or freeze it (tallies wait for the ping timeout)",
+    )
+    failover.add_argument("--port", type=int, default=8100, help="Main server port, standby is +10")
+    failover.add_argument("--timeout", type=float, default=30)
+    failover.set_defaults(function=bench_failover)
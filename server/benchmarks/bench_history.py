@@ -0,0 +1,66 @@
+"""
+Tally history, see history.py.
+"""
+import time
+
+from benchmarks.common import percentiles
+
+
+def bench_history(args):
+    """
+    Record a show's worth of cuts into the tally history, then time queries on it.
+    """
+    import os
+    import random
+    import tempfile
+    from history import TallyHistory
+
+    path = os.path.join(tempfile.mkdtemp(), "history.bin")
+    history = TallyHistory(path, args.records)
+    started = time.time() - args.changes  # A cut a second, finishing now
+    states = [{"CAM_LIVE": 1, "CAM_PREV": 2}]
+    for i in range(args.changes - 1):
+        # Cut to preview, and preview a different camera.
+        live = states[-1]["CAM_PREV"]
+        states.append({"CAM_LIVE": live, "CAM_PREV": random.choice([c for c in range(1, args.cameras + 1) if c != live])})
+    record_started = time.perf_counter()
+    for i, state in enumerate(states):
+        history.record(started + i, i + 1, state)
+    record_took = time.perf_counter() - record_started
+    flush_started = time.perf_counter()
+    history.flush()
+    flush_took = time.perf_counter() - flush_started
+    records = history.count - history.first
+    print(
+        f"{args.changes} changes: record() {record_took / args.changes * 1e9:.0f}ns each, "
+        f"{history.count / flush_took:,.0f} transitions/s written, "
+        f"{records} kept in {os.path.getsize(path) / 1024 / 1024:.1f}MiB"
+    )
+
+    oldest = history.range(limit=1)[0]["TIME"]
+    for name, query in (
+        ("at", lambda t: history.at(t)),
+        ("10s range", lambda t: history.range(t, t + 10)),
+        ("10 min range, one camera", lambda t: history.range(t, t + 600, camera=1)),
+    ):
+        times = []
+        for _ in range(args.queries):
+            t = random.uniform(oldest, started + args.changes - 600)
+            query_started = time.perf_counter()
+            query(t)
+            times.append(time.perf_counter() - query_started)
+        print(f"{name}: {percentiles(times)}")
+
+    reopen_started = time.perf_counter()
+    TallyHistory(path, args.records)
+    print(f"Reopen: {(time.perf_counter() - reopen_started) * 1000:.0f}ms")
+
+
+
+def register(subparsers):
+    history = subparsers.add_parser("history", help="Tally history recording and query speed")
+    history.add_argument("--changes", type=int, default=86400, help="A cut a second, so a day by default")
+    history.add_argument("--cameras", type=int, default=8)
+    history.add_argument("--records", type=int, default=256 * 1024, help="History capacity")
+    history.add_argument("--queries", type=int, default=1000)
+    history.set_defaults(function=bench_history)
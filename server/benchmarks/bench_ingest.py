@@ -0,0 +1,125 @@
+"""
+Ingest adapter processes, see ingest.py.
+"""
+import socket
+import time
+
+from benchmarks.common import percentiles
+
+
+def tsl_connect(port, timeout=10):
+    """
+    @returns socket: Connected to a TSL TCP listener, once it's listening
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return socket.create_connection(("127.0.0.1", port))
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def tsl_flood(port, packets):
+    """
+    Send TSL v5.0 packets over TCP as fast as they'll go, from a process of its own.
+    """
+    from tsl import wrap_v5_tcp
+
+    with tsl_connect(port) as sock:
+        sock.sendall(b"".join(wrap_v5_tcp(packet) for packet in packets))
+        time.sleep(1)
+
+
+def bench_ingest(args):
+    """
+    TSL UMD cuts over TCP parsed in the server process, against parsed in an adapter process and
+    passed to the server through its shared memory ring: events per second and the server
+    process's CPU per event in a flood, latency from packet to publish at a steady rate, and
+    the time to get going again after the adapter is killed.
+    """
+    import itertools
+    import multiprocessing
+    import threading
+    from ingest import Ingest, RESTART_DELAY
+    from tsl import generate, TslListener, TslState, V5, wrap_v5_tcp
+
+    packets = list(itertools.islice(generate(V5, args.cameras, full=True), args.flood))
+    for mode, port in (("in-process", args.port), ("adapter + ring", args.port + 1)):
+        changes = []
+        done = threading.Event()
+        wanted = [0]
+
+        def on_change(message):
+            changes.append(time.monotonic())
+            if len(changes) >= wanted[0]:
+                done.set()
+
+        if mode == "in-process":
+            ingest = None
+            TslListener(TslState(on_change), "tcp", V5, port).start()
+        else:
+            ingest = Ingest(on_change)
+            ingest.add("tsl", [f"tcp:5:{port}"])
+            ingest.start()
+        tsl_connect(port).close()  # Wait for it to listen
+        time.sleep(0.2)
+        changes.clear()
+
+        # Flood, the sender is another process so this one's CPU time is only the ingest.
+        wanted[0] = len(packets)
+        done.clear()
+        sender = multiprocessing.get_context("fork").Process(target=tsl_flood, args=(port, packets))
+        cpu = time.process_time()
+        started = time.monotonic()
+        sender.start()
+        done.wait(60)
+        elapsed = time.monotonic() - started
+        cpu = time.process_time() - cpu
+        sender.join()
+        batches = f", {ingest.events / ingest.batches:.1f} events per wakeup" if ingest else ""
+        print(
+            f"{mode}: {len(changes) / elapsed:,.0f} events/s, "
+            f"{cpu / max(len(changes), 1) * 1e6:.1f}us server CPU per event{batches}"
+        )
+
+        # Steady rate
+        changes.clear()
+        wanted[0] = args.changes
+        done.clear()
+        sent = []
+        with tsl_connect(port) as sock:
+            for packet in itertools.islice(itertools.cycle(packets[: args.cameras]), args.changes):
+                sent.append(time.monotonic())
+                sock.sendall(wrap_v5_tcp(packet))
+                time.sleep(args.interval)
+            done.wait(5)
+        print(f"  latency, {1 / args.interval:.0f} changes/s: {percentiles([c - s for s, c in zip(sent, changes)])}")
+
+        if ingest:
+            changes.clear()
+            wanted[0] = 1
+            done.clear()
+            killed = time.monotonic()
+            ingest.adapters[0].process.kill()
+            while not done.is_set():
+                try:
+                    with tsl_connect(port, timeout=0) as sock:
+                        sock.sendall(wrap_v5_tcp(packets[len(changes) % args.cameras]))
+                        done.wait(0.05)
+                except ConnectionRefusedError:
+                    time.sleep(0.05)
+            print(f"  adapter killed: publishing again after {changes[0] - killed:.2f}s (restart delay {RESTART_DELAY}s)")
+            ingest.stop()
+
+
+
+def register(subparsers):
+    ingest = subparsers.add_parser("ingest", help="Adapter process and shared memory ring against in-process ingest")
+    ingest.add_argument("--cameras", type=int, default=8)
+    ingest.add_argument("--flood", type=int, default=20000, help="Cuts to send as fast as possible")
+    ingest.add_argument("--changes", type=int, default=500, help="Cuts to time at a steady rate")
+    ingest.add_argument("--interval", type=float, default=0.005, help="Seconds between steady cuts")
+    ingest.add_argument("--port", type=int, default=8950, help="TSL TCP port, and the one after")
+    ingest.set_defaults(function=bench_ingest)
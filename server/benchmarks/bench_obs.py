@@ -0,0 +1,55 @@
+"""
+OBS events, see obs.py.
+"""
+import time
+
+from benchmarks.common import percentiles
+
+
+def bench_obs(args):
+    """
+    Time from the mock OBS sending a scene change or source visibility event to the state change
+    being published.
+    """
+    import queue
+    from obs import CameraMap, ObsClient
+    from obsmock import MockObs
+
+    mock = MockObs({"Camera 1": ["Camera 1"], "Camera 2": ["Camera 2"], "Two shot": ["Camera 1", "Camera 2"]})
+    mock.start(port=0)
+    changes = queue.Queue()
+    client = ObsClient(
+        "127.0.0.1",
+        mock.port,
+        None,
+        CameraMap(sources={"Camera 1": 1, "Camera 2": 2}),
+        lambda message: changes.put((time.perf_counter(), message)),
+    )
+    client.start()
+    changes.get(timeout=5)  # Initial state
+    while len(client.cameras.table) < len(mock.scenes):  # Still fetching the scenes
+        time.sleep(0.01)
+
+    for name, change in (
+        ("Program scene", lambda i: mock.set_program(("Camera 2", "Camera 1")[i % 2])),
+        ("Preview scene", lambda i: mock.set_preview(("Camera 2", "Camera 1")[i % 2])),
+        # Hiding the top source of the two shot puts camera 1 on air
+        ("Source visibility", lambda i: mock.set_visible("Two shot", 2, i % 2 == 1)),
+    ):
+        if name == "Source visibility":
+            mock.set_program("Two shot")
+            changes.get(timeout=5)
+        latencies = []
+        for i in range(args.changes):
+            started = time.perf_counter()
+            change(i)
+            published, _ = changes.get(timeout=5)
+            latencies.append(published - started)
+        print(f"{name}: {percentiles(latencies)}")
+
+
+
+def register(subparsers):
+    obs = subparsers.add_parser("obs", help="OBS event to state change latency, against the mock OBS")
+    obs.add_argument("--changes", type=int, default=1000)
+    obs.set_defaults(function=bench_obs)
@@ -0,0 +1,96 @@
+"""
+OTA rollouts, see ota.py.
+"""
+import base64
+import hashlib
+import socket
+from threading import Thread
+import time
+
+from connection import Connection
+from benchmarks.common import FakeTally, read_server_side
+
+
+def reboot(tally, rollout, boot_ms):
+    """
+    The tally restarting into the update (see client/tally.py): it reconnects with a HELLO giving
+    the version in its config, still the old one, then says HELLO again once the update has
+    booted successfully and ota.mark_success() has updated it.
+    """
+    time.sleep(boot_ms / 1000)
+    tally.connection.close()
+    tally.sock.close()
+    server_sock, tally.sock = socket.socketpair()
+    tally.connection = Connection(server_sock, tally.connection.addr)
+
+    def on_message(connection, message):
+        if "HELLO" in message:  # Like multithread.on_hello()
+            connection.mac = message["MAC"].upper()
+            connection.info = message["HELLO"]
+            rollout.on_hello(connection)
+
+    read_server_side(tally, on_message)
+    tally.reply({"HELLO": {"VERSION": None}})
+    tally.reply({"HELLO": {"VERSION": rollout.package.id}})
+
+
+def bench_ota(args):
+    from ota import OtaPackage, OtaRollout
+
+    package = OtaPackage(args.files)
+    print(
+        f"Package {package.id}: {len(package.files)} files, {package.size} bytes, {len(package.chunks)} chunks"
+    )
+    for count in args.tallies:
+        tallies = [FakeTally(i, args.write_ms) for i in range(count)]
+        for tally in tallies:
+
+            def on_chunk(message, tally=tally):
+                chunk = message["OTA_CHUNK"]
+                data = base64.b64decode(chunk["DATA"])
+                assert hashlib.sha256(data).hexdigest() == chunk["SHA256"]
+                time.sleep(tally.write_ms / 1000)  # Flash write
+                tally.reply({"OTA_ACK": {"ID": chunk["ID"], "NAME": chunk["NAME"], "INDEX": chunk["INDEX"]}})
+
+            def on_end(message, tally=tally):
+                tally.reply({"OTA_DONE": {"ID": message["OTA_END"]["ID"]}})
+                Thread(target=reboot, args=[tally, rollout, args.boot_ms], daemon=True).start()
+
+            tally.handlers = {
+                "OTA_BEGIN": lambda m, t=tally: t.reply({"OTA_ACK": {"ID": m["OTA_BEGIN"]["ID"]}}),
+                "OTA_CHUNK": on_chunk,
+                "OTA_END": on_end,
+            }
+            tally.start()
+
+        rollout = OtaRollout(
+            package,
+            [tally.connection for tally in tallies],
+            max_concurrent=args.concurrent,
+            bytes_per_sec=args.bandwidth,
+        )
+        for tally in tallies:
+            read_server_side(tally, rollout.on_message)
+        rollout.start()
+        rollout.wait()
+        elapsed = rollout.finished - rollout.started
+        # Then until every tally is back, running the update.
+        deadline = time.monotonic() + args.boot_ms / 1000 + 10
+        while rollout.summary().get("DONE", 0) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        updated = time.monotonic() - rollout.started
+        print(
+            f"{count} tallies: sent in {elapsed:.2f}s, {count * package.size / elapsed / 1024:.1f}KiB/s, "
+            f"all running it after {updated:.2f}s, {rollout.summary()}"
+        )
+
+
+def register(subparsers):
+    ota = subparsers.add_parser("ota", help="Fleet wide OTA rollout time")
+    ota.add_argument("--files", nargs="+", default=["../client/tally.py"])
+    ota.add_argument("--tallies", type=int, nargs="+", default=[1, 10, 50])
+    ota.add_argument("--concurrent", type=int, default=4)
+    ota.add_argument("--bandwidth", type=int, default=100 * 1024, help="Bytes/sec")
+    ota.add_argument("--write-ms", type=float, default=5, help="Simulated flash write per chunk")
+    ota.add_argument("--boot-ms", type=float, default=1000, help="Simulated restart into the update")
+    ota.set_defaults(function=bench_ota)
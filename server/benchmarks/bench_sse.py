@@ -0,0 +1,83 @@
+"""
+Server-sent events to the dashboard, see sse.py.
+"""
+import json
+import socket
+import time
+
+from benchmarks.common import percentiles
+
+
+def bench_sse(args):
+    """
+    Time to get a change to every SSE viewer, with the frame encoded once for all of them
+    against encoding it for each.
+    """
+    import selectors
+    import threading
+    from admission import listen
+    from connection import encode
+    from sse import event, SseFeed
+
+    feed = SseFeed(lambda: {"MAC": None, "CAM_LIVE": 1, "CAM_PREV": 2})
+    listener = listen("127.0.0.1", 0, backlog=args.viewers)
+    feed.start(listener)
+    port = listener.getsockname()[1]
+    selector = selectors.DefaultSelector()
+    viewers = []
+    for _ in range(args.viewers):
+        viewer = socket.create_connection(("127.0.0.1", port))
+        viewer.sendall(b"GET /events HTTP/1.1\r\nHost: bench\r\n\r\n")
+        viewers.append(viewer)
+        selector.register(viewer, selectors.EVENT_READ)
+    while feed.query()["VIEWERS"] < args.viewers:
+        time.sleep(0.01)
+
+    received = {}  # SEQ: viewers that have it
+    done = threading.Event()
+    arrived = []
+
+    def read():
+        buffers = {viewer: b"" for viewer in viewers}
+        while not done.is_set():
+            for key, _ in selector.select(timeout=0.1):
+                data = buffers[key.fileobj] + key.fileobj.recv(65536)
+                *lines, buffers[key.fileobj] = data.split(b"\n")
+                for line in lines:
+                    if line.startswith(b"data: ") and b"SEQ" in line:
+                        seq = json.loads(line[6:])["SEQ"]
+                        received[seq] = received.get(seq, 0) + 1
+                        if received[seq] == args.viewers:
+                            arrived.append(time.perf_counter())
+
+    threading.Thread(target=read, daemon=True).start()
+    for name, shared in (("Encoded once", True), ("Encoded per viewer", False)):
+        arrived.clear()
+        received.clear()
+        latencies, broadcasts = [], []
+        for seq in range(1, args.changes + 1):
+            message = {"MAC": None, "CAM_LIVE": seq % 8, "CAM_PREV": (seq + 1) % 8, "SEQ": seq, "APPLY_AT": 0}
+            started = time.perf_counter()
+            if shared:
+                feed.broadcast(encode(message))
+            else:
+                # What it would cost if each viewer was sent its own serialisation.
+                for viewer in list(feed._viewers.values()):
+                    with feed._lock:
+                        feed._send(viewer, event(encode(message)))
+            broadcasts.append(time.perf_counter() - started)
+            while len(arrived) < seq:
+                time.sleep(0.0002)
+            latencies.append(arrived[-1] - started)
+        per_viewer = sorted(broadcasts)[len(broadcasts) // 2] / args.viewers * 1e6
+        print(f"{name}, {args.viewers} viewers: {per_viewer:.1f}us per viewer, all received {percentiles(latencies)}")
+    done.set()
+    print(feed.query())
+
+
+
+def register(subparsers):
+    sse = subparsers.add_parser("sse", help="Server-sent events fan-out to browser viewers")
+    sse.add_argument("--viewers", type=int, default=200)
+    sse.add_argument("--changes", type=int, default=500)
+    sse.set_defaults(function=bench_sse)
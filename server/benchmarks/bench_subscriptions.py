@@ -0,0 +1,52 @@
+"""
+Tally frames per switcher change, see subscriptions.py.
+"""
+import random
+
+
+class SubscribedTally:
+    """
+    Just enough of a Connection for Subscriptions.
+    """
+
+    def __init__(self, cameras=None):
+        self.cameras = None
+        self.wanted = cameras
+
+
+def bench_subscriptions(args):
+    """
+    Count tally frames sent per switcher change, sending to every tally vs only the tallies
+    subscribed to the cameras that changed.
+    """
+    from subscriptions import changed_cameras, Subscriptions
+
+    rng = random.Random(1)
+    for count in args.cameras:
+        subscriptions = Subscriptions()
+        # A tally per camera, plus some multi-camera ones (e.g. a director's monitor)
+        tallies = [SubscribedTally([camera]) for camera in range(1, count + 1)]
+        tallies += [SubscribedTally(range(1, count + 1)) for _ in range(args.multi)]
+        for tally in tallies:
+            subscriptions.subscribe(tally, tally.wanted)
+        state = {"CAM_LIVE": 1, "CAM_PREV": 2}
+        for _ in range(args.changes):
+            old = dict(state)
+            if rng.random() < 0.5:
+                # Cut: preview goes live, a new camera to preview
+                state["CAM_LIVE"] = state["CAM_PREV"]
+            state["CAM_PREV"] = rng.choice([camera for camera in range(1, count + 1) if camera not in old.values()])
+            subscriptions.targets(changed_cameras(old, state), tallies)
+        print(
+            f"{count} cameras, {len(tallies)} tallies: {len(tallies)} frames per change sent to all, "
+            f"{subscriptions.frames / subscriptions.changes:.2f} subscribed"
+        )
+
+
+
+def register(subparsers):
+    subscriptions = subparsers.add_parser("subscriptions", help="Tally frames sent per switcher change")
+    subscriptions.add_argument("--cameras", type=int, nargs="+", default=[10, 20, 40])
+    subscriptions.add_argument("--multi", type=int, default=2, help="Tallies subscribed to every camera")
+    subscriptions.add_argument("--changes", type=int, default=10000)
+    subscriptions.set_defaults(function=bench_subscriptions)
@@ -0,0 +1,45 @@
+"""
+TSL UMD parsing, see tsl.py.
+"""
+import time
+
+
+def bench_tsl(args):
+    """
+    TSL UMD packets (every camera in each) decoded and merged per second, from a source cutting
+    on every packet and from one repeating the same state.
+    """
+    import itertools
+    from tsl import decode_v31, decode_v5, generate, TslState, V31, V5
+
+    for version, decode in ((V31, decode_v31), (V5, decode_v5)):
+        cuts = list(itertools.islice(generate(version, args.cameras, full=True), args.cameras))
+        for name, packets in (("cut every packet", cuts), ("same state", cuts[:1])):
+            changes = []
+            state = TslState(changes.append)
+            source = state.add_source("bench")
+            # Decode from a reused buffer, like the UDP listener.
+            buffer = bytearray(2048)
+            view = memoryview(buffer)
+            count = 0
+            started = time.perf_counter()
+            while time.perf_counter() - started < args.duration:
+                for packet in packets:
+                    size = len(packet)
+                    buffer[:size] = packet
+                    if source.update(decode(view[:size])):
+                        state.merge()
+                count += len(packets)
+            elapsed = time.perf_counter() - started
+            print(
+                f"v{version}, {args.cameras} cameras, {name}: {count / elapsed:,.0f} packets/s, "
+                f"{source.messages / elapsed:,.0f} tallies/s, {len(changes)} state changes"
+            )
+
+
+
+def register(subparsers):
+    tsl = subparsers.add_parser("tsl", help="TSL UMD parse throughput")
+    tsl.add_argument("--cameras", type=int, default=20)
+    tsl.add_argument("--duration", type=float, default=2, help="Seconds per run")
+    tsl.set_defaults(function=bench_tsl)
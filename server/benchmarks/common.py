@@ -0,0 +1,61 @@
+"""
+Fake tallies and helpers shared by the benchmarks.
+"""
+import json
+import socket
+from threading import Thread
+
+from connection import Connection
+
+
+class FakeTally:
+    """
+    The tally end of a socketpair, answering the server like a real tally would.
+    """
+
+    def __init__(self, number, write_ms=0):
+        self.mac = f"02:00:00:00:{(number >> 8) & 0xFF:02X}:{number & 0xFF:02X}"
+        self.write_ms = write_ms
+        server_sock, self.sock = socket.socketpair()
+        self.connection = Connection(server_sock, ("fake", number))
+        self.connection.mac = self.mac
+        self.received = []
+        self.handlers = {}
+
+    def start(self):
+        Thread(target=self._read, daemon=True).start()
+
+    def reply(self, message):
+        message["MAC"] = self.mac
+        self.sock.sendall(f"{json.dumps(message)}\n".encode())
+
+    def _read(self):
+        for line in self.sock.makefile("rb"):
+            message = json.loads(line)
+            for key, handler in self.handlers.items():
+                if key in message:
+                    handler(message)
+
+
+def read_server_side(tally, on_message):
+    """
+    Read replies from a fake tally on the server end, like multithread.read_client.
+    """
+
+    def read():
+        for line in tally.connection.conn.makefile("rb"):
+            on_message(tally.connection, json.loads(line))
+
+    Thread(target=read, daemon=True).start()
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return "no samples"
+    return (
+        f"p50 {values[len(values) // 2] * 1000:.1f}ms, "
+        f"p99 {values[int(len(values) * 0.99)] * 1000:.1f}ms, "
+        f"max {values[-1] * 1000:.1f}ms"
+    )
+
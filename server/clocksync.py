@@ -0,0 +1,114 @@
+"""
+TallyHo Server clock sync
+
+Answers the tallies' clock sync requests (see client/clocksync.py) and stamps tally state
+frames with an APPLY_AT time slightly in the future, so every tally changes together.
+Tallies report how late they applied each frame, which gives us the inter-tally skew.
+"""
+from collections import deque
+from threading import Lock
+import time
+
+from connection import PRIORITY_TALLY
+
+APPLY_DELAY_MS = 40  # How far in the future to schedule changes. Must cover the network latency.
+SKEW_HISTORY = 50  # Frames to keep skew reports for
+
+_START = time.monotonic()
+
+
+def now_ms():
+    """
+    The clock tallies sync to. Kept small (ms since server start), tallies are MicroPython.
+    """
+    return int((time.monotonic() - _START) * 1000)
+
+
+class ClockSync:
+    def __init__(self, apply_delay_ms=APPLY_DELAY_MS):
+        self.apply_delay_ms = apply_delay_ms
+        self.devices = {}  # MAC: latest reported OFFSET, JITTER, RTT
+        self.applied = {}  # SEQ: {MAC: ms late}
+        self._seqs = deque()
+        self._seq = 0
+        self._lock = Lock()
+
+    def on_sync(self, connection, message, received_ms):
+        """
+        Reply to a tally's SYNC request.
+        @param received_ms: now_ms() when the request was read
+        """
+        sync = message["SYNC"]
+        with self._lock:
+            self.devices[message["MAC"]] = {
+                "OFFSET": sync.get("OFFSET"),
+                "JITTER": sync.get("JITTER"),
+                "RTT": sync.get("RTT"),
+            }
+        connection.send(
+            {
+                "MAC": message["MAC"],
+                "SYNC_REPLY": {"T0": sync["T0"], "T1": received_ms, "T2": now_ms()},
+            },
+            PRIORITY_TALLY,  # Any queueing delay is an error in the offset
+        )
+
+    def schedule(self, message):
+        """
+        Stamp a frame (in place) with a sequence number and the time to apply it.
+        """
+        with self._lock:
+            self._seq += 1
+            message["SEQ"] = self._seq
+            self._seqs.append(self._seq)
+            self.applied[self._seq] = {}
+            if len(self._seqs) > SKEW_HISTORY:
+                del self.applied[self._seqs.popleft()]
+        message["APPLY_AT"] = now_ms() + self.apply_delay_ms
+        return message
+
+    def on_applied(self, connection, message):
+        applied = message["APPLIED"]
+        with self._lock:
+            if applied["SEQ"] in self.applied:
+                self.applied[applied["SEQ"]][message["MAC"]] = applied["LATE"]
+
+    def skew(self, seq):
+        """
+        @returns int: ms between the first and last tally applying a frame, by their own clocks
+        """
+        late = list(self.applied.get(seq, {}).values())
+        if len(late) < 2:
+            return 0
+        return max(late) - min(late)
+
+    def dump(self):
+        """
+        @returns dict: What a new server process needs to carry on the same clock, see handoff.py.
+        """
+        with self._lock:
+            return {"START": _START, "SEQ": self._seq, "DEVICES": dict(self.devices)}
+
+    def load(self, state):
+        """
+        Carry on from a dump() by the previous server. time.monotonic() is the same clock for
+        every process on the machine, so now_ms() carries on where it was and tallies stay synced.
+        """
+        global _START
+        _START = state["START"]
+        with self._lock:
+            self._seq = state["SEQ"]
+            self.devices.update(state["DEVICES"])
+
+    def query(self):
+        with self._lock:
+            skews = [self.skew(seq) for seq in self._seqs if self.applied[seq]]
+            return {
+                "DEVICES": dict(self.devices),
+                "SKEW_MS": {
+                    "FRAMES": len(skews),
+                    "MAX": max(skews) if skews else None,
+                    "AVG": round(sum(skews) / len(skews), 1) if skews else None,
+                },
+                "LAST": {seq: self.applied[seq] for seq in list(self._seqs)[-5:]},
+            }
@@ -0,0 +1,283 @@
+"""
+TallyHo Server connections
+
+Wraps each tally's socket so several threads (the switcher feed, firmware updates etc.) can
+send to it safely, and keeps a registry of who is connected.
+
+Outgoing frames go into one of three priority lanes and a writer thread per connection always
+sends the most important frame waiting, so tally state changes jump ahead of everything else.
+Big bulk frames are split into PART frames (reassembled by the tally), so a tally frame
+never waits behind more than one BULK_CHUNK_SIZE piece.
+
+Everything queued when the writer wakes up is sent with one sendmsg() (at most one bulk piece
+at a time), and senders can queue several frames with batch() so they go out together, in one
+syscall and usually one packet. TCP_NODELAY is set, so nothing waits for Nagle.
+
+A connection can be detached (stopped without closing the socket) and attached again in another
+server process, see handoff.py.
+"""
+from collections import deque
+from contextlib import contextmanager
+import json
+import socket
+from threading import Condition, Lock, Thread
+
+PRIORITY_TALLY = 0  # Live / preview state, clock sync
+PRIORITY_CONTROL = 1  # Camera numbers, identify, ping, config
+PRIORITY_BULK = 2  # Firmware, anything big
+PRIORITIES = (PRIORITY_TALLY, PRIORITY_CONTROL, PRIORITY_BULK)
+
+BULK_CHUNK_SIZE = 2048  # Bytes
+MAX_QUEUED_FRAMES = 1000  # Drop connections that can't keep up
+MAX_BATCH_FRAMES = 64  # Frames per sendmsg()
+BATCH_WRITES = True  # False for a sendall() per frame, to compare
+
+
+def encode(message):
+    """
+    @returns bytes: A message (dict) as a line of JSON, ready to send.
+    """
+    return f"{json.dumps(message)}\n".encode()
+
+
+def split_parts(data, part_id, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Split an encoded frame into PART frames:
+    {"PART": {"ID": 1, "INDEX": 0, "LAST": false, "DATA": "<piece of the original frame>"}}
+    """
+    text = data.decode().rstrip("\n")
+    frames = []
+    for index, offset in enumerate(range(0, len(text), chunk_size)):
+        part = {
+            "ID": part_id,
+            "INDEX": index,
+            "LAST": offset + chunk_size >= len(text),
+            "DATA": text[offset : offset + chunk_size],
+        }
+        frames.append(f"{json.dumps({'PART': part})}\n".encode())
+    return frames
+
+
+class Connection:
+    def __init__(self, conn, addr):
+        self.conn = conn
+        self.addr = addr
+        self.mac = None  # Learnt from the tally's HELLO
+        self.info = {}  # The rest of the HELLO, e.g. MODEL, CAMERA, VERSION
+        self.cameras = None  # Cameras subscribed to, None for all. See subscriptions.py
+        self.closed = False
+        self.detached = False
+        self.read_buffer = b""  # Incomplete line read from the tally
+        self.reader = None  # The thread reading from the tally, if any
+        self._lanes = [deque() for _ in PRIORITIES]
+        self._queued = 0
+        self._wakeup = Condition(Lock())
+        self._part_id = 0
+        self._batching = 0  # Nested batch() calls in progress
+        self.writes = 0  # Send syscalls
+        self.frames_sent = 0
+        try:
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError:
+            pass  # Not TCP
+        self._writer_thread = Thread(target=self._writer, daemon=True)
+        self._writer_thread.start()
+
+    @classmethod
+    def attach(cls, conn, state):
+        """
+        Carry on a connection detached by another server.
+        @param state: As returned by dump()
+        """
+        connection = cls(conn, tuple(state["ADDR"]))
+        connection.mac = state["MAC"]
+        connection.info = state["INFO"]
+        connection.cameras = set(state["CAMERAS"]) if state["CAMERAS"] is not None else None
+        connection.read_buffer = state["READ_BUFFER"].encode("latin-1")
+        with connection._wakeup:
+            connection._part_id = state["PART_ID"]
+            for lane, frames in zip(connection._lanes, state["LANES"]):
+                lane.extend(frame.encode() for frame in frames)
+                connection._queued += len(frames)
+            connection._wakeup.notify()
+        return connection
+
+    def __repr__(self):
+        return f"<Connection {self.mac or '?'} {self.addr}>"
+
+    def send(self, message, priority=PRIORITY_CONTROL):
+        """
+        Queue a message (dict) to be sent as a line of JSON.
+        @param priority: PRIORITY_TALLY, PRIORITY_CONTROL or PRIORITY_BULK
+        """
+        self.send_encoded(encode(message), priority)
+
+    def send_encoded(self, data, priority=PRIORITY_CONTROL):
+        """
+        Queue a frame already encoded with encode(), e.g. one encoded once for many tallies.
+        """
+        if self.closed or self.detached:
+            raise ConnectionError(f"{self} is closed")
+        with self._wakeup:
+            if priority == PRIORITY_BULK and len(data) > BULK_CHUNK_SIZE:
+                self._part_id += 1
+                frames = split_parts(data, self._part_id)
+            else:
+                frames = [data]
+            self._lanes[priority].extend(frames)
+            self._queued += len(frames)
+            if not self._batching:
+                self._wakeup.notify()
+        if self._queued > MAX_QUEUED_FRAMES:
+            print(f"{self} can't keep up, {self._queued} frames queued. Disconnecting.")
+            self.close()
+
+    @contextmanager
+    def batch(self):
+        """
+        Hold back frames sent inside the with block, and send them all together at the end.
+        """
+        with self._wakeup:
+            self._batching += 1
+        try:
+            yield self
+        finally:
+            with self._wakeup:
+                self._batching -= 1
+                if not self._batching:
+                    self._wakeup.notify()
+
+    def queued(self):
+        return [len(lane) for lane in self._lanes]
+
+    def _next_frames(self):
+        """
+        Wait for and take the frames queued, most important first. Tally and control frames are
+        all taken, and at most one bulk frame, so the next tally frame isn't stuck behind more.
+        """
+        with self._wakeup:
+            while (not self._queued or self._batching) and not self.closed and not self.detached:
+                self._wakeup.wait()
+            if self.detached:
+                return None
+            frames = []
+            for lane in self._lanes:
+                while lane and len(frames) < MAX_BATCH_FRAMES:
+                    frames.append(lane.popleft())
+                    if lane is self._lanes[PRIORITY_BULK] or not BATCH_WRITES:
+                        break
+                if frames and not BATCH_WRITES:
+                    break
+            self._queued -= len(frames)
+            return frames or None
+
+    def _send_frames(self, frames):
+        if not BATCH_WRITES:
+            self.conn.sendall(frames[0])
+            self.writes += 1
+            return
+        while frames:
+            sent = self.conn.sendmsg(frames)
+            self.writes += 1
+            # Carry on from wherever a partial send stopped.
+            while frames and sent >= len(frames[0]):
+                sent -= len(frames[0])
+                frames = frames[1:]
+            if sent:
+                frames[0] = frames[0][sent:]
+
+    def _writer(self):
+        while True:
+            frames = self._next_frames()
+            if frames is None:
+                return
+            try:
+                self._send_frames(frames)
+                self.frames_sent += len(frames)
+            except OSError as e:
+                if not self.closed:
+                    print(f"Failed sending to {self}: {e}")
+                    self.close()
+                return
+
+    def detach(self):
+        """
+        Stop sending, leaving the socket open and anything unsent queued, e.g. to hand it to
+        another server. The reader thread must stop reading by itself once it sees detached.
+        """
+        with self._wakeup:
+            self.detached = True
+            self._wakeup.notify()
+
+    def dump(self):
+        """
+        Wait for a detached connection to stop.
+        @returns dict: The connection's state, for attach()
+        """
+        self._writer_thread.join()  # Let it finish the frame it's sending
+        if self.reader:
+            self.reader.join()
+        return {
+            "ADDR": list(self.addr),
+            "MAC": self.mac,
+            "INFO": self.info,
+            "CAMERAS": sorted(self.cameras) if self.cameras is not None else None,
+            "READ_BUFFER": self.read_buffer.decode("latin-1"),
+            "PART_ID": self._part_id,
+            "LANES": [[frame.decode() for frame in lane] for lane in self._lanes],
+        }
+
+    def close(self):
+        with self._wakeup:
+            self.closed = True
+            self._wakeup.notify()
+        try:
+            # Wakes up the reader thread too
+            self.conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+
+
+class ConnectionRegistry:
+    def __init__(self):
+        self._connections = set()
+        self._lock = Lock()
+
+    def add(self, connection):
+        with self._lock:
+            self._connections.add(connection)
+
+    def remove(self, connection):
+        with self._lock:
+            self._connections.discard(connection)
+
+    def all(self):
+        with self._lock:
+            return list(self._connections)
+
+    def by_mac(self, mac):
+        mac = mac.upper()
+        for connection in self.all():
+            if connection.mac == mac:
+                return connection
+        return None
+
+    def query(self):
+        """
+        Admin summary of connected tallies.
+        """
+        return [
+            dict(
+                connection.info,
+                MAC=connection.mac,
+                ADDR=f"{connection.addr[0]}:{connection.addr[1]}",
+                QUEUED=connection.queued(),
+                FRAMES_SENT=connection.frames_sent,
+                WRITES=connection.writes,
+            )
+            for connection in self.all()
+        ]
@@ -10,9 +10,12 @@ PORT = 8000  # Port to listen on (non-privileged ports are > 1023)
 from time import sleep
 
 
-def send_message(conn, message):
-    print(f"Sending {message}")
-    conn.sendall(f"{json.dumps(message)}\n".encode())
+def send_message(conn, *messages):
+    """
+    Send one or more messages in a single write.
+    """
+    print(f"Sending {', '.join(str(message) for message in messages)}")
+    conn.sendall("".join(f"{json.dumps(message)}\n" for message in messages).encode())
 
 
 while True:
@@ -20,6 +23,7 @@ while True:
         s.bind((HOST, PORT))
         s.listen()
         conn, addr = s.accept()
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         with conn:
             try:
                 while True:
@@ -32,15 +36,16 @@ while True:
                         }
                         send_message(conn, message)
                         sleep(1)
-                        message = {
-                            "MAC": "F0:F5:BD:DF:3E:F8",  # Round Touch screen one
-                            "SET_CAM": 2,
-                        }
-                        send_message(conn, message)
-                        message = {
-                            "MAC": "A0:85:E3:47:F5:30",  # Round one
-                            "SET_CAM": 3,
-                        }
-                        send_message(conn, message)
+                        send_message(
+                            conn,
+                            {
+                                "MAC": "F0:F5:BD:DF:3E:F8",  # Round Touch screen one
+                                "SET_CAM": 2,
+                            },
+                            {
+                                "MAC": "A0:85:E3:47:F5:30",  # Round one
+                                "SET_CAM": 3,
+                            },
+                        )
             except:
                 pass
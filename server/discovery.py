@@ -0,0 +1,40 @@
+"""
+TallyHo Server discovery beacon
+
+Broadcasts where tallies can find us, once a second:
+
+    {"TALLYHO": {"PORT": 8000, "PRIORITY": 0}}
+
+Tallies rank the servers they hear from by PRIORITY (lowest first), so give the main server 0
+and any standby servers higher numbers. See client/servers.py.
+"""
+import json
+import socket
+from threading import Thread
+import time
+
+DISCOVERY_PORT = 8002
+BEACON_ADDR = "255.255.255.255"
+BEACON_PERIOD = 1  # Seconds
+
+
+def beacon(port, priority=0, addr=BEACON_ADDR, period=BEACON_PERIOD):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    data = json.dumps({"TALLYHO": {"PORT": port, "PRIORITY": priority}}).encode()
+    while True:
+        try:
+            sock.sendto(data, (addr, DISCOVERY_PORT))
+        except OSError as e:
+            # No network yet, or it went away. Keep trying.
+            print(f"Failed sending discovery beacon: {e}")
+        time.sleep(period)
+
+
+def start(port, priority=0, addr=BEACON_ADDR):
+    """
+    @param port: The port tallies should connect to
+    @param addr: Where to send the beacons, the broadcast address of the tallies' network.
+    """
+    print(f"Discovery beacon to {addr}:{DISCOVERY_PORT}, priority {priority}")
+    Thread(target=beacon, args=[port, priority, addr], daemon=True).start()
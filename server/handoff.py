@@ -0,0 +1,146 @@
+"""
+TallyHo Server hot restart
+
+Hands a running server's sockets over to a new server process, so the server can be upgraded
+mid-show without any tally noticing.
+
+The running server listens on a Unix socket. The new server (multithread.py --takeover)
+connects to it, and the old server stops reading and writing, then sends over:
+
+    8 bytes   Length of the state JSON
+    JSON      {"FDS": <number of sockets>, ...state of the server...}
+    1 byte    Per batch of up to FD_BATCH sockets, attached with SCM_RIGHTS
+
+The new server carries on with the same sockets, then replies b"OK" and the old server exits.
+Anything else (or nothing) and the old server carries on instead.
+"""
+import json
+import os
+import socket
+import struct
+from threading import Event, Thread
+import time
+
+from connection import Connection
+
+HANDOFF_PATH = "/tmp/tallyho-handoff-{port}.sock"  # One per server port
+FD_BATCH = 200  # Linux allows up to 253 per message
+HANDOFF_TIMEOUT = 10  # Seconds to wait for the new server to take over
+
+
+class HandoffListener:
+    """
+    Waits for a new server to ask for our sockets.
+    """
+
+    def __init__(self, port):
+        self.path = HANDOFF_PATH.format(port=port)
+        self.requested = Event()
+        self.conn = None  # The new server, once requested
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.path)
+        sock.listen(1)
+        Thread(target=self._serve, args=[sock], daemon=True).start()
+
+    def _serve(self, sock):
+        while True:
+            conn, _ = sock.accept()
+            if self.requested.is_set():
+                conn.close()  # One at a time
+                continue
+            self.conn = conn
+            self.requested.set()
+
+    def send(self, state, socks):
+        """
+        Send our state and sockets to the new server.
+        @returns bool: True if it took over and we should exit, False to carry on.
+        """
+        conn = self.conn
+        try:
+            conn.settimeout(HANDOFF_TIMEOUT)
+            state = dict(state, FDS=len(socks))
+            data = json.dumps(state).encode()
+            conn.sendall(struct.pack("!Q", len(data)) + data)
+            fds = [sock.fileno() for sock in socks]
+            for i in range(0, len(fds), FD_BATCH):
+                socket.send_fds(conn, [b"F"], fds[i : i + FD_BATCH])
+            return conn.recv(2) == b"OK"
+        except OSError as e:
+            print(f"[HANDOFF] Failed: {e}")
+            return False
+        finally:
+            conn.close()
+            self.conn = None
+            self.requested.clear()
+
+    def refuse(self, reason):
+        """
+        Tell the new server it can't take over.
+        """
+        try:
+            data = json.dumps({"ERROR": reason}).encode()
+            self.conn.sendall(struct.pack("!Q", len(data)) + data)
+        except OSError:
+            pass
+        self.conn.close()
+        self.conn = None
+        self.requested.clear()
+
+
+def attach_connection(conn, dump, subscriptions):
+    """
+    Carry on a tally's connection from its dump, subscribed to the same cameras as before.
+    @param dump: From Connection.dump()
+    @param subscriptions: subscriptions.Subscriptions
+    @returns Connection
+    """
+    connection = Connection.attach(conn, dump)
+    if connection.cameras is not None:
+        subscriptions.subscribe(connection, connection.cameras)
+    return connection
+
+
+def _recv_exactly(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Old server closed the handoff")
+        data += chunk
+    return data
+
+
+class Takeover:
+    """
+    The new server's end: receives the old server's state and sockets.
+    """
+
+    def __init__(self, port):
+        self.started = time.monotonic()
+        self.conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.conn.settimeout(HANDOFF_TIMEOUT)
+        self.conn.connect(HANDOFF_PATH.format(port=port))
+        (length,) = struct.unpack("!Q", _recv_exactly(self.conn, 8))
+        self.state = json.loads(_recv_exactly(self.conn, length))
+        if "ERROR" in self.state:
+            raise RuntimeError(f"The running server refused: {self.state['ERROR']}")
+        self.socks = []
+        while len(self.socks) < self.state["FDS"]:
+            _, fds, _, _ = socket.recv_fds(self.conn, 1, FD_BATCH)
+            if not fds:
+                raise ConnectionError("Old server closed the handoff")
+            self.socks += [socket.socket(fileno=fd) for fd in fds]
+
+    def done(self):
+        """
+        Tell the old server we've taken over.
+        @returns float: Seconds since we asked for the handoff
+        """
+        self.conn.sendall(b"OK")
+        self.conn.close()
+        return time.monotonic() - self.started
@@ -0,0 +1,284 @@
+"""
+TallyHo Server tally history
+
+Keeps every tally transition, so we can answer "which camera was live at 21:14:07?" after a
+show. Each record is one camera changing state:
+
+    TIME (unix), SEQ (the change's sequence number), CAMERA, STATE, and the CAM_LIVE and
+    CAM_PREV it left the switcher in
+
+stored as columns in a fixed size ring in a memory mapped file (HISTORY_PATH), so a restarted
+server carries on where the last one stopped, and the oldest records are overwritten once it's
+full. At 19 bytes a record, the default 256K records is about 5MB, or a day of a camera cut
+every second.
+
+publish() only queues the change (record()); a thread works out the transitions and copies
+them into the file in batches, so recording never slows sending to the tallies. Records are in
+time order, so time ranges are a binary search, and there's a per camera index of record
+numbers for looking up one camera.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+import mmap
+import os
+import struct
+from threading import Event, Lock, Thread
+import time
+
+from subscriptions import camera_state, LIVE, PREVIEW, STANDBY
+
+HISTORY_PATH = "tallyho-history.bin"
+CAPACITY = 256 * 1024  # Records
+FLUSH_INTERVAL = 0.1  # Seconds between copying queued changes into the file
+
+_MAGIC = b"TALLYHIS"
+_VERSION = 1
+_HEADER = struct.Struct("<8sIIQ")  # Magic, version, capacity, records written ever
+_HEADER_SIZE = 64
+# Largest first, so every column starts aligned.
+COLUMNS = (("TIME", "d"), ("SEQ", "I"), ("CAMERA", "H"), ("CAM_LIVE", "H"), ("CAM_PREV", "H"), ("STATE", "B"))
+STATES = (STANDBY, PREVIEW, LIVE)  # STATE column values
+
+
+class _Times:
+    """
+    The TIME column in record number order, for bisect.
+    """
+
+    def __init__(self, history, first, last):
+        self.history = history
+        self.first = first
+        self.last = last
+
+    def __len__(self):
+        return self.last - self.first
+
+    def __getitem__(self, i):
+        return self.history.columns["TIME"][(self.first + i) % self.history.capacity]
+
+
+class _CameraTimes(_Times):
+    """
+    The TIME of a camera's records, for bisect.
+    """
+
+    def __init__(self, history, numbers):
+        super().__init__(history, 0, len(numbers))
+        self.numbers = numbers
+
+    def __getitem__(self, i):
+        return self.history.columns["TIME"][self.numbers[i] % self.history.capacity]
+
+
+class TallyHistory:
+    def __init__(self, path=HISTORY_PATH, capacity=CAPACITY):
+        self.path = path
+        self.capacity = capacity
+        self.count = 0  # Records written ever, the next record's number
+        self._queue = deque()
+        self._lock = Lock()
+        self._stop = None
+        self._state = {}  # Tally state after the last recorded change
+        self._cameras = {}  # Camera: array of its record numbers
+
+        size = _HEADER_SIZE + capacity * sum(struct.calcsize(code) for _, code in COLUMNS)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            existing = os.fstat(fd).st_size
+            if existing != size:
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        magic, version, stored_capacity, count = _HEADER.unpack_from(self._map)
+        if existing == size and magic == _MAGIC and version == _VERSION and stored_capacity == capacity:
+            self.count = count
+        elif existing:
+            print(f"[HISTORY] {path} isn't a history of {capacity} records, starting again")
+
+        view = memoryview(self._map)
+        self.columns = {}
+        offset = _HEADER_SIZE
+        for name, code in COLUMNS:
+            length = capacity * struct.calcsize(code)
+            self.columns[name] = view[offset : offset + length].cast(code)
+            offset += length
+        self._write_header()
+
+        for number in range(self.first, self.count):
+            i = number % capacity
+            self._cameras.setdefault(self.columns["CAMERA"][i], array("Q")).append(number)
+        if self.count:
+            i = (self.count - 1) % capacity
+            self._state = {"CAM_LIVE": self.columns["CAM_LIVE"][i], "CAM_PREV": self.columns["CAM_PREV"][i]}
+
+    @property
+    def first(self):
+        """
+        Number of the oldest record still in the ring.
+        """
+        return max(0, self.count - self.capacity)
+
+    def _write_header(self):
+        _HEADER.pack_into(self._map, 0, _MAGIC, _VERSION, self.capacity, self.count)
+
+    def start(self):
+        self._stop = Event()
+        Thread(target=self._run, args=[self._stop], daemon=True).start()
+
+    def stop(self):
+        """
+        Write out what's queued and stop writing. Changes recorded after this are dropped,
+        unless start() is called again.
+        """
+        if self._stop:
+            self._stop.set()
+        self.flush()
+        self._map.flush()
+
+    def record(self, timestamp, seq, state):
+        """
+        Queue a tally state change. Cheap enough for the publish path.
+        @param state: Tally state after the change, {"CAM_LIVE": ..., "CAM_PREV": ...}
+        """
+        self._queue.append((timestamp, seq, state.get("CAM_LIVE"), state.get("CAM_PREV")))
+
+    def _run(self, stop):
+        while not stop.wait(FLUSH_INTERVAL):
+            self.flush()
+
+    def flush(self):
+        """
+        Copy queued changes into the ring, one record per camera that changed state.
+        """
+        if not self._queue:
+            return
+        with self._lock:
+            batch = {name: array(code) for name, code in COLUMNS}
+            while self._queue:
+                timestamp, seq, live, preview = self._queue.popleft()
+                new = {"CAM_LIVE": live, "CAM_PREV": preview}
+                old = self._state
+                self._state = new
+                cameras = {old.get("CAM_LIVE"), old.get("CAM_PREV"), live, preview}
+                cameras -= {None, 0}  # 0 is no camera
+                for camera in sorted(cameras):
+                    state = camera_state(camera, new)
+                    if camera_state(camera, old) == state:
+                        continue
+                    batch["TIME"].append(timestamp)
+                    batch["SEQ"].append(seq or 0)
+                    batch["CAMERA"].append(camera)
+                    batch["CAM_LIVE"].append(live or 0)
+                    batch["CAM_PREV"].append(preview or 0)
+                    batch["STATE"].append(STATES.index(state))
+            self._append(batch)
+
+    def _append(self, batch):
+        total = len(batch["TIME"])
+        if total > self.capacity:  # Only the newest fit
+            batch = {name: column[-self.capacity :] for name, column in batch.items()}
+            self.count += total - self.capacity
+            total = self.capacity
+        done = 0
+        while done < total:
+            # Copy up to the end of the ring, then wrap round.
+            start = self.count % self.capacity
+            n = min(total - done, self.capacity - start)
+            for name, column in batch.items():
+                self.columns[name][start : start + n] = column[done : done + n]
+            for camera, number in zip(batch["CAMERA"][done : done + n], range(self.count, self.count + n)):
+                self._cameras.setdefault(camera, array("Q")).append(number)
+            self.count += n
+            done += n
+        self._write_header()
+        if self.count > self.capacity:
+            # Forget overwritten records from the indexes, a chunk at a time.
+            for numbers in self._cameras.values():
+                overwritten = bisect_left(numbers, self.first)
+                if overwritten >= 1024 or overwritten == len(numbers):
+                    del numbers[:overwritten]
+
+    def _record(self, number):
+        i = number % self.capacity
+        record = {name: self.columns[name][i] for name, _ in COLUMNS}
+        record["STATE"] = STATES[record["STATE"]]
+        return record
+
+    def range(self, start=0.0, end=None, camera=None, limit=None):
+        """
+        @param start, end: Unix times, end not included
+        @param camera: Only this camera's transitions
+        @returns list: Records as dicts, oldest first
+        """
+        end = float("inf") if end is None else end
+        with self._lock:
+            if camera is None:
+                times = _Times(self, self.first, self.count)
+                numbers = range(self.first, self.count)
+            else:
+                numbers = self._cameras.get(camera, array("Q"))
+                numbers = numbers[bisect_left(numbers, self.first) :]
+                times = _CameraTimes(self, numbers)
+            matched = numbers[bisect_left(times, start) : bisect_left(times, end)]
+            if limit is not None:
+                matched = matched[:limit]
+            return [self._record(number) for number in matched]
+
+    def at(self, timestamp):
+        """
+        @returns dict: The tally state at that time, or None if it's before the history starts.
+        """
+        with self._lock:
+            i = bisect_right(_Times(self, self.first, self.count), timestamp)
+            if not i:
+                return None
+            record = self._record(self.first + i - 1)
+        return {"TIME": record["TIME"], "SEQ": record["SEQ"], "CAM_LIVE": record["CAM_LIVE"], "CAM_PREV": record["CAM_PREV"]}
+
+    def query(self, *args):
+        """
+        Admin command.
+            history: Summary
+            history at TIME: Tally state at TIME
+            history TIME TIME [CAMERA]: Transitions between the two times
+        where TIME is unix time, an ISO date/time, or HH:MM[:SS] today.
+        """
+        if args and args[0] == "at":
+            return self.at(parse_time(args[1]))
+        if args:
+            start = parse_time(args[0])
+            end = parse_time(args[1]) if len(args) > 1 else None
+            camera = int(args[2]) if len(args) > 2 else None
+            return self.range(start, end, camera)
+        with self._lock:
+            oldest = self.columns["TIME"][self.first % self.capacity] if self.count else None
+            newest = self.columns["TIME"][(self.count - 1) % self.capacity] if self.count else None
+            return {
+                "PATH": self.path,
+                "RECORDS": self.count - self.first,
+                "CAPACITY": self.capacity,
+                "BYTES": len(self._map),
+                "OLDEST": oldest,
+                "NEWEST": newest,
+                "CAMERAS": {camera: len(numbers) for camera, numbers in self._cameras.items()},
+                "QUEUED": len(self._queue),
+            }
+
+
+def parse_time(text):
+    """
+    @returns float: Unix time from unix time, an ISO date/time, or HH:MM[:SS] today (local time)
+    """
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    from datetime import datetime
+
+    if "T" in text or "-" in text:
+        return datetime.fromisoformat(text).timestamp()
+    parts = [int(part) for part in text.split(":")]
+    now = time.localtime()
+    return time.mktime(now[:3] + tuple(parts + [0] * (3 - len(parts))) + (0, 0, -1))
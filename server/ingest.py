@@ -0,0 +1,375 @@
+#!/usr/bin/env python
+"""
+TallyHo Server isolated ingest
+
+Runs the switcher parsers (TSL UMD, OBS) in processes of their own, so a parser that crashes,
+hangs or is flooded can't take the tallies down with it. Each adapter process writes the tally
+states it works out into a ring in shared memory, and one server thread reads all the rings and
+publishes them.
+
+A ring has one writer (the adapter) and one reader (the server), so it needs no lock. The writer
+fills in a record and then moves HEAD on, the reader takes every record up to HEAD and then moves
+TAIL on. A full ring makes the adapter wait, never the server. When the reader runs out it sets
+WAITING and sleeps on a pipe, and the writer only writes to the pipe while WAITING is set, so
+however many events arrive together they cost the server one wakeup. The reader also wakes every
+CHECK_INTERVAL to restart adapters that have died (RESTART_DELAY, doubling up to
+MAX_RESTART_DELAY while they keep dying) and in case a wakeup crossed with it going to sleep.
+
+The server starts the adapters as:
+
+    python ingest.py --ring NAME --wakeup-fd FD tsl udp:5:8900 [tcp:3.1:8901:1 ...]
+    python ingest.py --ring NAME --wakeup-fd FD obs HOST[:PORT] [--obs-cameras PATH]
+
+with the obs-websocket password in the TALLYHO_OBS_PASSWORD environment variable, rather than
+on the command line. They exit when the server does.
+"""
+import argparse
+from collections import deque
+import os
+import select
+import struct
+import subprocess
+import sys
+from threading import Event, Lock, Thread
+import time
+from multiprocessing import shared_memory
+
+RING_SIZE = 4096  # Records
+CHECK_INTERVAL = 0.5  # Seconds
+RESTART_DELAY = 1  # Seconds
+MAX_RESTART_DELAY = 30
+RESTART_RESET = 60  # Seconds an adapter runs for before a crash counts as the first again
+FULL_WAIT = 0.001  # Seconds an adapter sleeps for while its ring is full
+LATENCY_SAMPLES = 1024
+OBS_PASSWORD_ENV = "TALLYHO_OBS_PASSWORD"
+
+_COUNTER = struct.Struct("<Q")
+# The writer's and the reader's counters are on their own cache lines.
+_HEAD = 0  # Records written ever, by the adapter
+_FULL = 8  # Times the adapter found the ring full
+_TAIL = 64  # Records read ever, by the server
+_WAITING = 72  # The server is asleep, waiting for a wakeup
+_HEADER_SIZE = 128
+_RECORD = struct.Struct("<dHH4x")  # TIME (time.monotonic() when the adapter put it), CAM_LIVE, CAM_PREV
+
+
+def _attach(name):
+    """
+    Open an existing ring's shared memory, without this process's resource tracker deleting it
+    when we exit. The server owns it.
+    """
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:  # Python < 3.13
+        from multiprocessing import resource_tracker
+
+        shm = shared_memory.SharedMemory(name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class EventRing:
+    def __init__(self, shm, owner=False, wakeup_fd=None):
+        self.shm = shm
+        self.owner = owner
+        self.wakeup_fd = wakeup_fd
+        self.capacity = (shm.size - _HEADER_SIZE) // _RECORD.size
+        self._buf = shm.buf
+        # Our own copies of the counters only we change.
+        self._head = self._counter(_HEAD)
+        self._tail = self._counter(_TAIL)
+
+    @classmethod
+    def create(cls, capacity=RING_SIZE):
+        return cls(shared_memory.SharedMemory(create=True, size=_HEADER_SIZE + capacity * _RECORD.size), owner=True)
+
+    @classmethod
+    def attach(cls, name, wakeup_fd=None):
+        """
+        The adapter's end.
+        @param wakeup_fd: Pipe to wake the server with
+        """
+        return cls(_attach(name), wakeup_fd=wakeup_fd)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def _counter(self, offset):
+        return _COUNTER.unpack_from(self._buf, offset)[0]
+
+    def put(self, live, preview):
+        """
+        Writer: add a tally state, waiting for room if the server has fallen a whole ring behind.
+        """
+        head = self._head
+        if head - self._counter(_TAIL) >= self.capacity:
+            _COUNTER.pack_into(self._buf, _FULL, self._counter(_FULL) + 1)
+            while head - self._counter(_TAIL) >= self.capacity:
+                time.sleep(FULL_WAIT)
+        _RECORD.pack_into(
+            self._buf, _HEADER_SIZE + head % self.capacity * _RECORD.size, time.monotonic(), live or 0, preview or 0
+        )
+        # Only now can the server see it.
+        self._head = head + 1
+        _COUNTER.pack_into(self._buf, _HEAD, head + 1)
+        if self._buf[_WAITING]:
+            try:
+                os.write(self.wakeup_fd, b"\0")
+            except BlockingIOError:
+                pass  # Already plenty of wakeups in the pipe
+
+    def take(self, events):
+        """
+        Reader: move every record written so far into events, as (time, live, preview).
+        @returns int: How many
+        """
+        head = self._counter(_HEAD)
+        tail = self._tail
+        count = head - tail
+        if not count:
+            return 0
+        start = tail % self.capacity
+        end = start + count
+        offset = _HEADER_SIZE + start * _RECORD.size
+        if end <= self.capacity:
+            events.extend(_RECORD.iter_unpack(self._buf[offset : offset + count * _RECORD.size]))
+        else:  # Wraps round
+            events.extend(_RECORD.iter_unpack(self._buf[offset : _HEADER_SIZE + self.capacity * _RECORD.size]))
+            events.extend(_RECORD.iter_unpack(self._buf[_HEADER_SIZE : _HEADER_SIZE + (end - self.capacity) * _RECORD.size]))
+        self._tail = head
+        _COUNTER.pack_into(self._buf, _TAIL, head)
+        return count
+
+    def set_waiting(self, waiting):
+        self._buf[_WAITING] = 1 if waiting else 0
+
+    def query(self):
+        return {
+            "WRITTEN": self._counter(_HEAD),
+            "QUEUED": self._counter(_HEAD) - self._counter(_TAIL),
+            "FULL": self._counter(_FULL),
+        }
+
+    def close(self):
+        self._buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class Adapter:
+    """
+    An adapter process, and its ring. Started again if it dies.
+    """
+
+    def __init__(self, kind, args, wakeup_fd, env=None):
+        """
+        @param kind: "tsl" or "obs"
+        @param args: Its command line arguments, see the module docstring
+        @param env: Environment variables to add for it
+        """
+        self.kind = kind
+        self.args = args
+        self.wakeup_fd = wakeup_fd
+        self.env = env
+        self.ring = EventRing.create()
+        self.process = None
+        self.started = None
+        self.restarts = 0
+        self.delay = RESTART_DELAY
+        self.restart_at = None  # time.monotonic() to start it again at, once it's died
+        self.events = 0
+
+    def start(self):
+        command = [sys.executable, os.path.abspath(__file__), "--ring", self.ring.name]
+        command += ["--wakeup-fd", str(self.wakeup_fd), self.kind, *self.args]
+        env = dict(os.environ, **self.env) if self.env else None
+        self.process = subprocess.Popen(command, pass_fds=[self.wakeup_fd], env=env)
+        self.started = time.monotonic()
+        print(f"[INGEST] Started {self.kind} adapter, pid {self.process.pid}")
+
+    def check(self, now):
+        """
+        Start it again if it's died and waited long enough.
+        """
+        if self.restart_at is not None:
+            if now >= self.restart_at:
+                self.restart_at = None
+                self.restarts += 1
+                self.start()
+            return
+        code = self.process.poll()
+        if code is None:
+            return
+        if now - self.started >= RESTART_RESET:
+            self.delay = RESTART_DELAY
+        print(f"[INGEST] {self.kind} adapter exited ({code}), restarting in {self.delay}s")
+        self.restart_at = now + self.delay
+        self.delay = min(self.delay * 2, MAX_RESTART_DELAY)
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(1)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.ring.close()
+
+    def query(self):
+        return dict(
+            {
+                "KIND": self.kind,
+                "ARGS": self.args,
+                "PID": self.process.pid,
+                "ALIVE": self.restart_at is None and self.process.poll() is None,
+                "RESTARTS": self.restarts,
+                "EVENTS": self.events,
+            },
+            **self.ring.query(),
+        )
+
+
+class Ingest:
+    def __init__(self, on_change):
+        """
+        @param on_change: Called with a {"MAC": None, "CAM_LIVE": ..., "CAM_PREV": ...} message
+            for each state an adapter sends, in order, from the ingest thread.
+        """
+        self.on_change = on_change
+        self.adapters = []
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        os.set_blocking(self._wakeup_read, False)
+        os.set_blocking(self._wakeup_write, False)
+        self._stop = Event()
+        self._thread = None
+        self.wakeups = 0
+        self.batches = 0
+        self.events = 0
+        self.max_batch = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)  # Seconds from adapter to on_change
+
+    def add(self, kind, args, env=None):
+        self.adapters.append(Adapter(kind, args, self._wakeup_write, env))
+
+    def start(self):
+        for adapter in self.adapters:
+            adapter.start()
+        self._thread = Thread(target=self._run, name="ingest", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the adapters and free their rings.
+        """
+        self._stop.set()
+        if self._thread:
+            self._thread.join(CHECK_INTERVAL * 2)
+        for adapter in self.adapters:
+            adapter.stop()
+
+    def _take(self, events):
+        for adapter in self.adapters:
+            adapter.events += adapter.ring.take(events)
+        return len(events)
+
+    def _run(self):
+        events = []
+        next_check = time.monotonic() + CHECK_INTERVAL
+        while not self._stop.is_set():
+            if not self._take(events):
+                for adapter in self.adapters:
+                    adapter.ring.set_waiting(True)
+                # Anything that came in before they saw WAITING won't wake us.
+                if not self._take(events):
+                    if select.select([self._wakeup_read], [], [], CHECK_INTERVAL)[0]:
+                        self.wakeups += 1
+                        try:
+                            while os.read(self._wakeup_read, 4096):
+                                pass
+                        except BlockingIOError:
+                            pass
+                    self._take(events)
+                for adapter in self.adapters:
+                    adapter.ring.set_waiting(False)
+            if events:
+                self._deliver(events)
+                events.clear()
+            now = time.monotonic()
+            if now >= next_check:
+                next_check = now + CHECK_INTERVAL
+                for adapter in self.adapters:
+                    adapter.check(now)
+
+    def _deliver(self, events):
+        self.batches += 1
+        self.events += len(events)
+        self.max_batch = max(self.max_batch, len(events))
+        for timestamp, live, preview in events:
+            self.latencies.append(time.monotonic() - timestamp)
+            try:
+                self.on_change({"MAC": None, "CAM_LIVE": live, "CAM_PREV": preview})
+            except Exception as e:
+                print(f"[INGEST] Failed to publish {live}/{preview}: {e}")
+
+    def query(self):
+        """
+        Admin summary.
+        """
+        latencies = sorted(self.latencies)
+        return {
+            "ADAPTERS": [adapter.query() for adapter in self.adapters],
+            "EVENTS": self.events,
+            "BATCHES": self.batches,
+            "WAKEUPS": self.wakeups,
+            "MAX_BATCH": self.max_batch,
+            "LATENCY_MS": {
+                "P50": round(latencies[len(latencies) // 2] * 1000, 3) if latencies else None,
+                "MAX": round(latencies[-1] * 1000, 3) if latencies else None,
+            },
+        }
+
+
+def run_adapter(args):
+    """
+    The adapter process: parse a source into the ring until the server goes away.
+    """
+    ring = EventRing.attach(args.ring, args.wakeup_fd)
+    lock = Lock()  # Several listeners can change the state, but the ring only takes one writer.
+
+    def on_change(message):
+        with lock:
+            ring.put(message["CAM_LIVE"], message["CAM_PREV"])
+
+    if args.kind == "tsl":
+        from tsl import TslListener, TslState
+
+        state = TslState(on_change)
+        for spec in args.sources:
+            TslListener.from_spec(state, spec).start()
+    else:
+        from obs import CameraMap, OBS_PORT, ObsClient
+
+        host, _, port = args.sources[0].partition(":")
+        ObsClient(
+            host,
+            int(port or OBS_PORT),
+            os.environ.get(OBS_PASSWORD_ENV),
+            CameraMap.load(args.obs_cameras) if args.obs_cameras else CameraMap(),
+            on_change,
+        ).start()
+    server = os.getppid()
+    while os.getppid() == server:
+        time.sleep(1)
+    print(f"[INGEST] Server gone, {args.kind} adapter exiting")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TallyHo ingest adapter, started by the server")
+    parser.add_argument("--ring", required=True, help="Shared memory name of the ring to write to")
+    parser.add_argument("--wakeup-fd", type=int, required=True)
+    parser.add_argument("--obs-cameras", metavar="PATH")
+    parser.add_argument("kind", choices=("tsl", "obs"))
+    parser.add_argument("sources", nargs="+", help="TSL listener specs, or the OBS HOST[:PORT]")
+    run_adapter(parser.parse_args())
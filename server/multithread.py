@@ -1,20 +1,213 @@
-import socket  # Import socket module
-from threading import Thread
+import argparse
+import os
+import select
+from threading import Lock, Thread
+import time
 
 import json
 
+import admin
+from admission import Admission, listen
+import clocksync
+import discovery
+from clocksync import ClockSync
+from connection import Connection, ConnectionRegistry, encode, PRIORITY_TALLY
+from handoff import attach_connection, HandoffListener, Takeover
+from history import CAPACITY, HISTORY_PATH, TallyHistory
+from ingest import Ingest, OBS_PASSWORD_ENV
+from obs import CameraMap, OBS_PORT, ObsClient
+from ota import OtaPackage, OtaRollout
+import profiling
+from sse import SSE_PORT, SseFeed
+from subscriptions import changed_cameras, Subscriptions
+from telemetry import TelemetryStore
+from tsl import TslListener, TslState
+
 HOST = ""  # Everywhere
 PORT = 8000  # Port to listen on (non-privileged ports are > 1023)
+POLL_MS = 50  # How often the accept loop and readers check for a handoff
 from time import sleep
 
+connections = ConnectionRegistry()
+telemetry = TelemetryStore()
+clock = ClockSync()
+subscriptions = Subscriptions()
+rollout: OtaRollout = None
+history: TallyHistory = None
+state = {}  # The latest tally state broadcast, for tallies that connect later
+publish_lock = Lock()  # publish() is called from the switcher, ingest, OBS and TSL threads
+handoff_listener: HandoffListener = None
+handoff_stats = {}
+threads = []
+
 
 def send_message(conn, message):
     print(f"Sending {message}")
-    conn.sendall(f"{json.dumps(message)}\n".encode())
+    conn.send(message)
 
 
-def on_new_client(conn, addr):
-    print("Got connection from", addr)
+def on_hello(connection, message):
+    connection.mac = message["MAC"].upper()
+    connection.info = message["HELLO"]
+    print(f"Hello from {connection}: {connection.info}")
+    if rollout:
+        rollout.on_hello(connection)
+
+
+def on_telemetry(connection, message):
+    count = telemetry.add_frame(message)
+    print(f"Telemetry from {message.get('MAC')}: {count} samples")
+
+
+def on_ota_reply(connection, message):
+    if rollout:
+        rollout.on_message(connection, message)
+
+
+def on_sync(connection, message):
+    clock.on_sync(connection, message, clocksync.now_ms())
+
+
+def on_subscribe(connection, message):
+    cameras = message["SUBSCRIBE"]
+    if not isinstance(cameras, list) or not all(isinstance(camera, int) for camera in cameras):
+        raise TypeError("SUBSCRIBE isn't a list of camera numbers")
+    subscriptions.subscribe(connection, cameras)
+    print(f"{connection} subscribed to cameras {sorted(connection.cameras)}")
+    # It won't have heard about its new cameras yet.
+    current = snapshot()
+    if current:
+        connection.send(current, PRIORITY_TALLY)
+
+
+# Message key: handler(connection, message)
+handlers = {
+    "HELLO": on_hello,
+    "SYNC": on_sync,
+    "SUBSCRIBE": on_subscribe,
+    "APPLIED": clock.on_applied,
+    "TELEMETRY": on_telemetry,
+    "OTA_ACK": on_ota_reply,
+    "OTA_NAK": on_ota_reply,
+    "OTA_DONE": on_ota_reply,
+}
+
+
+def handle_client_message(connection, line):
+    """
+    Handle a message sent up to us by a tally.
+    """
+    try:
+        message = json.loads(line)
+    except ValueError:
+        print(f"Invalid JSON from {connection}: {line}")
+        return
+    if not isinstance(message, dict):
+        print(f"Invalid message from {connection}: {line}")
+        return
+    for key, handler in handlers.items():
+        if key in message:
+            try:
+                handler(connection, message)
+            except (AttributeError, KeyError, TypeError, ValueError) as e:
+                # Missing or mistyped fields, drop the message rather than the tally.
+                print(f"Invalid {key} message from {connection} ({type(e).__name__}: {e}): {line}")
+
+
+def read_client(connection):
+    """
+    Read newline separated messages from a tally until it disconnects, or is detached to hand
+    it over to a new server.
+    """
+    poller = select.poll()
+    poller.register(connection.conn, select.POLLIN)
+    try:
+        while not connection.detached:
+            if not poller.poll(POLL_MS):
+                continue
+            data = connection.conn.recv(4096)
+            if not data:
+                break
+            connection.read_buffer += data
+            while b"\n" in connection.read_buffer:
+                line, connection.read_buffer = connection.read_buffer.split(b"\n", 1)
+                handle_client_message(connection, line)
+    except OSError:
+        pass
+    finally:
+        if not connection.detached:
+            connections.remove(connection)
+            subscriptions.remove(connection)
+
+
+def start_ota(*paths):
+    """
+    Admin command: send the given client files to every connected tally.
+    """
+    global rollout
+    if rollout and rollout.finished is None:
+        raise RuntimeError("An update is already in progress")
+    rollout = OtaRollout(OtaPackage(paths), connections.all())
+    rollout.start()
+    return rollout.query()
+
+
+admin.register("telemetry", telemetry.query)
+admin.register("connections", connections.query)
+admin.register("ota", start_ota)
+admin.register("ota_status", lambda: rollout.query() if rollout else None)
+admin.register("clock", clock.query)
+admin.register("handoff", lambda: handoff_stats)
+admin.register("subscriptions", subscriptions.query)
+admin.register("profile", profiling.command)
+
+
+def snapshot():
+    """
+    The current tally state, for newly connected tallies. Not under publish_lock, SseFeed calls
+    this holding its own lock, which publish() takes. Copying the dict is atomic anyway.
+    """
+    if not state:
+        return None
+    return dict(state, MAC=None)
+
+
+admission = Admission(snapshot)
+admin.register("admission", admission.query)
+sse = SseFeed(snapshot, connections.query)
+admin.register("sse", sse.query)
+
+
+@profiling.profiled
+def publish(message):
+    """
+    Send a tally state change (CAM_LIVE and/or CAM_PREV) to the tallies it affects, and the
+    SSE viewers. Changes are scheduled so all tallies show them at the same moment.
+
+    One change at a time, so the state, the SEQ numbers, the history and what each tally is sent
+    all agree on the order changes happened in.
+    """
+    with publish_lock:
+        old = dict(state)
+        state.update({key: message[key] for key in ("CAM_LIVE", "CAM_PREV") if key in message})
+        changed = changed_cameras(old, state)
+        targets = subscriptions.targets(changed, connections.all())
+        message = clock.schedule(message)
+        history.record(time.time(), message["SEQ"], state)
+        data = encode(message)
+        print(f"Publishing {message} to {len(targets)} tallies")
+        for connection in targets:
+            try:
+                connection.send_encoded(data, PRIORITY_TALLY)
+            except OSError as e:
+                print(f"Failed sending to {connection}: {e}")
+        sse.broadcast(data, changed)
+
+
+def demo_switcher():
+    """
+    Cycle the live and preview cameras, like a switcher would.
+    """
     while True:
         for i in range(4):
             message = {
@@ -22,46 +215,234 @@ def on_new_client(conn, addr):
                 "CAM_LIVE": i,
                 "CAM_PREV": i + 1,
             }
+            publish(message)
+            sleep(1)
+
+
+def on_new_client(conn, addr):
+    print("Got connection from", addr)
+    conn = Connection(conn, addr)
+    admission.add(conn)
+    run_client(conn)
+
+
+def run_client(conn):
+    connections.add(conn)
+    conn.reader = Thread(target=read_client, args=[conn], daemon=True)
+    conn.reader.start()
+    try:
+        while True:
+            # Camera changes come from demo_switcher()
+            sleep(4)
+            with conn.batch():  # One write for both
+                message = {
+                    "MAC": "F0:F5:BD:DF:3E:F8",  # Round Touch screen one
+                    "SET_CAM": 2,
+                }
+                send_message(conn, message)
+                message = {
+                    "MAC": "A0:85:E3:47:F5:30",  # Round one
+                    "SET_CAM": 3,
+                }
+                send_message(conn, message)
+            sleep(1)
+            message = {
+                "MAC": "A0:85:E3:47:F5:30",  # Round one
+                "IDENTIFY": True,
+            }
             send_message(conn, message)
             sleep(1)
-        message = {
-            "MAC": "F0:F5:BD:DF:3E:F8",  # Round Touch screen one
-            "SET_CAM": 2,
-        }
-        send_message(conn, message)
-        message = {
-            "MAC": "A0:85:E3:47:F5:30",  # Round one
-            "SET_CAM": 3,
-        }
-        send_message(conn, message)
-        sleep(1)
-        message = {
-            "MAC": "A0:85:E3:47:F5:30",  # Round one
-            "IDENTIFY": True,
-        }
-        send_message(conn, message)
-        sleep(1)
-        message = {
-            "MAC": None,  # Round one
-            "PING": True,
-        }
-        send_message(conn, message)
-
-    conn.close()
-
-
-s = socket.socket()  # Create a socket object
+            message = {
+                "MAC": None,  # Round one
+                "PING": True,
+            }
+            send_message(conn, message)
+    except ConnectionError:
+        pass
+
+    if not conn.detached:
+        # Otherwise it's been handed over to a new server, which is still using the socket.
+        conn.close()
+
+
+def hand_off(listener, admin_listener):
+    """
+    Give our sockets and state to the new server asking for them (see handoff.py).
+    @returns bool: True if it took over and we should exit.
+    """
+    if rollout and rollout.finished is None:
+        print("[HANDOFF] Refusing, an update is in progress")
+        handoff_listener.refuse("An update is in progress")
+        return False
+    started = time.monotonic()
+    attached = connections.all()
+    for connection in attached:
+        connection.detach()
+    dumps = [connection.dump() for connection in attached]
+    handed = [
+        (connection, dump)
+        for connection, dump in zip(attached, dumps)
+        if connection.conn.fileno() != -1
+    ]
+    handoff_state = {
+        "STATE": state,
+        "CLOCK": clock.dump(),
+        "CONNECTIONS": [dump for connection, dump in handed],
+    }
+    socks = [listener, admin_listener, sse.listener] + [connection.conn for connection, dump in handed]
+    stopped = time.monotonic()
+    # The new server carries on the history file from here.
+    history.stop()
+    if handoff_listener.send(handoff_state, socks):
+        print(
+            f"[HANDOFF] Handed over {len(handed)} tallies, stopped for {(stopped - started) * 1000:.1f}ms, "
+            f"{(time.monotonic() - started) * 1000:.1f}ms in total"
+        )
+        return True
+    # The new server didn't take over, carry on ourselves.
+    print("[HANDOFF] New server didn't take over, carrying on")
+    history.start()
+    # The detached connections' readers have stopped without cleaning up after themselves.
+    for connection in attached:
+        connections.remove(connection)
+        subscriptions.remove(connection)
+    for connection, dump in handed:
+        threads.append(Thread(target=run_client, args=[attach_connection(connection.conn, dump, subscriptions)]))
+        threads[-1].start()
+    return False
+
+
+parser = argparse.ArgumentParser(description="TallyHo Server")
+parser.add_argument("--port", type=int, default=PORT)
+parser.add_argument("--admin-port", type=int, default=admin.ADMIN_PORT)
+parser.add_argument(
+    "--priority",
+    type=int,
+    default=0,
+    help="Tallies prefer servers with lower priorities, e.g. 1 for a standby server",
+)
+parser.add_argument(
+    "--beacon-addr",
+    default=discovery.BEACON_ADDR,
+    help="Broadcast address to send discovery beacons to",
+)
+parser.add_argument(
+    "--tsl",
+    action="append",
+    default=[],
+    metavar="PROTOCOL:VERSION:PORT[:PRIORITY]",
+    help="Take tally state from TSL UMD, e.g. udp:5:8900 or tcp:3.1:8901:1, instead of the demo switcher. Can be given more than once",
+)
+parser.add_argument(
+    "--obs",
+    metavar="HOST[:PORT]",
+    help=f"Take tally state from OBS's program and preview scenes (obs-websocket, port {OBS_PORT} by default)",
+)
+parser.add_argument("--obs-password", help="obs-websocket password, if authentication is on")
+parser.add_argument(
+    "--obs-cameras",
+    metavar="PATH",
+    help='Which camera each OBS scene or source is, JSON like {"SCENES": {"Wide": 1}, "SOURCES": {"Camera 2": 2}}',
+)
+parser.add_argument(
+    "--in-process-ingest",
+    action="store_true",
+    help="Run the TSL and OBS parsers in the server process, rather than each in a process of its own",
+)
+parser.add_argument("--sse-port", type=int, default=SSE_PORT, help="HTTP port for dashboards and browser tallies")
+parser.add_argument("--history", default=HISTORY_PATH, help="File to keep the tally history in")
+parser.add_argument(
+    "--history-records",
+    type=int,
+    default=CAPACITY,
+    help="Transitions to keep in the history before overwriting the oldest, 19 bytes each",
+)
+parser.add_argument(
+    "--profile-dir",
+    default=profiling.PROFILE_DIR,
+    help="Where the profile admin command writes its files",
+)
+parser.add_argument(
+    "--takeover",
+    action="store_true",
+    help="Take over the sockets of the running server, so no tally notices the restart",
+)
+args = parser.parse_args()
+profiling.profile_dir = args.profile_dir
+
+handoff_listener = HandoffListener(args.port)
+if args.takeover:
+    takeover = Takeover(args.port)
+    s, admin_sock, sse_sock, *client_socks = takeover.socks
+    admin_listener = admin.start(sock=admin_sock)
+    state.update(takeover.state["STATE"])
+    clock.load(takeover.state["CLOCK"])
+    for conn, dump in zip(client_socks, takeover.state["CONNECTIONS"]):
+        connection = attach_connection(conn, dump, subscriptions)
+        # Our ping loop starts again, don't let the tally's ping timer run out meanwhile.
+        connection.send({"MAC": None, "PING": True})
+        threads.append(Thread(target=run_client, args=[connection]))
+        threads[-1].start()
+    took = takeover.done()
+    handoff_stats.update(TALLIES=len(client_socks), TAKEOVER_MS=round(took * 1000, 1))
+    print(f"[HANDOFF] Took over {len(client_socks)} tallies in {took * 1000:.1f}ms")
+else:
+    admin_listener = admin.start(port=args.admin_port)
+    s = listen(HOST, args.port)  # Now wait for client connection.
+    sse_sock = listen(HOST, args.sse_port)
+sse.start(sse_sock)
+history = TallyHistory(args.history, args.history_records)
+history.start()
+admin.register("history", history.query)
+handoff_listener.start()
+discovery.start(args.port, args.priority, args.beacon_addr)
+ingest = None
+if (args.tsl or args.obs) and not args.in_process_ingest:
+    ingest = Ingest(publish)
+    if args.tsl:
+        # One adapter for all of them, the sources' priorities are worked out together.
+        ingest.add("tsl", args.tsl)
+    if args.obs:
+        obs_args = ["--obs-cameras", args.obs_cameras] if args.obs_cameras else []
+        ingest.add("obs", obs_args + [args.obs], {OBS_PASSWORD_ENV: args.obs_password} if args.obs_password else None)
+    ingest.start()
+    admin.register("ingest", ingest.query)
+elif args.tsl:
+    tsl = TslState(publish)
+    for spec in args.tsl:
+        TslListener.from_spec(tsl, spec).start()
+    admin.register("tsl", tsl.query)
+if args.obs and args.in_process_ingest:
+    obs_host, _, obs_port = args.obs.partition(":")
+    obs = ObsClient(
+        obs_host,
+        int(obs_port or OBS_PORT),
+        args.obs_password,
+        CameraMap.load(args.obs_cameras) if args.obs_cameras else CameraMap(),
+        publish,
+    )
+    obs.start()
+    admin.register("obs", obs.query)
+if not args.tsl and not args.obs:
+    Thread(target=demo_switcher, daemon=True).start()
 
 print("Server started!")
 print("Waiting for clients...")
 
-s.bind((HOST, PORT))  # Bind to the port
-s.listen(5)  # Now wait for client connection.
-
-threads = []
+poller = select.poll()
+poller.register(s, select.POLLIN)
 try:
     while True:
-        c, addr = s.accept()  # Establish connection with client.
+        if handoff_listener.requested.is_set():
+            if hand_off(s, admin_listener):
+                # Exit without closing anything, the sockets are the new server's now.
+                if ingest:
+                    ingest.stop()  # So the new server's adapters can have the TSL ports
+                os._exit(0)
+            continue
+        if not poller.poll(POLL_MS):
+            continue
+        c, addr = admission.accept(s)  # Establish connection with client, not too many at once.
         threads.append(Thread(target=on_new_client, args=[c, addr]))
         threads[-1].start()
 
@@ -69,6 +450,8 @@ try:
         # Edit: (c,addr)
         # that's how you pass arguments to functions when creating new threads using thread module.
 except KeyboardInterrupt:
+    if ingest:
+        ingest.stop()
     for thread in threads:
         thread.join(1)
 
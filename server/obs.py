@@ -0,0 +1,253 @@
+"""
+TallyHo Server OBS ingest
+
+Follows OBS's program and preview (studio mode) scenes over obs-websocket v5, and turns them
+into the live/preview state sent to the tallies.
+
+Which camera a scene shows comes from a JSON file like:
+
+    {"SCENES": {"Wide": 1}, "SOURCES": {"Camera 2 NDI": 2, "Camera 3 NDI": 3}}
+
+A scene in SCENES is always that camera. Any other scene is the camera of its topmost visible
+source that's in SOURCES, so hiding and showing sources changes the tally too. This is all
+worked out into a scene → camera table when we connect, and kept up to date by the events,
+so a scene change is a dictionary lookup.
+
+See obsmock.py for an OBS to test against.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+from threading import Thread
+
+import websocket
+
+OBS_PORT = 4455
+RPC_VERSION = 1
+RECONNECT_DELAY = 2  # Seconds
+
+OP_HELLO = 0
+OP_IDENTIFY = 1
+OP_IDENTIFIED = 2
+OP_EVENT = 5
+OP_REQUEST = 6
+OP_REQUEST_RESPONSE = 7
+
+EVENTS_SCENES = 1 << 2
+EVENTS_SCENE_ITEMS = 1 << 7
+EVENTS_UI = 1 << 10  # Studio mode on/off
+
+
+def authentication(password, salt, challenge):
+    secret = base64.b64encode(hashlib.sha256((password + salt).encode()).digest())
+    return base64.b64encode(hashlib.sha256(secret + challenge.encode()).digest()).decode()
+
+
+class CameraMap:
+    def __init__(self, scenes=None, sources=None):
+        """
+        @param scenes: {scene name: camera}
+        @param sources: {source name: camera}
+        """
+        self.scenes = scenes or {}
+        self.sources = sources or {}
+        self.items = {}  # Scene: {scene item ID: [source name, enabled]}, bottom to top, cameras only
+        self.table = dict(self.scenes)  # Scene: camera, 0 for none
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as file:
+            config = json.load(file)
+        return cls(config.get("SCENES"), config.get("SOURCES"))
+
+    def set_scene(self, scene, items):
+        """
+        @param items: sceneItems from a GetSceneItemList response
+        """
+        self.items[scene] = {
+            item["sceneItemId"]: [item["sourceName"], item["sceneItemEnabled"]]
+            for item in sorted(items, key=lambda item: item.get("sceneItemIndex", 0))
+            if item["sourceName"] in self.sources
+        }
+        self._update(scene)
+
+    def remove_scene(self, scene):
+        self.items.pop(scene, None)
+        self.table.pop(scene, None)
+
+    def set_enabled(self, scene, item_id, enabled):
+        item = self.items.get(scene, {}).get(item_id)
+        if item:
+            item[1] = enabled
+            self._update(scene)
+
+    def _update(self, scene):
+        camera = self.scenes.get(scene, 0)
+        if not camera:
+            for source, enabled in reversed(list(self.items.get(scene, {}).values())):
+                if enabled:
+                    camera = self.sources[source]
+                    break
+        self.table[scene] = camera
+
+    def camera(self, scene):
+        return self.table.get(scene, 0)
+
+
+class ObsClient:
+    def __init__(self, host, port, password, cameras, on_change):
+        """
+        @param on_change: Called with a {"MAC": None, "CAM_LIVE": ..., "CAM_PREV": ...} message
+            when the cameras on program or preview change. 0 is no camera.
+        """
+        self.host = host
+        self.port = port
+        self.password = password
+        self.cameras = cameras
+        self.on_change = on_change
+        self.program = None
+        self.preview = None
+        self.current = (0, 0)  # (live, preview) last sent
+        self.connected = False
+        self.events = 0
+        self._ws = None
+        self._request_id = 0
+        self._reload = set()  # Scenes to fetch the items of again
+
+    def start(self):
+        Thread(target=lambda: asyncio.run(self.run()), daemon=True).start()
+
+    async def run(self):
+        while True:
+            try:
+                await self._session()
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+                print(f"OBS {self.host}:{self.port}: {e}")
+            except Exception as e:
+                # E.g. a KeyError or TypeError from a message we didn't expect. Start again from
+                # a fresh connection, rather than the thread dying and the tallies going stale.
+                print(f"OBS {self.host}:{self.port}: Unexpected {type(e).__name__}: {e}")
+            self.connected = False
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _recv(self):
+        return json.loads(await self._ws.recv())
+
+    async def _session(self):
+        self._ws = await websocket.connect(self.host, self.port, protocol="obswebsocket.json")
+        try:
+            hello = await self._recv()
+            if hello["op"] != OP_HELLO:
+                raise ConnectionError(f"Expected Hello, got {hello}")
+            identify = {
+                "rpcVersion": RPC_VERSION,
+                "eventSubscriptions": EVENTS_SCENES | EVENTS_SCENE_ITEMS | EVENTS_UI,
+            }
+            auth = hello["d"].get("authentication")
+            if auth:
+                identify["authentication"] = authentication(
+                    self.password or "", auth["salt"], auth["challenge"]
+                )
+            await self._ws.send(json.dumps({"op": OP_IDENTIFY, "d": identify}))
+            identified = await self._recv()
+            if identified["op"] != OP_IDENTIFIED:
+                raise ConnectionError(f"OBS didn't identify us: {identified}")
+            print(f"Connected to OBS {self.host}:{self.port}")
+            self.connected = True
+
+            scenes = await self.request("GetSceneList")
+            for scene in scenes["scenes"]:
+                self._reload.add(scene["sceneName"])
+            self.program = scenes["currentProgramSceneName"]
+            self.preview = scenes.get("currentPreviewSceneName")
+            await self._reload_scenes()
+            self._changed()
+
+            while True:
+                message = await self._recv()
+                if message["op"] == OP_EVENT:
+                    self._on_event(message["d"])
+                    await self._reload_scenes()
+        finally:
+            await self._ws.close()
+
+    async def request(self, request_type, data=None):
+        """
+        Make a request, handling any events that arrive while we wait for the response.
+        @returns dict: The response's responseData
+        """
+        self._request_id += 1
+        request_id = str(self._request_id)
+        await self._ws.send(
+            json.dumps(
+                {
+                    "op": OP_REQUEST,
+                    "d": {"requestType": request_type, "requestId": request_id, "requestData": data or {}},
+                }
+            )
+        )
+        while True:
+            message = await self._recv()
+            if message["op"] == OP_EVENT:
+                self._on_event(message["d"])
+            elif message["op"] == OP_REQUEST_RESPONSE and message["d"]["requestId"] == request_id:
+                status = message["d"]["requestStatus"]
+                if not status["result"]:
+                    raise ValueError(f"OBS {request_type} failed: {status}")
+                return message["d"].get("responseData", {})
+
+    async def _reload_scenes(self):
+        while self._reload:
+            scene = self._reload.pop()
+            try:
+                items = await self.request("GetSceneItemList", {"sceneName": scene})
+            except ValueError:
+                self.cameras.remove_scene(scene)  # Gone again already
+                continue
+            self.cameras.set_scene(scene, items["sceneItems"])
+            self._changed()
+
+    def _on_event(self, event):
+        self.events += 1
+        event_type = event["eventType"]
+        data = event.get("eventData", {})
+        if event_type == "CurrentProgramSceneChanged":
+            self.program = data["sceneName"]
+        elif event_type == "CurrentPreviewSceneChanged":
+            self.preview = data["sceneName"]
+        elif event_type == "StudioModeStateChanged":
+            if not data["studioModeEnabled"]:
+                self.preview = None
+        elif event_type == "SceneItemEnableStateChanged":
+            self.cameras.set_enabled(data["sceneName"], data["sceneItemId"], data["sceneItemEnabled"])
+        elif event_type in ("SceneItemCreated", "SceneItemRemoved", "SceneItemListReindexed", "SceneCreated"):
+            self._reload.add(data["sceneName"])
+        elif event_type == "SceneRemoved":
+            self.cameras.remove_scene(data["sceneName"])
+        elif event_type == "SceneNameChanged":
+            self.cameras.remove_scene(data["oldSceneName"])
+            self._reload.add(data["sceneName"])
+        self._changed()
+
+    def _changed(self):
+        current = (
+            self.cameras.camera(self.program),
+            self.cameras.camera(self.preview) if self.preview else 0,
+        )
+        if current == self.current:
+            return
+        self.current = current
+        self.on_change({"MAC": None, "CAM_LIVE": current[0], "CAM_PREV": current[1]})
+
+    def query(self):
+        """
+        Admin summary.
+        """
+        return {
+            "CONNECTED": self.connected,
+            "PROGRAM": self.program,
+            "PREVIEW": self.preview,
+            "CAMERAS": dict(self.cameras.table),
+            "EVENTS": self.events,
+        }
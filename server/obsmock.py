@@ -0,0 +1,250 @@
+"""
+TallyHo Server mock OBS
+
+Enough of obs-websocket v5 to test obs.py without OBS: scenes made of sources, program and
+preview, showing and hiding sources, and the events for them. Run on its own it cycles through
+the scenes every few seconds:
+
+    python3 obsmock.py [--port 4455] [--password secret]
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+from threading import Event, Thread
+import time
+
+import websocket
+from obs import (
+    EVENTS_SCENE_ITEMS,
+    EVENTS_SCENES,
+    EVENTS_UI,
+    OBS_PORT,
+    OP_EVENT,
+    OP_HELLO,
+    OP_IDENTIFIED,
+    OP_IDENTIFY,
+    OP_REQUEST,
+    OP_REQUEST_RESPONSE,
+    RPC_VERSION,
+    authentication,
+)
+
+DEMO_SCENES = {
+    "Wide": ["Camera 1", "Lower third"],
+    "Presenter": ["Camera 2", "Lower third"],
+    "Guest": ["Camera 3"],
+    "Two shot": ["Camera 3", "Camera 2"],  # Camera 2 is on top
+}
+
+
+class MockObs:
+    def __init__(self, scenes=None, password=None):
+        """
+        @param scenes: {scene name: [source names, bottom to top]}
+        """
+        scenes = scenes or DEMO_SCENES
+        self.scenes = {
+            name: [
+                {"sceneItemId": index + 1, "sceneItemIndex": index, "sourceName": source, "sceneItemEnabled": True}
+                for index, source in enumerate(sources)
+            ]
+            for name, sources in scenes.items()
+        }
+        self.program = next(iter(self.scenes))
+        self.preview = self.program
+        self.password = password
+        self.clients = {}  # WebSocket: event subscriptions
+        self.port = None
+        self._loop = None
+        self._started = Event()
+
+    def start(self, host="127.0.0.1", port=OBS_PORT):
+        """
+        Serve in a thread. port 0 picks a free one, see self.port.
+        """
+        Thread(target=lambda: asyncio.run(self.serve(host, port)), daemon=True).start()
+        self._started.wait()
+
+    async def serve(self, host, port):
+        self._loop = asyncio.get_running_loop()
+        server = await asyncio.start_server(self._client, host, port)
+        self.port = server.sockets[0].getsockname()[1]
+        self._started.set()
+        async with server:
+            await server.serve_forever()
+
+    async def _client(self, reader, writer):
+        try:
+            ws = await websocket.accept(reader, writer, protocol="obswebsocket.json")
+            hello = {"obsWebSocketVersion": "5.0.0", "rpcVersion": RPC_VERSION}
+            if self.password:
+                salt = base64.b64encode(os.urandom(32)).decode()
+                challenge = base64.b64encode(os.urandom(32)).decode()
+                hello["authentication"] = {"salt": salt, "challenge": challenge}
+            await ws.send(json.dumps({"op": OP_HELLO, "d": hello}))
+            identify = json.loads(await ws.recv())
+            if identify["op"] != OP_IDENTIFY or (
+                self.password
+                and identify["d"].get("authentication") != authentication(self.password, salt, challenge)
+            ):
+                await ws.close()
+                return
+            self.clients[ws] = identify["d"].get("eventSubscriptions", 0)
+            await ws.send(json.dumps({"op": OP_IDENTIFIED, "d": {"negotiatedRpcVersion": RPC_VERSION}}))
+            while True:
+                message = json.loads(await ws.recv())
+                if message["op"] == OP_REQUEST:
+                    await self._request(ws, message["d"])
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError, KeyError):
+            pass
+        finally:
+            self.clients = {client: subs for client, subs in self.clients.items() if client.writer is not writer}
+            writer.close()
+
+    async def _request(self, ws, request):
+        request_type = request["requestType"]
+        data = request.get("requestData", {})
+        response = {}
+        ok = True
+        if request_type == "GetSceneList":
+            response = {
+                "currentProgramSceneName": self.program,
+                "currentPreviewSceneName": self.preview,
+                "scenes": [
+                    {"sceneName": name, "sceneIndex": index} for index, name in enumerate(reversed(self.scenes))
+                ],
+            }
+        elif request_type == "GetSceneItemList":
+            ok = data.get("sceneName") in self.scenes
+            response = {"sceneItems": self.scenes.get(data.get("sceneName"), [])}
+        elif request_type == "GetCurrentProgramScene":
+            response = {"currentProgramSceneName": self.program}
+        elif request_type == "GetCurrentPreviewScene":
+            response = {"currentPreviewSceneName": self.preview}
+        elif request_type == "SetCurrentProgramScene":
+            ok = await self._set_program(data.get("sceneName"))
+        elif request_type == "SetCurrentPreviewScene":
+            ok = await self._set_preview(data.get("sceneName"))
+        elif request_type == "SetSceneItemEnabled":
+            ok = await self._set_visible(data.get("sceneName"), data.get("sceneItemId"), data.get("sceneItemEnabled"))
+        else:
+            ok = False
+        status = {"result": ok, "code": 100 if ok else 204}
+        await ws.send(
+            json.dumps(
+                {
+                    "op": OP_REQUEST_RESPONSE,
+                    "d": {
+                        "requestType": request_type,
+                        "requestId": request["requestId"],
+                        "requestStatus": status,
+                        "responseData": response,
+                    },
+                }
+            )
+        )
+
+    async def _event(self, subscription, event_type, data):
+        frame = json.dumps({"op": OP_EVENT, "d": {"eventType": event_type, "eventIntent": subscription, "eventData": data}})
+        for ws, subscriptions in list(self.clients.items()):
+            if subscriptions & subscription:
+                try:
+                    await ws.send(frame)
+                except (OSError, RuntimeError):
+                    pass
+
+    async def _set_program(self, scene):
+        if scene not in self.scenes:
+            return False
+        self.program = scene
+        await self._event(EVENTS_SCENES, "CurrentProgramSceneChanged", {"sceneName": scene})
+        return True
+
+    async def _set_preview(self, scene):
+        if scene not in self.scenes:
+            return False
+        self.preview = scene
+        await self._event(EVENTS_SCENES, "CurrentPreviewSceneChanged", {"sceneName": scene})
+        return True
+
+    async def _set_visible(self, scene, item_id, enabled):
+        for item in self.scenes.get(scene, []):
+            if item["sceneItemId"] == item_id:
+                item["sceneItemEnabled"] = bool(enabled)
+                await self._event(
+                    EVENTS_SCENE_ITEMS,
+                    "SceneItemEnableStateChanged",
+                    {"sceneName": scene, "sceneItemId": item_id, "sceneItemEnabled": bool(enabled)},
+                )
+                return True
+        return False
+
+    async def _reorder(self, scene, item_ids):
+        """
+        @param item_ids: The scene's items, bottom to top
+        """
+        items = {item["sceneItemId"]: item for item in self.scenes.get(scene, [])}
+        if sorted(item_ids) != sorted(items):
+            return False
+        self.scenes[scene] = [items[item_id] for item_id in item_ids]
+        for index, item in enumerate(self.scenes[scene]):
+            item["sceneItemIndex"] = index
+        await self._event(
+            EVENTS_SCENE_ITEMS,
+            "SceneItemListReindexed",
+            {
+                "sceneName": scene,
+                "sceneItems": [
+                    {"sceneItemId": item["sceneItemId"], "sceneItemIndex": item["sceneItemIndex"]}
+                    for item in self.scenes[scene]
+                ],
+            },
+        )
+        return True
+
+    async def _set_studio_mode(self, enabled):
+        await self._event(EVENTS_UI, "StudioModeStateChanged", {"studioModeEnabled": enabled})
+        return True
+
+    def _call(self, coroutine):
+        """
+        Run one of the setters from another thread, and wait for it.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def set_program(self, scene):
+        return self._call(self._set_program(scene))
+
+    def set_preview(self, scene):
+        return self._call(self._set_preview(scene))
+
+    def set_visible(self, scene, item_id, enabled):
+        return self._call(self._set_visible(scene, item_id, enabled))
+
+    def reorder(self, scene, item_ids):
+        return self._call(self._reorder(scene, item_ids))
+
+    def set_studio_mode(self, enabled):
+        return self._call(self._set_studio_mode(enabled))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pretend to be OBS for testing the OBS ingest.")
+    parser.add_argument("--port", type=int, default=OBS_PORT)
+    parser.add_argument("--password", help="Require authentication")
+    parser.add_argument("--interval", type=float, default=3, help="Seconds between scene changes")
+    args = parser.parse_args()
+
+    obs = MockObs(password=args.password)
+    obs.start("0.0.0.0", args.port)
+    print(f"Mock OBS on port {obs.port}, scenes: {', '.join(obs.scenes)}")
+    scenes = list(obs.scenes)
+    i = 0
+    while True:
+        time.sleep(args.interval)
+        obs.set_program(scenes[i % len(scenes)])
+        obs.set_preview(scenes[(i + 1) % len(scenes)])
+        print(f"Program: {obs.program}, preview: {obs.preview}")
+        i += 1
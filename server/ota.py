@@ -0,0 +1,226 @@
+"""
+TallyHo Server over the air updates
+
+Streams new client files to connected tallies over their tally connection
+(see client/ota.py for the protocol).
+
+Chunks go in the connections' bulk lane, and each tally gets one chunk at a time and must ACK
+it before the next, so a tally frame never queues behind more than one chunk. Only MAX_CONCURRENT tallies update at once, and all of
+them share a bandwidth limit, so a rollout never starves the switcher feed.
+"""
+import base64
+import hashlib
+import os
+from queue import Empty, Queue
+from threading import Lock, Thread
+import time
+
+from connection import PRIORITY_BULK
+from ratelimit import TokenBucket
+
+CHUNK_SIZE = 1024
+MAX_CONCURRENT = 4  # Tallies updating at once
+BYTES_PER_SEC = 100 * 1024  # Shared by all tallies updating
+ACK_TIMEOUT = 5  # Seconds
+MAX_RETRIES = 3  # Per chunk
+
+STATUS_PENDING = "PENDING"
+STATUS_SENDING = "SENDING"
+STATUS_APPLIED = "APPLIED"  # Tally switched to the new files and is restarting
+STATUS_DONE = "DONE"  # Tally reconnected running the new version
+STATUS_SKIPPED = "SKIPPED"  # Already on this version
+STATUS_FAILED = "FAILED"
+
+
+class OtaPackage:
+    """
+    A set of client files to send, split into chunks up front.
+    """
+
+    def __init__(self, paths, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.files = []
+        self.chunks = []
+        package_hash = hashlib.sha256()
+        for path in paths:
+            name = os.path.basename(path)
+            with open(path, "rb") as file:
+                data = file.read()
+            digest = hashlib.sha256(data).hexdigest()
+            package_hash.update(f"{name}:{digest}\n".encode())
+            self.files.append({"NAME": name, "SIZE": len(data), "SHA256": digest})
+            for index, offset in enumerate(range(0, len(data), chunk_size)):
+                chunk = data[offset : offset + chunk_size]
+                self.chunks.append(
+                    {
+                        "NAME": name,
+                        "INDEX": index,
+                        "SHA256": hashlib.sha256(chunk).hexdigest(),
+                        "DATA": base64.b64encode(chunk).decode(),
+                    }
+                )
+        self.id = package_hash.hexdigest()[:16]
+        for chunk in self.chunks:
+            chunk["ID"] = self.id
+
+    @property
+    def size(self):
+        return sum(file["SIZE"] for file in self.files)
+
+
+class OtaRollout:
+    def __init__(
+        self,
+        package,
+        connections,
+        max_concurrent=MAX_CONCURRENT,
+        bytes_per_sec=BYTES_PER_SEC,
+    ):
+        """
+        @param package: OtaPackage to send
+        @param connections: Connections to update
+        """
+        self.package = package
+        self.max_concurrent = max_concurrent
+        self.bandwidth = TokenBucket(bytes_per_sec, max(bytes_per_sec, package.chunk_size * 2))
+        self.status = {}
+        self.replies = {}  # Connection: Queue of OTA replies
+        self._lock = Lock()
+        self._pending = Queue()
+        for connection in connections:
+            if connection.info.get("VERSION") == package.id:
+                self._set_status(connection, STATUS_SKIPPED)
+                continue
+            self._set_status(connection, STATUS_PENDING)
+            self.replies[connection] = Queue()
+            self._pending.put(connection)
+        self.started = None
+        self.finished = None
+
+    def _set_status(self, connection, status):
+        with self._lock:
+            self.status[connection.mac or str(connection.addr)] = status
+
+    def start(self):
+        self.started = time.monotonic()
+        workers = [
+            Thread(target=self._worker, daemon=True)
+            for _ in range(min(self.max_concurrent, self._pending.qsize()))
+        ]
+        for worker in workers:
+            worker.start()
+
+        def wait():
+            for worker in workers:
+                worker.join()
+            self.finished = time.monotonic()
+            print(f"[OTA] Rollout {self.package.id} finished: {self.summary()}")
+
+        Thread(target=wait, daemon=True).start()
+
+    def wait(self, timeout=None):
+        end = time.monotonic() + timeout if timeout else None
+        while self.finished is None:
+            if end and time.monotonic() > end:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def _worker(self):
+        while True:
+            try:
+                connection = self._pending.get_nowait()
+            except Empty:
+                return
+            try:
+                self._update(connection)
+            except Exception as e:
+                print(f"[OTA] {connection} failed: {type(e).__name__}: {e}")
+                self._set_status(connection, f"{STATUS_FAILED}: {e}")
+
+    def _request(self, connection, message, expect):
+        """
+        Send a message and wait for the tally's reply, resending on timeout or NAK.
+        @param expect: Function returning whether a reply is the one we're waiting for.
+            Anything else is a late reply to an earlier attempt and is dropped.
+        """
+        replies = self.replies[connection]
+        for attempt in range(MAX_RETRIES):
+            connection.send(dict(message, MAC=connection.mac), PRIORITY_BULK)
+            deadline = time.monotonic() + ACK_TIMEOUT
+            while True:
+                try:
+                    reply = replies.get(timeout=max(deadline - time.monotonic(), 0))
+                except Empty:
+                    break
+                if "OTA_NAK" in reply:
+                    print(f"[OTA] {connection} NAK: {reply['OTA_NAK'].get('ERROR')}")
+                    break
+                if expect(reply):
+                    return reply
+        raise TimeoutError(f"No ACK after {MAX_RETRIES} attempts")
+
+    def _update(self, connection):
+        package = self.package
+        self._set_status(connection, f"{STATUS_SENDING} 0/{len(package.chunks)}")
+        self._request(
+            connection,
+            {
+                "OTA_BEGIN": {
+                    "ID": package.id,
+                    "CHUNK_SIZE": package.chunk_size,
+                    "FILES": package.files,
+                }
+            },
+            lambda reply: "NAME" not in reply.get("OTA_ACK", {"NAME": None}),
+        )
+        for i, chunk in enumerate(package.chunks):
+            self.bandwidth.consume(len(chunk["DATA"]))
+            expected = (chunk["NAME"], chunk["INDEX"])
+            self._request(
+                connection,
+                {"OTA_CHUNK": chunk},
+                lambda reply: "OTA_ACK" in reply
+                and (reply["OTA_ACK"].get("NAME"), reply["OTA_ACK"].get("INDEX")) == expected,
+            )
+            self._set_status(connection, f"{STATUS_SENDING} {i + 1}/{len(package.chunks)}")
+        self._request(
+            connection, {"OTA_END": {"ID": package.id}}, lambda reply: "OTA_DONE" in reply
+        )
+        self._set_status(connection, STATUS_APPLIED)
+
+    def on_message(self, connection, message):
+        """
+        Pass on OTA_ACK / OTA_NAK / OTA_DONE replies read from a tally.
+        """
+        replies = self.replies.get(connection)
+        if replies:
+            replies.put(message)
+
+    def on_hello(self, connection):
+        """
+        A tally (re)connected, check whether it came back on the new version.
+        """
+        if connection.info.get("VERSION") == self.package.id:
+            with self._lock:
+                if connection.mac in self.status:
+                    self.status[connection.mac] = STATUS_DONE
+
+    def summary(self):
+        with self._lock:
+            counts = {}
+            for status in self.status.values():
+                status = status.split(" ")[0].rstrip(":")
+                counts[status] = counts.get(status, 0) + 1
+            return counts
+
+    def query(self):
+        with self._lock:
+            return {
+                "ID": self.package.id,
+                "FILES": self.package.files,
+                "ELAPSED": round((self.finished or time.monotonic()) - self.started, 3)
+                if self.started
+                else None,
+                "STATUS": dict(self.status),
+            }
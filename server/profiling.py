@@ -0,0 +1,205 @@
+"""
+TallyHo Server profiling
+
+Profile a running server for a while, without restarting it and dropping the tallies:
+
+    profile sample 30    Sample every thread's stack (wall clock), write a collapsed stack file
+    profile cprofile 30  cProfile the @profiled functions (publishing), write pstats and a report
+    profile memory 30    tracemalloc, write the top allocations at the end
+    profile stop         End the current window early
+    profile              What's running, and the files written so far
+
+Collapsed stack files are one "frame;frame;frame count" line per stack, root first, for
+flamegraph.pl or speedscope. Nothing runs while profiling is off, apart from one check per
+@profiled call.
+"""
+import cProfile
+from functools import wraps
+import io
+import os
+import pstats
+import re
+import sys
+from threading import Event, Lock, Thread, current_thread, enumerate as threads
+import time
+import tracemalloc
+
+PROFILE_DIR = "profiles"
+SAMPLE_INTERVAL = 0.01  # Seconds, 100Hz
+MAX_SECONDS = 600
+TOP_ALLOCATIONS = 50
+TRACEBACK_FRAMES = 5
+
+profile_dir = PROFILE_DIR
+_lock = Lock()
+_window = None  # The running window, if any
+_files = []  # Written so far
+
+
+def profiled(function):
+    """
+    Decorator: run the function under cProfile during a "profile cprofile" window.
+    """
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        window = _window
+        if window is None or window.mode != "cprofile":
+            return function(*args, **kwargs)
+        return window.profiler().runcall(function, *args, **kwargs)
+
+    return wrapper
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class _Window:
+    def __init__(self, mode, seconds):
+        self.mode = mode
+        self.seconds = seconds
+        self.started = time.time()
+        self.stopped = Event()
+        self.samples = 0
+        self.stacks = {}  # Collapsed stack: count
+        self.profilers = {}  # Thread ID: cProfile.Profile
+        self.thread = Thread(target=self._run, name="profiler", daemon=True)
+
+    def profiler(self):
+        """
+        @returns cProfile.Profile: This thread's, they can't be shared between threads.
+        """
+        ident = current_thread().ident
+        profiler = self.profilers.get(ident)
+        if profiler is None:
+            profiler = self.profilers[ident] = cProfile.Profile()
+        return profiler
+
+    def _run(self):
+        if self.mode == "memory":
+            tracemalloc.start(TRACEBACK_FRAMES)
+        if self.mode == "sample":
+            own = current_thread().ident
+            while not self.stopped.wait(SAMPLE_INTERVAL):
+                self._sample(own)
+        else:
+            self.stopped.wait(self.seconds)
+        self._finish()
+
+    def _sample(self, own):
+        names = {thread.ident: re.sub(r"-\d+", "", thread.name) for thread in threads()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, "thread"))
+            key = ";".join(reversed(stack))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+        self.samples += 1
+        if time.time() - self.started >= self.seconds:
+            self.stopped.set()
+
+    def _path(self, extension):
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started))
+        return os.path.join(profile_dir, f"{stamp}-{self.mode}.{extension}")
+
+    def _finish(self):
+        global _window
+        os.makedirs(profile_dir, exist_ok=True)
+        written = []
+        if self.mode == "sample":
+            path = self._path("collapsed")
+            with open(path, "w") as file:
+                for stack, count in sorted(self.stacks.items()):
+                    file.write(f"{stack} {count}\n")
+            written.append(path)
+        elif self.mode == "cprofile":
+            # Let any calls in progress finish with their profiler first.
+            with _lock:
+                _window = None
+            time.sleep(0.1)
+            profilers = list(self.profilers.values())
+            if profilers:
+                stats = pstats.Stats(profilers[0])
+                for profiler in profilers[1:]:
+                    stats.add(profiler)
+                path = self._path("pstats")
+                stats.dump_stats(path)
+                written.append(path)
+                report = io.StringIO()
+                pstats.Stats(path, stream=report).sort_stats("cumulative").print_stats(40)
+                path = self._path("txt")
+                with open(path, "w") as file:
+                    file.write(report.getvalue())
+                written.append(path)
+        elif self.mode == "memory":
+            snapshot = tracemalloc.take_snapshot()
+            traced, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+            path = self._path("txt")
+            with open(path, "w") as file:
+                file.write(f"Traced {traced / 1024:.1f}KiB, peak {peak / 1024:.1f}KiB\n\n")
+                for statistic in snapshot.statistics("traceback")[:TOP_ALLOCATIONS]:
+                    file.write(f"{statistic.size / 1024:.1f}KiB in {statistic.count} blocks\n")
+                    for line in statistic.traceback.format():
+                        file.write(f"{line}\n")
+                    file.write("\n")
+            written.append(path)
+        with _lock:
+            if _window is self:
+                _window = None
+            _files.extend(written)
+        print(f"[PROFILE] {self.mode} finished, wrote {', '.join(written) or 'nothing'}")
+
+
+def start(mode="sample", seconds="10"):
+    """
+    Start a profiling window.
+    """
+    global _window
+    if mode not in ("sample", "cprofile", "memory"):
+        raise ValueError(f"Unknown mode {mode}, expected sample, cprofile or memory")
+    seconds = min(float(seconds), MAX_SECONDS)
+    with _lock:
+        if _window is not None:
+            raise RuntimeError(f"Already profiling ({_window.mode})")
+        _window = _Window(mode, seconds)
+        _window.thread.start()
+    print(f"[PROFILE] {mode} for {seconds}s")
+    return status()
+
+
+def stop():
+    window = _window
+    if window is None:
+        return None
+    window.stopped.set()
+    window.thread.join()
+    return status()
+
+
+def status():
+    window = _window
+    return {
+        "MODE": window.mode if window else None,
+        "REMAINING": round(window.started + window.seconds - time.time(), 1) if window else None,
+        "SAMPLES": window.samples if window else None,
+        "FILES": list(_files),
+    }
+
+
+def command(*args):
+    """
+    Admin command, see the module docstring.
+    """
+    if not args:
+        return status()
+    if args[0] == "stop":
+        return stop()
+    return start(*args)
@@ -0,0 +1,45 @@
+"""
+TallyHo Server rate limiting
+"""
+from threading import Lock
+import time
+
+
+class TokenBucket:
+    """
+    Allows `rate` tokens per second on average, with bursts of up to `burst` tokens.
+    Thread safe, several senders can share one bucket.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_consume(self, tokens=1):
+        """
+        @returns float: 0 if the tokens were taken, otherwise seconds until they will be available.
+        """
+        with self._lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0
+            return (tokens - self.tokens) / self.rate
+
+    def consume(self, tokens=1):
+        """
+        Block until the tokens are available, then take them.
+        """
+        while True:
+            wait = self.try_consume(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
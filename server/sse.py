@@ -0,0 +1,332 @@
+"""
+TallyHo Server-Sent Events feed
+
+A read only view of the tally state over plain HTTP, for dashboards and browser tallies:
+
+    GET /                 Dashboard page, or a full screen browser tally with ?camera=3
+    GET /events           text/event-stream of tally state frames, ?camera=3 (or 1,2) for only
+                          changes to those cameras, plus "devices" events listing the tallies
+    GET /state            The current state and devices as JSON, once
+
+The frames are the ones publish() has already encoded for the tallies, wrapped as an event once
+per change and then written to every viewer, so a viewer costs one non-blocking send per change.
+One thread serves all the viewers. Viewers that can't keep up are dropped; EventSource
+reconnects by itself and gets the current state again.
+"""
+import json
+import selectors
+import socket
+from threading import Lock, Thread
+import time
+from urllib.parse import parse_qs, urlsplit
+
+SSE_PORT = 8003
+KEEPALIVE = 15  # Seconds between comments sent to keep proxies and dead viewers in check
+DEVICES_INTERVAL = 2  # Seconds between checks for devices connecting or going
+MAX_REQUEST = 8192  # Bytes
+MAX_PENDING = 64 * 1024  # Bytes a viewer can fall behind before it's dropped
+
+_STREAM_HEADERS = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: text/event-stream\r\n"
+    b"Cache-Control: no-cache\r\n"
+    b"Access-Control-Allow-Origin: *\r\n"
+    b"\r\n"
+    b"retry: 1000\n\n"
+)
+
+_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><meta name="viewport" content="width=device-width">
+<title>TallyHo</title>
+<style>
+body { font-family: sans-serif; background: #222; color: #eee; margin: 0; }
+#cameras { display: flex; flex-wrap: wrap; gap: 8px; padding: 8px; }
+.camera { width: 80px; height: 80px; font-size: 40px; display: flex; align-items: center;
+  justify-content: center; background: #444; border-radius: 8px; }
+.LIVE { background: #d00; } .PREVIEW { background: #0a0; }
+body.tally #cameras { height: 100vh; padding: 0; }
+body.tally .camera { width: 100%; height: 100%; font-size: 40vh; border-radius: 0; }
+td { padding: 2px 8px; }
+</style></head>
+<body><div id="cameras"></div><table id="devices"></table>
+<script>
+const camera = new URLSearchParams(location.search).get("camera");
+if (camera) document.body.className = "tally";
+const events = new EventSource("events" + location.search);
+let cameras = camera ? [Number(camera)] : [];
+events.onmessage = (event) => {
+  const state = JSON.parse(event.data);
+  for (const c of [state.CAM_LIVE, state.CAM_PREV]) if (c && !camera && !cameras.includes(c)) cameras.push(c);
+  cameras.sort((a, b) => a - b);
+  document.getElementById("cameras").replaceChildren(...cameras.map((c) => {
+    const div = document.createElement("div");
+    div.className = "camera " + (c === state.CAM_LIVE ? "LIVE" : c === state.CAM_PREV ? "PREVIEW" : "");
+    div.textContent = c;
+    return div;
+  }));
+};
+// Devices send their own HELLO, so their fields only ever go in as text, never as HTML.
+events.addEventListener("devices", (event) => {
+  if (camera) return;
+  document.getElementById("devices").replaceChildren(...JSON.parse(event.data).map((device) => {
+    const row = document.createElement("tr");
+    for (const value of [device.MAC, device.ADDR, device.CAMERA, device.MODEL]) {
+      row.insertCell().textContent = value ?? "";
+    }
+    return row;
+  }));
+});
+</script></body></html>
+"""
+
+
+def event(data, name=None):
+    """
+    @param data: An encoded frame (a line of JSON, see connection.encode())
+    @returns bytes: It as a server-sent event
+    """
+    prefix = b"event: " + name.encode() + b"\n" if name else b""
+    return prefix + b"data: " + data.rstrip(b"\n") + b"\n\n"
+
+
+def _response(status, content_type, body):
+    return (
+        f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+        "Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n"
+    ).encode() + body
+
+
+class _Viewer:
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.addr = addr
+        self.request = b""
+        self.cameras = None  # Only send changes to these, None for all
+        self.pending = b""  # Not sent yet, the socket's buffer was full
+        self.streaming = False
+        self.close_when_sent = False
+        self.dead = False
+
+
+class SseFeed:
+    def __init__(self, snapshot, devices=lambda: []):
+        """
+        @param snapshot: Returns the current tally state message, or None
+        @param devices: Returns the connected tallies, e.g. ConnectionRegistry.query
+        """
+        self.snapshot = snapshot
+        self.devices = devices
+        self.listener = None
+        self._viewers = {}  # Socket: _Viewer, streaming or not
+        self._lock = Lock()  # For the viewers' pending data
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_read, self._wakeup_write = socket.socketpair()
+        self._wakeup_read.setblocking(False)
+        self._wakeup_write.setblocking(False)
+        self._devices = None  # Last devices event sent
+        self.events = 0  # Events broadcast
+        self.sends = 0
+        self.dropped = 0
+
+    def start(self, sock):
+        """
+        Serve viewers connecting to sock (see admission.listen()) in a thread.
+        """
+        self.listener = sock
+        sock.setblocking(False)
+        self._selector.register(sock, selectors.EVENT_READ)
+        self._selector.register(self._wakeup_read, selectors.EVENT_READ)
+        Thread(target=self._serve, name="sse", daemon=True).start()
+
+    def broadcast(self, data, cameras=None, name=None):
+        """
+        Send an encoded frame to every streaming viewer.
+        @param cameras: The cameras it changes, to skip viewers only following others. None for all.
+        """
+        frame = event(data, name)
+        self._send_all(frame, cameras)
+
+    def _send_all(self, frame, cameras=None):
+        wake = False
+        with self._lock:
+            self.events += 1
+            for viewer in list(self._viewers.values()):
+                if not viewer.streaming or viewer.dead:
+                    continue
+                if cameras is not None and viewer.cameras is not None and not viewer.cameras & cameras:
+                    continue
+                wake |= self._send(viewer, frame)
+        if wake:
+            self._wake()
+
+    def _send(self, viewer, data):
+        """
+        Send what we can now, and leave the rest for the serve thread. Call with the lock held.
+        @returns bool: True if the serve thread needs to look at the viewer
+        """
+        self.sends += 1
+        if not viewer.pending:
+            try:
+                sent = viewer.sock.send(data)
+            except BlockingIOError:
+                sent = 0
+            except OSError:
+                viewer.dead = True
+                return True
+            data = data[sent:]
+            if not data:
+                return False
+        viewer.pending += data
+        if len(viewer.pending) > MAX_PENDING:
+            print(f"[SSE] {viewer.addr[0]} can't keep up, dropping")
+            self.dropped += 1
+            viewer.dead = True
+        return True
+
+    def _flush(self, viewer):
+        """
+        Send what we can of what a viewer is behind on.
+        """
+        with self._lock:
+            try:
+                sent = viewer.sock.send(viewer.pending)
+            except BlockingIOError:
+                return
+            except OSError:
+                viewer.dead = True
+                return
+            viewer.pending = viewer.pending[sent:]
+
+    def _wake(self):
+        try:
+            self._wakeup_write.send(b"\0")
+        except BlockingIOError:
+            pass  # Already woken
+
+    def _serve(self):
+        next_keepalive = time.monotonic() + KEEPALIVE
+        next_devices = time.monotonic()
+        while True:
+            for key, events in self._selector.select(timeout=DEVICES_INTERVAL):
+                if key.fileobj is self.listener:
+                    self._accept()
+                elif key.fileobj is self._wakeup_read:
+                    try:
+                        while self._wakeup_read.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                elif events & selectors.EVENT_READ:
+                    self._read(self._viewers[key.fileobj])
+                elif events & selectors.EVENT_WRITE:
+                    self._flush(self._viewers[key.fileobj])
+            self._tidy()
+            now = time.monotonic()
+            if now >= next_devices:
+                next_devices = now + DEVICES_INTERVAL
+                self._send_devices()
+            if now >= next_keepalive:
+                next_keepalive = now + KEEPALIVE
+                self._send_all(b":\n\n")
+
+    def _accept(self):
+        while True:
+            try:
+                sock, addr = self.listener.accept()
+            except (BlockingIOError, OSError):
+                return
+            sock.setblocking(False)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self._lock:
+                self._viewers[sock] = _Viewer(sock, addr)
+            self._selector.register(sock, selectors.EVENT_READ)
+
+    def _read(self, viewer):
+        try:
+            data = viewer.sock.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            viewer.dead = True  # Gone
+            return
+        if viewer.streaming or viewer.close_when_sent:
+            return  # Nothing more to read from a viewer
+        viewer.request += data
+        if b"\r\n\r\n" in viewer.request:
+            self._respond(viewer)
+        elif len(viewer.request) > MAX_REQUEST:
+            viewer.dead = True
+
+    def _respond(self, viewer):
+        try:
+            method, target, _ = viewer.request.split(b"\r\n", 1)[0].decode("latin-1").split(" ", 2)
+        except ValueError:
+            method, target = None, ""
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        if method != "GET":
+            response = _response("405 Method Not Allowed", "text/plain", b"GET only\n")
+        elif url.path == "/events":
+            if "camera" in query:
+                try:
+                    viewer.cameras = {int(camera) for camera in query["camera"][0].split(",")}
+                except ValueError:
+                    pass
+            with self._lock:
+                state = self.snapshot()
+                response = _STREAM_HEADERS
+                if state:
+                    response += event(json.dumps(state).encode())
+                response += event(json.dumps(self.devices()).encode(), "devices")
+                viewer.streaming = True
+                self._send(viewer, response)
+            return
+        elif url.path == "/state":
+            body = json.dumps({"STATE": self.snapshot(), "DEVICES": self.devices()}).encode()
+            response = _response("200 OK", "application/json", body)
+        elif url.path in ("/", "/index.html"):
+            response = _response("200 OK", "text/html; charset=utf-8", _PAGE.encode())
+        else:
+            response = _response("404 Not Found", "text/plain", b"Not found\n")
+        viewer.close_when_sent = True
+        with self._lock:
+            self._send(viewer, response)
+
+    def _tidy(self):
+        """
+        Close viewers that are finished with, and wait to write to those that are behind.
+        """
+        with self._lock:
+            for sock, viewer in list(self._viewers.items()):
+                if viewer.dead or (viewer.close_when_sent and not viewer.pending):
+                    self._selector.unregister(sock)
+                    del self._viewers[sock]
+                    sock.close()
+                    continue
+                events = selectors.EVENT_READ | (selectors.EVENT_WRITE if viewer.pending else 0)
+                if self._selector.get_key(sock).events != events:
+                    self._selector.modify(sock, events)
+
+    def _send_devices(self):
+        if not any(viewer.streaming for viewer in list(self._viewers.values())):
+            return
+        devices = json.dumps(self.devices()).encode()
+        if devices != self._devices:
+            self._devices = devices
+            self.broadcast(devices, name="devices")
+
+    def query(self):
+        """
+        Admin summary.
+        """
+        with self._lock:
+            viewers = [viewer for viewer in self._viewers.values() if viewer.streaming]
+            return {
+                "VIEWERS": len(viewers),
+                "BEHIND": sum(1 for viewer in viewers if viewer.pending),
+                "EVENTS": self.events,
+                "SENDS": self.sends,
+                "DROPPED": self.dropped,
+            }
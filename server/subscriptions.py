@@ -0,0 +1,91 @@
+"""
+TallyHo Server camera subscriptions
+
+Tallies subscribe to the cameras they show (more than one for ISO or multi-camera tallies):
+
+    {"MAC": ..., "SUBSCRIBE": [3]}
+
+and are then only sent a tally state frame when one of those cameras changes between LIVE,
+PREVIEW and STANDBY. Tallies that haven't subscribed are sent every frame.
+"""
+from threading import Lock
+
+LIVE = "LIVE"
+PREVIEW = "PREVIEW"
+STANDBY = "STANDBY"
+
+
+def camera_state(camera, state):
+    """
+    @param state: Tally state, {"CAM_LIVE": ..., "CAM_PREV": ...}
+    @returns str: LIVE, PREVIEW or STANDBY
+    """
+    if camera == state.get("CAM_LIVE"):
+        return LIVE
+    if camera == state.get("CAM_PREV"):
+        return PREVIEW
+    return STANDBY
+
+
+def changed_cameras(old, new):
+    """
+    @returns set: Cameras in a different state in the new tally state than the old one.
+    """
+    cameras = {old.get("CAM_LIVE"), old.get("CAM_PREV"), new.get("CAM_LIVE"), new.get("CAM_PREV")}
+    cameras.discard(None)
+    return {camera for camera in cameras if camera_state(camera, old) != camera_state(camera, new)}
+
+
+class Subscriptions:
+    def __init__(self):
+        self._index = {}  # Camera: set of subscribed connections
+        self._lock = Lock()
+        self.changes = 0  # State changes published
+        self.frames = 0  # Frames sent for them
+
+    def subscribe(self, connection, cameras):
+        """
+        Replaces any cameras the connection was subscribed to before.
+        """
+        with self._lock:
+            self._unindex(connection)
+            connection.cameras = set(cameras)
+            for camera in connection.cameras:
+                self._index.setdefault(camera, set()).add(connection)
+
+    def remove(self, connection):
+        with self._lock:
+            self._unindex(connection)
+
+    def _unindex(self, connection):
+        for camera in connection.cameras or ():
+            subscribers = self._index.get(camera)
+            if subscribers:
+                subscribers.discard(connection)
+                if not subscribers:
+                    del self._index[camera]
+
+    def targets(self, cameras, connections):
+        """
+        Who to send a change of the given cameras to. Counted as one published change.
+        @param connections: Everyone connected, for those without subscriptions
+        @returns set: Connections
+        """
+        with self._lock:
+            targets = {connection for connection in connections if connection.cameras is None}
+            for camera in cameras:
+                targets |= self._index.get(camera, set())
+        self.changes += 1
+        self.frames += len(targets)
+        return targets
+
+    def query(self):
+        """
+        Admin summary.
+        """
+        with self._lock:
+            return {
+                "CAMERAS": {camera: len(subscribers) for camera, subscribers in self._index.items()},
+                "CHANGES": self.changes,
+                "FRAMES": self.frames,
+            }
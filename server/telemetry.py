@@ -0,0 +1,133 @@
+"""
+TallyHo Server telemetry store
+
+Aggregates the device health frames sent up by the tallies (see client/telemetry.py) into a
+fixed size time series per device, so memory use stays flat however long the server runs.
+Devices are kept across reconnects (a tally that keeps dropping off is the one worth looking at),
+and forgotten once they haven't sent anything for DEVICE_EXPIRY, or when there are more than
+MAX_DEVICES, least recently seen first.
+"""
+from array import array
+from threading import Lock
+import time
+
+# Must match the client's FIELDS order.
+FIELDS = ("HEAP", "RSSI", "RECONNECTS", "LOOP_MS", "WDT_GAP_MS", "WDT_NEAR_MISSES")
+
+HISTORY_SIZE = 720  # Samples per device, 1 hour at the client's 5 sec sample period.
+DEVICE_EXPIRY = 60 * 60  # Secs, by when all of a device's samples are older than a full history
+MAX_DEVICES = 256
+
+
+class DeviceSeries:
+    """
+    Ring of samples for a single device, one preallocated array per field.
+    """
+
+    def __init__(self, size=HISTORY_SIZE):
+        self.size = size
+        self.times = array("d", [0.0]) * size
+        self.fields = {field: array("l", [0]) * size for field in FIELDS}
+        self.head = 0
+        self.count = 0
+        self.boots = 0
+        self.last_seen = 0.0
+
+    def add(self, timestamp, values):
+        head = self.head
+        self.times[head] = timestamp
+        for field, value in zip(FIELDS, values):
+            self.fields[field][head] = value
+        self.head = (head + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    def _indexes(self):
+        start = (self.head - self.count) % self.size
+        return ((start + i) % self.size for i in range(self.count))
+
+    def get_samples(self, since=0.0):
+        """
+        @param since: Only return samples taken after this unix timestamp
+        @returns list: [timestamp, *FIELDS] for each sample, oldest first
+        """
+        return [
+            [self.times[i]] + [self.fields[field][i] for field in FIELDS]
+            for i in self._indexes()
+            if self.times[i] > since
+        ]
+
+    def get_latest(self):
+        if not self.count:
+            return None
+        i = (self.head - 1) % self.size
+        return dict(
+            zip(("TIME",) + FIELDS, [self.times[i]] + [self.fields[f][i] for f in FIELDS])
+        )
+
+
+class TelemetryStore:
+    def __init__(self, size=HISTORY_SIZE, max_devices=MAX_DEVICES, expiry=DEVICE_EXPIRY):
+        self.size = size
+        self.max_devices = max_devices
+        self.expiry = expiry
+        self.devices = {}
+        self.lock = Lock()
+
+    def add_frame(self, message, received=None):
+        """
+        Add a telemetry frame from a tally.
+        Sample ticks are relative to the device's TICKS at send time, convert them to server time.
+        @returns int: Number of samples added
+        """
+        if received is None:
+            received = time.time()
+        mac = message["MAC"]
+        sent_ticks = message["TICKS"]
+        with self.lock:
+            series = self.devices.get(mac)
+            if not series:
+                self._prune(received)
+                series = self.devices[mac] = DeviceSeries(self.size)
+            for sample in message["TELEMETRY"]:
+                series.add(
+                    received - (sent_ticks - sample[0]) / 1000, sample[1 : len(FIELDS) + 1]
+                )
+            series.boots = message.get("BOOTS", 0)
+            series.last_seen = received
+        return len(message["TELEMETRY"])
+
+    def _prune(self, now):
+        """
+        Make room for a new device. Call with the lock held.
+        """
+        by_last_seen = sorted(self.devices, key=lambda mac: self.devices[mac].last_seen)
+        expired = sum(1 for mac in by_last_seen if now - self.devices[mac].last_seen > self.expiry)
+        over = len(self.devices) + 1 - self.max_devices
+        for mac in by_last_seen[: max(expired, over, 0)]:
+            print(f"[TELEMETRY] Forgetting {mac}, last seen {now - self.devices[mac].last_seen:.0f}s ago")
+            del self.devices[mac]
+
+    def query(self, mac=None, since=0.0):
+        """
+        @param mac: Device to get the full series for. If None, get the latest sample for every device.
+        @param since: Only return samples taken after this unix timestamp
+        """
+        with self.lock:
+            if mac is None:
+                return {
+                    mac: dict(
+                        series.get_latest() or {},
+                        BOOTS=series.boots,
+                        LAST_SEEN=series.last_seen,
+                    )
+                    for mac, series in self.devices.items()
+                }
+            series = self.devices.get(mac.upper())
+            if not series:
+                return None
+            return {
+                "FIELDS": ("TIME",) + FIELDS,
+                "BOOTS": series.boots,
+                "SAMPLES": series.get_samples(float(since)),
+            }
@@ -0,0 +1,69 @@
+"""
+Connection lanes and batching, over a socketpair.
+
+    python -m pytest server/tests
+"""
+import json
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connection import BULK_CHUNK_SIZE, Connection, PRIORITY_BULK, PRIORITY_TALLY  # noqa: E402
+
+
+def connect():
+    server_sock, tally_sock = socket.socketpair()
+    tally_sock.settimeout(5)
+    return Connection(server_sock, ("test", 0)), tally_sock.makefile("rb"), tally_sock
+
+
+def test_tally_frame_overtakes_bulk_parts():
+    connection, lines, sock = connect()
+    firmware = "x" * (BULK_CHUNK_SIZE * 10)
+    try:
+        with connection.batch():
+            connection.send({"BULK": firmware}, PRIORITY_BULK)
+            connection.send({"CAM_LIVE": 3}, PRIORITY_TALLY)
+        received = [json.loads(next(lines)) for _ in range(2)]
+        # The tally frame goes in the first write, with at most one bulk chunk ahead of it.
+        assert received[0] == {"CAM_LIVE": 3}
+        assert "PART" in received[1]
+        parts = [received[1]["PART"]]
+        while not parts[-1]["LAST"]:
+            parts.append(json.loads(next(lines))["PART"])
+        assert len(parts) > 2
+        assert [part["INDEX"] for part in parts] == list(range(len(parts)))
+        assert json.loads("".join(part["DATA"] for part in parts)) == {"BULK": firmware}
+    finally:
+        connection.close()
+        sock.close()
+
+
+def test_batch_sends_frames_in_one_write():
+    connection, lines, sock = connect()
+    try:
+        writes = connection.writes
+        with connection.batch():
+            for camera in range(1, 6):
+                connection.send({"CAM_LIVE": camera}, PRIORITY_TALLY)
+        assert [json.loads(next(lines))["CAM_LIVE"] for _ in range(5)] == [1, 2, 3, 4, 5]
+        deadline = time.monotonic() + 5
+        while connection.frames_sent < 5 and time.monotonic() < deadline:
+            time.sleep(0.001)  # The writer counts them after the send
+        assert connection.writes == writes + 1
+    finally:
+        connection.close()
+        sock.close()
+
+
+def test_small_bulk_frames_are_not_split():
+    connection, lines, sock = connect()
+    try:
+        connection.send({"BULK": "small"}, PRIORITY_BULK)
+        assert json.loads(next(lines)) == {"BULK": "small"}
+    finally:
+        connection.close()
+        sock.close()
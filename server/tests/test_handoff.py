@@ -0,0 +1,95 @@
+"""
+Handing tally connections over to a new server, and carrying on when it doesn't take them.
+"""
+import json
+import os
+import socket
+import sys
+from threading import Thread
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connection import Connection, ConnectionRegistry, encode, PRIORITY_TALLY  # noqa: E402
+import handoff  # noqa: E402
+from handoff import attach_connection, HandoffListener, Takeover  # noqa: E402
+from subscriptions import Subscriptions  # noqa: E402
+
+
+def subscribed_tally(connections, subscriptions, camera):
+    server_sock, tally_sock = socket.socketpair()
+    tally_sock.settimeout(5)
+    connection = Connection(server_sock, ("tally", camera))
+    connection.mac = f"02:00:00:00:00:{camera:02X}"
+    connections.add(connection)
+    subscriptions.subscribe(connection, [camera])
+    return connection, tally_sock
+
+
+def publish(connections, subscriptions, cameras, message):
+    targets = subscriptions.targets(cameras, connections.all())
+    for connection in targets:
+        connection.send_encoded(encode(message), PRIORITY_TALLY)
+    return targets
+
+
+def test_reattached_connections_still_get_changes():
+    connections = ConnectionRegistry()
+    subscriptions = Subscriptions()
+    old, tally_sock = subscribed_tally(connections, subscriptions, 3)
+    old.send({"QUEUED": True}, PRIORITY_TALLY)
+
+    # Like multithread.hand_off() when the new server doesn't take over.
+    old.detach()
+    dump = old.dump()
+    connections.remove(old)
+    subscriptions.remove(old)
+    new = attach_connection(old.conn, dump, subscriptions)
+    connections.add(new)
+
+    assert new.mac == old.mac and new.cameras == {3}
+    assert subscriptions.query()["CAMERAS"] == {3: 1}
+    assert publish(connections, subscriptions, {3}, {"CAM_LIVE": 3}) == {new}
+    assert publish(connections, subscriptions, {4}, {"CAM_LIVE": 4}) == set()
+    lines = tally_sock.makefile("rb")
+    received = [json.loads(next(lines)) for _ in range(2)]
+    assert {"CAM_LIVE": 3} in received
+    new.close()
+    tally_sock.close()
+
+
+def test_handoff_to_a_new_server(monkeypatch, tmp_path):
+    monkeypatch.setattr(handoff, "HANDOFF_PATH", str(tmp_path / "handoff-{port}.sock"))
+    connections = ConnectionRegistry()
+    subscriptions = Subscriptions()
+    old, tally_sock = subscribed_tally(connections, subscriptions, 2)
+    listener = HandoffListener(8000)
+    listener.start()
+
+    taken = {}
+
+    def take_over():
+        takeover = Takeover(8000)
+        new_subscriptions = Subscriptions()
+        taken["connections"] = [
+            attach_connection(sock, dump, new_subscriptions)
+            for sock, dump in zip(takeover.socks, takeover.state["CONNECTIONS"])
+        ]
+        taken["subscriptions"] = new_subscriptions
+        taken["state"] = takeover.state["STATE"]
+        takeover.done()
+
+    new_server = Thread(target=take_over)
+    new_server.start()
+    assert listener.requested.wait(5)
+    old.detach()
+    assert listener.send({"STATE": {"CAM_LIVE": 1}, "CONNECTIONS": [old.dump()]}, [old.conn])
+    new_server.join(5)
+
+    [new] = taken["connections"]
+    assert taken["state"] == {"CAM_LIVE": 1}
+    assert new.mac == old.mac
+    assert taken["subscriptions"].targets({2}, [new]) == {new}
+    new.send({"CAM_LIVE": 2}, PRIORITY_TALLY)
+    assert json.loads(tally_sock.makefile("rb").readline()) == {"CAM_LIVE": 2}
+    new.close()
+    tally_sock.close()
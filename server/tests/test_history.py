@@ -0,0 +1,81 @@
+"""
+Tally history: the ring wrapping round, reopening it from disk, and querying it.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history import TallyHistory  # noqa: E402
+
+# A cut a second round three cameras, each one changing 3 cameras' states after the first.
+CUTS = [
+    (1.0, {"CAM_LIVE": 1, "CAM_PREV": 2}),  # Records 0, 1
+    (2.0, {"CAM_LIVE": 2, "CAM_PREV": 3}),  # Records 2, 3, 4
+    (3.0, {"CAM_LIVE": 3, "CAM_PREV": 1}),  # Records 5, 6, 7
+    (4.0, {"CAM_LIVE": 1, "CAM_PREV": 2}),  # Records 8, 9, 10
+]
+
+
+def recorded(path, capacity=8):
+    history = TallyHistory(str(path), capacity)
+    for seq, (timestamp, state) in enumerate(CUTS, 1):
+        history.record(timestamp, seq, state)
+    history.flush()
+    return history
+
+
+def test_ring_keeps_the_newest_records(tmp_path):
+    history = recorded(tmp_path / "history.bin")
+
+    assert history.count == 11
+    assert history.first == 3
+    records = history.range()
+    assert len(records) == 8
+    # The first cut and the start of the second have been overwritten.
+    assert [(record["TIME"], record["CAMERA"], record["STATE"]) for record in records[:2]] == [
+        (2.0, 2, "LIVE"),
+        (2.0, 3, "PREVIEW"),
+    ]
+    assert [(record["TIME"], record["CAMERA"], record["STATE"]) for record in records[-3:]] == [
+        (4.0, 1, "LIVE"),
+        (4.0, 2, "PREVIEW"),
+        (4.0, 3, "STANDBY"),
+    ]
+    assert [record["CAMERA"] for record in history.range(camera=1)] == [1, 1]
+
+
+def test_reopened_history_carries_on(tmp_path):
+    path = tmp_path / "history.bin"
+    recorded(path).stop()
+
+    history = TallyHistory(str(path), 8)
+    assert history.count == 11
+    assert [record["SEQ"] for record in history.range(camera=3)] == [2, 3, 4]
+
+    # The last state came back from disk too, so an unchanged camera isn't recorded again.
+    history.record(5.0, 5, {"CAM_LIVE": 1, "CAM_PREV": 3})
+    history.flush()
+    assert [(record["CAMERA"], record["STATE"]) for record in history.range(5.0)] == [(2, "STANDBY"), (3, "PREVIEW")]
+
+
+def test_reopening_with_another_capacity_starts_again(tmp_path):
+    path = tmp_path / "history.bin"
+    recorded(path).stop()
+
+    history = TallyHistory(str(path), 16)
+    assert history.count == 0
+    assert history.range() == []
+
+
+def test_range_and_at(tmp_path):
+    history = recorded(tmp_path / "history.bin")
+
+    assert [record["TIME"] for record in history.range(3.0, 4.0)] == [3.0, 3.0, 3.0]
+    assert [record["CAMERA"] for record in history.range(3.0, camera=2)] == [2, 2]
+    assert len(history.range(limit=2)) == 2
+
+    assert history.at(3.5) == {"TIME": 3.0, "SEQ": 3, "CAM_LIVE": 3, "CAM_PREV": 1}
+    assert history.at(4.0)["SEQ"] == 4
+    # Before the oldest record left in the ring.
+    assert history.at(1.5) is None
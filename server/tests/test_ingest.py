@@ -0,0 +1,100 @@
+"""
+The ingest shared memory ring, and a TSL adapter process end to end.
+"""
+import os
+import queue
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ingest  # noqa: E402
+from ingest import EventRing, Ingest  # noqa: E402
+import tsl  # noqa: E402
+
+
+def test_ring_keeps_order_across_the_wrap():
+    ring = EventRing.create(capacity=8)
+    try:
+        events = []
+        for batch in range(5):  # 30 events through 8 slots
+            for camera in range(6):
+                ring.put(batch, camera)
+            assert ring.take(events) == 6
+        assert [(live, preview) for _, live, preview in events] == [(b, c) for b in range(5) for c in range(6)]
+        assert ring.take(events) == 0
+        assert ring.query() == {"WRITTEN": 30, "QUEUED": 0, "FULL": 0}
+    finally:
+        ring.close()
+
+
+def test_ring_only_wakes_a_waiting_reader():
+    wakeup_read, wakeup_write = os.pipe()
+    os.set_blocking(wakeup_read, False)
+    ring = EventRing.create(capacity=8)
+    writer = EventRing(ring.shm, wakeup_fd=wakeup_write)  # The adapter's end, sharing the memory
+    try:
+        writer.put(1, 2)
+        try:
+            os.read(wakeup_read, 16)
+            raise AssertionError("Woken while not waiting")
+        except BlockingIOError:
+            pass
+        ring.set_waiting(True)
+        writer.put(3, 4)
+        writer.put(5, 6)
+        assert os.read(wakeup_read, 16) == b"\0\0"
+        events = []
+        assert ring.take(events) == 3
+        assert [event[1:] for event in events] == [(1, 2), (3, 4), (5, 6)]
+    finally:
+        ring.close()
+        os.close(wakeup_read)
+        os.close(wakeup_write)
+
+
+def free_udp_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_change(changes, sock, port, camera, timeout=10):
+    """
+    Cut to a camera until the ingest thread publishes it, e.g. while the adapter is starting.
+    """
+    packet = tsl.encode_v5([(index, index == camera - 1, False, "") for index in range(4)])
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        sock.sendto(packet, ("127.0.0.1", port))
+        try:
+            message = changes.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if message["CAM_LIVE"] == camera:
+            return message
+    raise AssertionError(f"Camera {camera} never published")
+
+
+def test_tsl_adapter_publishes_and_restarts(monkeypatch):
+    monkeypatch.setattr(ingest, "RESTART_DELAY", 0.2)
+    changes = queue.Queue()
+    port = free_udp_port()
+    service = Ingest(changes.put)
+    service.add("tsl", [f"udp:5:{port}"])
+    service.start()
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        assert wait_for_change(changes, sender, port, 2) == {"MAC": None, "CAM_LIVE": 2, "CAM_PREV": 0}
+
+        adapter = service.adapters[0]
+        pid = adapter.process.pid
+        adapter.process.kill()
+        wait_for_change(changes, sender, port, 3)
+        assert adapter.process.pid != pid
+        assert adapter.restarts == 1
+        assert service.query()["EVENTS"] >= 2
+    finally:
+        sender.close()
+        service.stop()
@@ -0,0 +1,54 @@
+"""
+The OBS client against the mock OBS.
+"""
+import os
+import queue
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import obs  # noqa: E402
+from obs import CameraMap, EVENTS_SCENES, ObsClient  # noqa: E402
+from obsmock import MockObs  # noqa: E402
+
+
+def connect(monkeypatch, scenes):
+    monkeypatch.setattr(obs, "RECONNECT_DELAY", 0.05)
+    mock = MockObs(scenes)
+    mock.start(port=0)
+    changes = queue.Queue()
+    client = ObsClient("127.0.0.1", mock.port, None, CameraMap(sources={"Camera 1": 1, "Camera 2": 2}), changes.put)
+    client.start()
+    deadline = time.monotonic() + 5
+    while len(client.cameras.table) < len(scenes) and time.monotonic() < deadline:
+        time.sleep(0.01)  # Still fetching the scenes
+    return mock, client, changes
+
+
+def live(changes):
+    """
+    @returns int: The camera live once the changes settle
+    """
+    camera = changes.get(timeout=5)["CAM_LIVE"]
+    try:
+        while True:
+            camera = changes.get(timeout=0.2)["CAM_LIVE"]
+    except queue.Empty:
+        return camera
+
+
+def test_reordering_a_scene_changes_its_camera(monkeypatch):
+    mock, client, changes = connect(monkeypatch, {"Two shot": ["Camera 1", "Camera 2"]})
+    assert live(changes) == 2  # Camera 2 is on top
+    assert mock.reorder("Two shot", [2, 1])
+    assert live(changes) == 1
+
+
+def test_unexpected_event_reconnects_rather_than_stopping(monkeypatch):
+    mock, client, changes = connect(monkeypatch, {"Camera 1": ["Camera 1"], "Camera 2": ["Camera 2"]})
+    assert live(changes) == 1
+    # No sceneName, a KeyError in the client
+    mock._call(mock._event(EVENTS_SCENES, "CurrentProgramSceneChanged", {}))
+    assert mock.set_program("Camera 2")
+    assert live(changes) == 2
@@ -0,0 +1,74 @@
+"""
+Server clock sync: scheduling frames, answering SYNC requests and the skew tallies report.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.modules.pop("clocksync", None)  # The client and server both have one
+
+import clocksync  # noqa: E402
+from clocksync import ClockSync, now_ms  # noqa: E402
+
+
+class Tally:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message, priority):
+        self.sent.append(message)
+
+
+def applied(sync, seq, late):
+    for i, ms in enumerate(late):
+        sync.on_applied(None, {"MAC": f"02:00:00:00:00:{i:02X}", "APPLIED": {"SEQ": seq, "LATE": ms}})
+
+
+def test_sync_reply():
+    sync = ClockSync()
+    tally = Tally()
+    request = {"MAC": "02:00:00:00:00:01", "SYNC": {"T0": 1234, "OFFSET": 50, "JITTER": 2, "RTT": 6}}
+    received = now_ms()
+    sync.on_sync(tally, request, received)
+
+    reply = tally.sent[0]["SYNC_REPLY"]
+    assert reply["T0"] == 1234
+    assert reply["T1"] == received
+    assert reply["T2"] >= received
+    assert sync.devices["02:00:00:00:00:01"] == {"OFFSET": 50, "JITTER": 2, "RTT": 6}
+
+
+def test_schedule_and_skew():
+    sync = ClockSync(apply_delay_ms=40)
+    before = now_ms()
+    message = sync.schedule({"CAM_LIVE": 1})
+    assert message["SEQ"] == 1
+    assert before + 40 <= message["APPLY_AT"] <= now_ms() + 40
+
+    applied(sync, 1, [3, -2, 7])
+    assert sync.skew(1) == 9
+    applied(sync, 99, [0, 50])  # Not a frame we scheduled
+    assert sync.skew(99) == 0
+    assert sync.query()["SKEW_MS"] == {"FRAMES": 1, "MAX": 9, "AVG": 9.0}
+
+
+def test_skew_history_is_capped():
+    sync = ClockSync()
+    for _ in range(clocksync.SKEW_HISTORY + 5):
+        seq = sync.schedule({})["SEQ"]
+        applied(sync, seq, [0, 1])
+    assert len(sync.applied) == clocksync.SKEW_HISTORY
+    assert min(sync.applied) == 6
+    assert sync.query()["SKEW_MS"]["FRAMES"] == clocksync.SKEW_HISTORY
+
+
+def test_new_server_carries_on_the_clock():
+    old = ClockSync()
+    old.schedule({})
+    old.devices["02:00:00:00:00:01"] = {"OFFSET": 5, "JITTER": 1, "RTT": 4}
+    state = old.dump()
+
+    new = ClockSync()
+    new.load(state)
+    assert new.schedule({})["SEQ"] == 2
+    assert new.devices == old.devices
@@ -0,0 +1,76 @@
+"""
+Server-Sent Events feed: viewers following some cameras only get changes to them.
+"""
+import json
+import os
+import socket
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connection import encode  # noqa: E402
+from sse import SseFeed  # noqa: E402
+
+
+class Viewer:
+    def __init__(self, port, query=""):
+        self.sock = socket.create_connection(("127.0.0.1", port), timeout=5)
+        self.sock.sendall(f"GET /events{query} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        self.buffer = b""
+        self.headers = self._until(b"\r\n\r\n")
+
+    def _until(self, separator):
+        while separator not in self.buffer:
+            data = self.sock.recv(4096)
+            assert data, "Feed closed the connection"
+            self.buffer += data
+        item, self.buffer = self.buffer.split(separator, 1)
+        return item
+
+    def event(self):
+        """
+        @returns (str, dict): The next event's name and data, skipping retry and keepalives
+        """
+        while True:
+            lines = self._until(b"\n\n").decode().split("\n")
+            fields = dict(line.split(": ", 1) for line in lines if ": " in line)
+            if "data" in fields:
+                return fields.get("event", "message"), json.loads(fields["data"])
+
+    def nothing_sent(self, wait=0.3):
+        if self.buffer:
+            return False
+        self.sock.settimeout(wait)
+        try:
+            return not self.sock.recv(4096)
+        except socket.timeout:
+            return True
+        finally:
+            self.sock.settimeout(5)
+
+
+def test_viewers_only_get_their_cameras():
+    state = {"CAM_LIVE": 1, "CAM_PREV": 2}
+    feed = SseFeed(lambda: state, lambda: [{"MAC": "02:00:00:00:00:01"}])
+    listener = socket.create_server(("127.0.0.1", 0))
+    feed.start(listener)
+    port = listener.getsockname()[1]
+
+    viewers = {query: Viewer(port, query) for query in ("", "?camera=1", "?camera=2,3", "?camera=4")}
+    for viewer in viewers.values():
+        assert viewer.headers.startswith(b"HTTP/1.1 200 OK")
+        # Everyone starts with the current state, whatever they follow.
+        assert viewer.event() == ("message", state)
+        assert viewer.event() == ("devices", [{"MAC": "02:00:00:00:00:01"}])
+
+    state = {"CAM_LIVE": 1, "CAM_PREV": 3}
+    feed.broadcast(encode(state), {2, 3})
+    assert viewers[""].event() == ("message", state)
+    assert viewers["?camera=2,3"].event() == ("message", state)
+    assert viewers["?camera=1"].nothing_sent()
+    assert viewers["?camera=4"].nothing_sent()
+
+    # Frames that don't say which cameras they change go to everyone.
+    feed.broadcast(encode(state))
+    for viewer in viewers.values():
+        assert viewer.event() == ("message", state)
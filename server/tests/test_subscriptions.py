@@ -0,0 +1,57 @@
+"""
+Camera subscriptions: which tallies are sent a tally state change.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from subscriptions import changed_cameras, Subscriptions  # noqa: E402
+
+
+class Tally:
+    cameras = None  # Set by Subscriptions.subscribe()
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+def test_changed_cameras():
+    old = {"CAM_LIVE": 1, "CAM_PREV": 2}
+    assert changed_cameras(old, {"CAM_LIVE": 2, "CAM_PREV": 3}) == {1, 2, 3}
+    assert changed_cameras(old, {"CAM_LIVE": 1, "CAM_PREV": 3}) == {2, 3}
+    assert changed_cameras(old, dict(old)) == set()
+    assert changed_cameras({}, {"CAM_LIVE": 1}) == {1}
+
+
+def test_targets():
+    subscriptions = Subscriptions()
+    one, two, multi, everything = Tally("one"), Tally("two"), Tally("multi"), Tally("everything")
+    connections = [one, two, multi, everything]
+    subscriptions.subscribe(one, [1])
+    subscriptions.subscribe(two, [2])
+    subscriptions.subscribe(multi, [1, 3])
+
+    assert subscriptions.targets({1}, connections) == {one, multi, everything}
+    assert subscriptions.targets({2, 3}, connections) == {two, multi, everything}
+    # Nobody shows camera 4 but the tally that hasn't subscribed.
+    assert subscriptions.targets({4}, connections) == {everything}
+    assert subscriptions.query() == {"CAMERAS": {1: 2, 2: 1, 3: 1}, "CHANGES": 3, "FRAMES": 7}
+
+
+def test_resubscribe_and_remove():
+    subscriptions = Subscriptions()
+    tally, other = Tally("tally"), Tally("other")
+    subscriptions.subscribe(tally, [1, 2])
+    subscriptions.subscribe(other, [2])
+
+    subscriptions.subscribe(tally, [3])
+    assert subscriptions.targets({1, 2}, [tally, other]) == {other}
+    assert subscriptions.targets({3}, [tally, other]) == {tally}
+
+    subscriptions.remove(tally)
+    assert subscriptions.targets({3}, [other]) == set()
+    assert subscriptions.query()["CAMERAS"] == {2: 1}
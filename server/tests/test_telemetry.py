@@ -0,0 +1,59 @@
+"""
+Telemetry store: samples in server time, and memory staying flat as tallies come and go.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.modules.pop("telemetry", None)  # The client and server both have one
+
+from telemetry import FIELDS, TelemetryStore  # noqa: E402
+
+
+def frame(mac, ticks=10000, samples=1):
+    """
+    @returns dict: A TELEMETRY frame with samples taken a second apart, the last at ticks
+    """
+    return {
+        "MAC": mac,
+        "TICKS": ticks,
+        "BOOTS": 1,
+        "TELEMETRY": [[ticks - 1000 * i, 100000, -60, 0, 5, 20, 0] for i in reversed(range(samples))],
+    }
+
+
+def test_samples_in_server_time():
+    store = TelemetryStore(size=4)
+    assert store.add_frame(frame("A", samples=3), received=1000.0) == 3
+    assert store.add_frame(frame("A", samples=3), received=1003.0) == 3
+
+    series = store.query("a")
+    assert series["FIELDS"] == ("TIME",) + FIELDS
+    # Only the newest 4 fit.
+    assert [sample[0] for sample in series["SAMPLES"]] == [1000.0, 1001.0, 1002.0, 1003.0]
+    assert [sample[0] for sample in store.query("A", since=1001.0)["SAMPLES"]] == [1002.0, 1003.0]
+    assert store.query()["A"]["LAST_SEEN"] == 1003.0
+    assert store.query("B") is None
+
+
+def test_devices_not_seen_for_a_while_are_forgotten():
+    store = TelemetryStore(expiry=600)
+    store.add_frame(frame("A"), received=1000.0)
+    store.add_frame(frame("B"), received=1500.0)
+    store.add_frame(frame("A"), received=1700.0)  # Reconnected, still the same series
+
+    store.add_frame(frame("C"), received=2200.0)
+    assert sorted(store.devices) == ["A", "C"]
+    assert len(store.query("A")["SAMPLES"]) == 2
+
+
+def test_device_count_is_capped():
+    store = TelemetryStore(max_devices=3)
+    for i, mac in enumerate(["A", "B", "C"]):
+        store.add_frame(frame(mac), received=1000.0 + i)
+    store.add_frame(frame("A"), received=1010.0)
+
+    store.add_frame(frame("D"), received=1020.0)
+    assert sorted(store.devices) == ["A", "C", "D"]
+    store.add_frame(frame("E"), received=1030.0)
+    assert sorted(store.devices) == ["A", "D", "E"]
@@ -0,0 +1,134 @@
+"""
+TSL UMD decoding, TCP framing and merging sources.
+"""
+import os
+import socket
+import sys
+from threading import Thread
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tsl  # noqa: E402
+from tsl import TslListener, TslState, V31, V5  # noqa: E402
+
+
+def decoded(messages):
+    return [(index, program, preview, bytes(text), unicode) for index, program, preview, text, unicode in messages]
+
+
+def test_decode_v31():
+    data = tsl.encode_v31(0, program=True, label="CAM 1") + tsl.encode_v31(5, preview=True, label="CAM 6")
+    # A stray byte that isn't the start of a message, then a whole one
+    data += b"\x00" * tsl.V31_SIZE + tsl.encode_v31(127, program=True, preview=True)
+    assert decoded(tsl.decode_v31(memoryview(data))) == [
+        (0, True, False, b"CAM 1".ljust(16), False),
+        (5, False, True, b"CAM 6".ljust(16), False),
+        (127, True, True, b" " * 16, False),
+    ]
+
+
+def test_decode_v5_lamps():
+    packet = tsl.encode_v5([(0, True, False, "A"), (1, False, True, "B"), (2, True, True, "C"), (3, False, False, "D")])
+    assert decoded(tsl.decode_v5(memoryview(packet))) == [
+        (0, True, False, b"A", False),
+        (1, False, True, b"B", False),
+        (2, True, True, b"C", False),  # Amber is both
+        (3, False, False, b"D", False),
+    ]
+    # Red on one lamp and green on another is both too.
+    control = tsl._RED | tsl._GREEN << 2
+    packet = tsl._V5_HEADER.pack(tsl._V5_HEADER.size - 2 + tsl._V5_MESSAGE.size, 0, 0, 0)
+    packet += tsl._V5_MESSAGE.pack(7, control, 0)
+    assert decoded(tsl.decode_v5(memoryview(packet))) == [(7, True, True, b"", False)]
+
+
+def test_decode_v5_ignores_screen_control_and_short_packets():
+    packet = bytearray(tsl.encode_v5([(0, True, False, "A")]))
+    packet[3] |= tsl._V5_FLAG_SCREEN_CONTROL
+    assert list(tsl.decode_v5(memoryview(bytes(packet)))) == []
+    assert list(tsl.decode_v5(memoryview(b"\x01"))) == []
+
+
+def test_v5_tcp_framing_with_escapes_and_split_reads():
+    # Index 0xFE and 0x1FE put DLE bytes in the packet, which have to be doubled.
+    packets = [tsl.encode_v5([(0xFE, True, False, "X")]), tsl.encode_v5([(0x1FE, False, True, "Y")])]
+    stream = b"noise" + b"".join(tsl.wrap_v5_tcp(packet) for packet in packets)
+    assert stream.count(bytes([tsl.DLE, tsl.DLE])) == 2
+
+    received = []
+    buffer = b""
+    for byte in range(len(stream)):
+        found, buffer = tsl.unwrap_v5_tcp(buffer + stream[byte : byte + 1])
+        received += found
+    assert received == packets
+    assert buffer == b""
+
+
+def test_merge_prefers_priority_and_drops_quiet_sources():
+    changes = []
+    state = TslState(changes.append, source_timeout=5)
+    main = state.add_source("main", priority=0)
+    backup = state.add_source("backup", priority=1)
+
+    backup.update(tsl.decode_v5(memoryview(tsl.encode_v5([(1, True, False, ""), (2, False, True, "")]))))
+    state.merge()
+    assert changes[-1] == {"MAC": None, "CAM_LIVE": 2, "CAM_PREV": 3}
+
+    main.update(tsl.decode_v31(memoryview(tsl.encode_v31(1, program=False) + tsl.encode_v31(4, program=True))))
+    state.merge()
+    # main wins index 1, backup still has index 2 on preview
+    assert changes[-1] == {"MAC": None, "CAM_LIVE": 5, "CAM_PREV": 3}
+
+    state.merge()
+    assert len(changes) == 2  # Nothing changed, nothing sent
+
+    main.last_seen = time.monotonic() - 10
+    state.merge()
+    assert changes[-1] == {"MAC": None, "CAM_LIVE": 2, "CAM_PREV": 3}
+    assert [source["ACTIVE"] for source in state.query()["SOURCES"]] == [False, True]
+
+
+def test_tcp_listener_reads_v5_and_v31():
+    for version, packet in (
+        (V5, tsl.wrap_v5_tcp(tsl.encode_v5([(2, True, False, "CAM 3"), (0, False, True, "CAM 1")]))),
+        (V31, b"\x00" + tsl.encode_v31(2, program=True) + tsl.encode_v31(0, preview=True)),
+    ):
+        changes = []
+        listener = TslListener(TslState(changes.append), "tcp", version, 0)
+        server, client = socket.socketpair()
+        reader = Thread(target=listener._read_tcp, args=[server], daemon=True)
+        reader.start()
+        for offset in range(0, len(packet), 5):
+            client.sendall(packet[offset : offset + 5])
+            time.sleep(0.001)
+        client.close()
+        reader.join(5)
+        # v3.1 messages are taken as they arrive, so there may be a change in between
+        assert changes[-1] == {"MAC": None, "CAM_LIVE": 3, "CAM_PREV": 1}, version
+
+
+def test_changes_are_published_in_the_order_they_were_merged():
+    published = []
+    calls = []
+
+    def on_change(message):
+        calls.append(message)
+        if len(calls) == 1:
+            time.sleep(0.05)  # Slow publishing the first change, while the second is merged
+        published.append(message["CAM_LIVE"])
+
+    state = TslState(on_change)
+    first = state.add_source("first", priority=0)
+    second = state.add_source("second", priority=1)
+
+    first.update(tsl.decode_v31(memoryview(tsl.encode_v31(0, program=True))))
+    merging = Thread(target=state.merge)
+    merging.start()
+    time.sleep(0.01)
+    first.update(tsl.decode_v31(memoryview(tsl.encode_v31(0, program=False))))
+    second.update(tsl.decode_v31(memoryview(tsl.encode_v31(1, program=True))))
+    state.merge()
+    merging.join()
+    assert published == [1, 2]
+    assert state.current == (2, 0)
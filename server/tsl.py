@@ -0,0 +1,410 @@
+#!/usr/bin/env python
+"""
+TallyHo Server TSL UMD ingest
+
+Listens for TSL UMD v3.1 and v5.0 (over UDP or TCP) from switchers and router controllers, and
+turns their tally bits into the live/preview state sent to the tallies.
+
+v3.1: 18 byte messages. Address + 0x80, control (bit 0 tally 1, bit 1 tally 2...), 16 chars of text.
+      Tally 1 is program, tally 2 is preview.
+v5.0: Little endian. PBC, VER, FLAGS, SCREEN, then display messages of INDEX, CONTROL, LENGTH, TEXT.
+      Each of the three lamps in CONTROL is off, red, green or amber. Red (or amber) on any of
+      them is program, green (or amber) is preview. Over TCP, packets start with DLE/STX and any
+      DLE in the packet is doubled.
+
+Each listener is a source with a priority (lowest first). Where several sources report the same
+index, the highest priority source heard from recently wins. Index 0 is camera 1.
+
+Packets are decoded in place with memoryview/struct, and labels are only decoded when asked for,
+so a busy source sending the same state over and over costs very little.
+
+Run this file to send test packets to a server:
+
+    python tsl.py 127.0.0.1:8900 --version 5 --cameras 8
+"""
+import argparse
+import socket
+import struct
+from threading import Lock, Thread
+import time
+
+V31 = "3.1"
+V5 = "5"
+VERSIONS = (V31, V5)
+
+V31_SIZE = 18
+MAX_PACKET = 2048
+SOURCE_TIMEOUT = 5  # Seconds without a packet before a source is ignored
+CAMERA_OFFSET = 1  # Camera number of index 0
+BIND_RETRIES = 50  # 100ms apart, e.g. while the previous server is handing over
+
+_V5_HEADER = struct.Struct("<HBBH")  # PBC, VER, FLAGS, SCREEN
+_V5_MESSAGE = struct.Struct("<HHH")  # INDEX, CONTROL, LENGTH
+_V5_FLAG_UNICODE = 0x01
+_V5_FLAG_SCREEN_CONTROL = 0x02
+_V5_CONTROL_DATA = 0x8000
+_RED = 1
+_GREEN = 2
+_AMBER = 3
+DLE = 0xFE
+STX = 0x02
+
+
+def decode_v31(data):
+    """
+    @param data: memoryview of one or more v3.1 messages
+    @returns generator: (index, program, preview, text memoryview, unicode) per message
+    """
+    for offset in range(0, len(data) - V31_SIZE + 1, V31_SIZE):
+        address = data[offset]
+        if not address & 0x80:
+            continue  # Not the start of a message
+        control = data[offset + 1]
+        yield address & 0x7F, bool(control & 0x01), bool(control & 0x02), data[
+            offset + 2 : offset + V31_SIZE
+        ], False
+
+
+def decode_v5(data):
+    """
+    @param data: memoryview of a v5.0 packet (without any TCP DLE/STX wrapping)
+    @returns generator: (index, program, preview, text memoryview, unicode) per display message
+    """
+    if len(data) < _V5_HEADER.size:
+        return
+    pbc, version, flags, screen = _V5_HEADER.unpack_from(data, 0)
+    if flags & _V5_FLAG_SCREEN_CONTROL:
+        return  # Nothing we show
+    end = min(len(data), pbc + 2)
+    offset = _V5_HEADER.size
+    while offset + _V5_MESSAGE.size <= end:
+        index, control, length = _V5_MESSAGE.unpack_from(data, offset)
+        offset += _V5_MESSAGE.size
+        text = data[offset : offset + length]
+        offset += length
+        if control & _V5_CONTROL_DATA:
+            continue
+        lamps = (control & 0x03, (control >> 2) & 0x03, (control >> 4) & 0x03)
+        program = _RED in lamps or _AMBER in lamps
+        preview = _GREEN in lamps or _AMBER in lamps
+        yield index, program, preview, text, bool(flags & _V5_FLAG_UNICODE)
+
+
+def encode_v31(index, program=False, preview=False, label=""):
+    """
+    @returns bytes: A v3.1 message, e.g. for testing
+    """
+    control = (0x01 if program else 0) | (0x02 if preview else 0) | 0x30  # Full brightness
+    return bytes([0x80 | index, control]) + label.encode("ascii")[:16].ljust(16)
+
+
+def encode_v5(tallies, screen=0):
+    """
+    @param tallies: [(index, program, preview, label)]
+    @returns bytes: A v5.0 packet, e.g. for testing
+    """
+    body = b""
+    for index, program, preview, label in tallies:
+        lamp = _AMBER if program and preview else _RED if program else _GREEN if preview else 0
+        text = label.encode("ascii")
+        # Text tally and both lamps the same, full brightness
+        control = lamp | lamp << 2 | lamp << 4 | 0x3 << 6
+        body += _V5_MESSAGE.pack(index, control, len(text)) + text
+    return _V5_HEADER.pack(_V5_HEADER.size - 2 + len(body), 0, 0, screen) + body
+
+
+def wrap_v5_tcp(packet):
+    """
+    @returns bytes: A v5.0 packet framed for TCP
+    """
+    return bytes([DLE, STX]) + packet.replace(bytes([DLE]), bytes([DLE, DLE]))
+
+
+def unwrap_v5_tcp(buffer):
+    """
+    Find the v5.0 packets in data received over TCP.
+    @returns (list, bytes): Complete packets, and the rest of the buffer to keep for next time
+    """
+    packets = []
+    while True:
+        start = buffer.find(bytes([DLE, STX]))
+        if start < 0:
+            # Keep a trailing DLE, it might be the start of the next packet.
+            return packets, buffer[-1:] if buffer.endswith(bytes([DLE])) else b""
+        packet = bytearray()
+        size = None
+        i = start + 2
+        while i < len(buffer) and (size is None or len(packet) < size):
+            if buffer[i] == DLE:
+                if i + 1 >= len(buffer):
+                    break  # Need more data
+                if buffer[i + 1] != DLE:
+                    break  # DLE/STX of the next packet, this one was cut short
+                i += 1
+            packet.append(buffer[i])
+            i += 1
+            if size is None and len(packet) == 2:
+                size = 2 + (packet[0] | packet[1] << 8)
+        if size is not None and len(packet) >= size:
+            packets.append(bytes(packet))
+        elif i + 1 >= len(buffer):
+            return packets, buffer[start:]  # Wait for the rest
+        buffer = buffer[i:]
+
+
+class TslSource:
+    def __init__(self, name, priority):
+        self.name = name
+        self.priority = priority
+        self.tallies = {}  # Index: [program, preview, label bytes, unicode]
+        self.last_seen = 0
+        self.packets = 0
+        self.messages = 0
+
+    def update(self, messages):
+        """
+        @param messages: Decoded messages, from decode_v31() or decode_v5()
+        @returns bool: Whether any tally changed
+        """
+        self.last_seen = time.monotonic()
+        self.packets += 1
+        changed = False
+        for index, program, preview, text, unicode in messages:
+            self.messages += 1
+            tally = self.tallies.get(index)
+            if tally is None:
+                self.tallies[index] = [program, preview, bytes(text), unicode]
+                changed = True
+                continue
+            if tally[0] != program or tally[1] != preview:
+                tally[0] = program
+                tally[1] = preview
+                changed = True
+            if tally[2] != text:
+                tally[2] = bytes(text)
+                tally[3] = unicode
+        return changed
+
+
+def decode_label(tally):
+    text = tally[2]
+    if tally[3]:
+        return text.decode("utf-16-le", "replace")
+    return text.decode("ascii", "replace").strip()
+
+
+class TslState:
+    """
+    Merges the sources into the live/preview state.
+    """
+
+    def __init__(self, on_change, camera_offset=CAMERA_OFFSET, source_timeout=SOURCE_TIMEOUT):
+        """
+        @param on_change: Called with a {"MAC": None, "CAM_LIVE": ..., "CAM_PREV": ...} message
+            when the merged state changes, 0 for no camera. With the state locked, so it mustn't
+            call back into it.
+        """
+        self.on_change = on_change
+        self.camera_offset = camera_offset
+        self.source_timeout = source_timeout
+        self.sources = []
+        self.merged = {}  # Index: tally, from the winning source
+        self.current = (0, 0)  # (live, preview) last sent
+        self._lock = Lock()
+
+    def add_source(self, name, priority=0):
+        source = TslSource(name, priority)
+        with self._lock:
+            self.sources.append(source)
+            self.sources.sort(key=lambda source: source.priority)
+        return source
+
+    def merge(self):
+        """
+        Work out the state from the sources. Call when one of them changes, or goes quiet.
+        """
+        with self._lock:
+            now = time.monotonic()
+            merged = {}
+            # Lowest priority first, so higher priority sources overwrite them.
+            for source in reversed(self.sources):
+                if now - source.last_seen < self.source_timeout:
+                    merged.update(source.tallies)
+            self.merged = merged
+            live = [index for index, tally in merged.items() if tally[0]]
+            preview = [index for index, tally in merged.items() if tally[1] and not tally[0]]
+            # Tallies only know about one of each.
+            current = (
+                min(live) + self.camera_offset if live else 0,
+                min(preview) + self.camera_offset if preview else 0,
+            )
+            if current == self.current:
+                return
+            self.current = current
+            # Still holding the lock, so two listeners' changes can't be published in the opposite
+            # order to the one they were worked out in, leaving the tallies on the older one.
+            self.on_change({"MAC": None, "CAM_LIVE": current[0], "CAM_PREV": current[1]})
+
+    def query(self):
+        """
+        Admin summary.
+        """
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "SOURCES": [
+                    {
+                        "NAME": source.name,
+                        "PRIORITY": source.priority,
+                        "ACTIVE": now - source.last_seen < self.source_timeout,
+                        "PACKETS": source.packets,
+                        "MESSAGES": source.messages,
+                    }
+                    for source in self.sources
+                ],
+                "TALLIES": {
+                    index + self.camera_offset: {
+                        "PROGRAM": tally[0],
+                        "PREVIEW": tally[1],
+                        "LABEL": decode_label(tally),
+                    }
+                    for index, tally in sorted(self.merged.items())
+                },
+            }
+
+
+def _bind(sock, port, host=""):
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    for retry in range(BIND_RETRIES):
+        try:
+            sock.bind((host, port))
+            return
+        except OSError:
+            if retry == BIND_RETRIES - 1:
+                raise
+            time.sleep(0.1)
+
+
+class TslListener:
+    def __init__(self, state, protocol, version, port, priority=0):
+        if protocol not in ("udp", "tcp") or version not in VERSIONS:
+            raise ValueError(f"Unsupported TSL listener: {protocol} v{version}")
+        self.state = state
+        self.protocol = protocol
+        self.version = version
+        self.port = port
+        self.decode = decode_v31 if version == V31 else decode_v5
+        self.source = state.add_source(f"{protocol}:{version}:{port}", priority)
+
+    @classmethod
+    def from_spec(cls, state, spec):
+        """
+        @param spec: "protocol:version:port[:priority]", e.g. "udp:5:8900" or "tcp:3.1:8901:1"
+        """
+        parts = spec.split(":")
+        if len(parts) not in (3, 4):
+            raise ValueError(f"Invalid TSL listener: {spec}")
+        priority = int(parts[3]) if len(parts) == 4 else 0
+        return cls(state, parts[0].lower(), parts[1], int(parts[2]), priority)
+
+    def start(self):
+        print(f"TSL UMD v{self.version} listener on {self.protocol} port {self.port}")
+        target = self._serve_udp if self.protocol == "udp" else self._serve_tcp
+        Thread(target=target, daemon=True).start()
+
+    def handle(self, packet):
+        """
+        @param packet: memoryview of a v5.0 packet, or v3.1 messages
+        """
+        if self.source.update(self.decode(packet)):
+            self.state.merge()
+
+    def _serve_udp(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        _bind(sock, self.port)
+        sock.settimeout(1)
+        buffer = bytearray(MAX_PACKET)
+        view = memoryview(buffer)
+        while True:
+            try:
+                size, _ = sock.recvfrom_into(buffer)
+            except socket.timeout:
+                # Notice when sources go quiet
+                self.state.merge()
+                continue
+            self.handle(view[:size])
+
+    def _serve_tcp(self):
+        sock = socket.socket()
+        _bind(sock, self.port)
+        sock.listen(5)
+        while True:
+            conn, addr = sock.accept()
+            print(f"TSL UMD connection from {addr}")
+            Thread(target=self._read_tcp, args=[conn], daemon=True).start()
+
+    def _read_tcp(self, conn):
+        buffer = b""
+        with conn:
+            while True:
+                try:
+                    data = conn.recv(MAX_PACKET)
+                except OSError:
+                    break
+                if not data:
+                    break
+                buffer += data
+                if self.version == V5:
+                    packets, buffer = unwrap_v5_tcp(buffer)
+                    for packet in packets:
+                        self.handle(memoryview(packet))
+                    continue
+                # v3.1: skip to the start of a message, then take all the complete ones
+                start = 0
+                while start < len(buffer) and not buffer[start] & 0x80:
+                    start += 1
+                size = (len(buffer) - start) // V31_SIZE * V31_SIZE
+                if size:
+                    self.handle(memoryview(buffer)[start : start + size])
+                buffer = buffer[start + size :]
+        self.state.merge()
+
+
+def generate(version, cameras, full=False):
+    """
+    A switcher's worth of test packets, cycling program and preview round the cameras.
+    @param full: Every camera in every packet, otherwise just the ones that change
+    @returns generator: Packets (bytes)
+    """
+    step = 0
+    while True:
+        program = step % cameras
+        preview = (step + 1) % cameras
+        indexes = range(cameras) if full else sorted({(program - 1) % cameras, program, preview})
+        tallies = [(index, index == program, index == preview, f"CAM {index + 1}") for index in indexes]
+        if version == V31:
+            yield b"".join(encode_v31(*tally) for tally in tallies)
+        else:
+            yield encode_v5(tallies)
+        step += 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send test TSL UMD packets")
+    parser.add_argument("server", help="host:port")
+    parser.add_argument("--version", choices=VERSIONS, default=V5)
+    parser.add_argument("--tcp", action="store_true")
+    parser.add_argument("--cameras", type=int, default=4)
+    parser.add_argument("--interval", type=float, default=1, help="Seconds between changes")
+    args = parser.parse_args()
+
+    host, port = args.server.rsplit(":", 1)
+    if args.tcp:
+        sock = socket.create_connection((host, int(port)))
+        send = lambda packet: sock.sendall(wrap_v5_tcp(packet) if args.version == V5 else packet)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        send = lambda packet: sock.sendto(packet, (host, int(port)))
+    for packet in generate(args.version, args.cameras, full=True):
+        send(packet)
+        time.sleep(args.interval)
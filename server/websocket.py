@@ -0,0 +1,150 @@
+"""
+TallyHo Server WebSockets
+
+Just enough RFC 6455 over asyncio streams for text messages, both ends, so talking to OBS
+doesn't need any packages installing. No extensions (compression) are negotiated.
+"""
+import asyncio
+import base64
+import hashlib
+import os
+import struct
+
+_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+_OP_TEXT = 0x1
+_OP_CLOSE = 0x8
+_OP_PING = 0x9
+_OP_PONG = 0xA
+MAX_MESSAGE = 16 * 1024 * 1024
+
+
+def _accept_key(key):
+    return base64.b64encode(hashlib.sha1((key + _GUID).encode()).digest()).decode()
+
+
+def _mask(data, key):
+    repeated = (key * (len(data) // 4 + 1))[: len(data)]
+    return (int.from_bytes(data, "big") ^ int.from_bytes(repeated, "big")).to_bytes(len(data), "big")
+
+
+class WebSocket:
+    def __init__(self, reader, writer, client):
+        self.reader = reader
+        self.writer = writer
+        self.client = client  # Clients mask what they send, servers don't
+
+    async def _send_frame(self, opcode, payload):
+        header = bytes([0x80 | opcode])
+        mask_bit = 0x80 if self.client else 0
+        if len(payload) < 126:
+            header += bytes([mask_bit | len(payload)])
+        elif len(payload) < 1 << 16:
+            header += bytes([mask_bit | 126]) + struct.pack("!H", len(payload))
+        else:
+            header += bytes([mask_bit | 127]) + struct.pack("!Q", len(payload))
+        if self.client:
+            key = os.urandom(4)
+            header += key
+            payload = _mask(payload, key)
+        self.writer.write(header + payload)
+        await self.writer.drain()
+
+    async def send(self, text):
+        await self._send_frame(_OP_TEXT, text.encode())
+
+    async def recv(self):
+        """
+        @returns str: The next text message
+        @raises ConnectionError: When the other end closes
+        """
+        message = b""
+        while True:
+            first, second = await self.reader.readexactly(2)
+            opcode = first & 0x0F
+            length = second & 0x7F
+            if length == 126:
+                (length,) = struct.unpack("!H", await self.reader.readexactly(2))
+            elif length == 127:
+                (length,) = struct.unpack("!Q", await self.reader.readexactly(8))
+            if length > MAX_MESSAGE:
+                raise ConnectionError(f"WebSocket message too big: {length} bytes")
+            key = await self.reader.readexactly(4) if second & 0x80 else None
+            payload = await self.reader.readexactly(length)
+            if key:
+                payload = _mask(payload, key)
+            if opcode == _OP_PING:
+                await self._send_frame(_OP_PONG, payload)
+                continue
+            if opcode == _OP_PONG:
+                continue
+            if opcode == _OP_CLOSE:
+                await self.close()
+                raise ConnectionError("WebSocket closed")
+            message += payload
+            if first & 0x80:  # Final fragment
+                return message.decode()
+
+    async def close(self):
+        try:
+            await self._send_frame(_OP_CLOSE, b"")
+        except (OSError, RuntimeError):
+            pass
+        self.writer.close()
+
+
+async def _read_headers(reader):
+    status = (await reader.readline()).decode().strip()
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode().strip()
+        if not line:
+            return status, headers
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+
+async def connect(host, port, path="/", protocol=None):
+    """
+    @returns WebSocket: Connected to ws://host:port/path
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    key = base64.b64encode(os.urandom(16)).decode()
+    request = (
+        f"GET {path} HTTP/1.1\r\n"
+        f"Host: {host}:{port}\r\n"
+        "Upgrade: websocket\r\n"
+        "Connection: Upgrade\r\n"
+        f"Sec-WebSocket-Key: {key}\r\n"
+        "Sec-WebSocket-Version: 13\r\n"
+    )
+    if protocol:
+        request += f"Sec-WebSocket-Protocol: {protocol}\r\n"
+    writer.write(f"{request}\r\n".encode())
+    status, headers = await _read_headers(reader)
+    if " 101 " not in f"{status} " or headers.get("sec-websocket-accept") != _accept_key(key):
+        writer.close()
+        raise ConnectionError(f"WebSocket handshake failed: {status}")
+    return WebSocket(reader, writer, client=True)
+
+
+async def accept(reader, writer, protocol=None):
+    """
+    Server end of the handshake, for a connection from asyncio.start_server().
+    @returns WebSocket
+    """
+    _, headers = await _read_headers(reader)
+    if "sec-websocket-key" not in headers:
+        writer.write(b"HTTP/1.1 400 Bad Request\r\n\r\n")
+        writer.close()
+        raise ConnectionError("Not a WebSocket request")
+    response = (
+        "HTTP/1.1 101 Switching Protocols\r\n"
+        "Upgrade: websocket\r\n"
+        "Connection: Upgrade\r\n"
+        f"Sec-WebSocket-Accept: {_accept_key(headers['sec-websocket-key'])}\r\n"
+    )
+    if protocol:
+        response += f"Sec-WebSocket-Protocol: {protocol}\r\n"
+    writer.write(f"{response}\r\n".encode())
+    await writer.drain()
+    return WebSocket(reader, writer, client=False)